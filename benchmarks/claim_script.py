@@ -0,0 +1,149 @@
+'''Compares claim script decoding with the implementation that tokenized every script first.
+
+Usage: python benchmarks/claim_script.py [rounds]
+
+Scripts are taken from the outputs of the blocks used by the tests, plus generated claims,
+supports and updates so claim scripts are about 1% of them as on mainnet.
+'''
+import json
+import os
+import sys
+import timeit
+from binascii import unhexlify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lbryumx.coin import LBC  # noqa
+from lbryumx.model import NameClaim, ClaimSupport, ClaimUpdate  # noqa
+from lbryumx.opcodes import decode_claim, script_GetOp, opcodes as lbry_opcodes  # noqa
+
+BLOCKS_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'tests', 'data')
+ADDRESS = 'bTZito1AqWPig64GBioom11mHpoegMfXHx'
+
+
+def push(data):
+    if len(data) < lbry_opcodes.OP_PUSHDATA1:
+        return bytes((len(data),)) + data
+    return bytes((lbry_opcodes.OP_PUSHDATA2,)) + len(data).to_bytes(2, 'little') + data
+
+
+def claim_scripts(count):
+    address_script = LBC.pay_to_address_script(ADDRESS)
+    claim_id = bytes(range(20))
+    for n in range(count):
+        name, value = 'claim-{}'.format(n).encode(), bytes(300)
+        if n % 3 == 0:
+            yield (bytes((lbry_opcodes.OP_CLAIM_NAME,)) + push(name) + push(value) +
+                   bytes((lbry_opcodes.OP_2DROP, lbry_opcodes.OP_DROP)) + address_script)
+        elif n % 3 == 1:
+            yield (bytes((lbry_opcodes.OP_SUPPORT_CLAIM,)) + push(name) + push(claim_id) +
+                   bytes((lbry_opcodes.OP_2DROP, lbry_opcodes.OP_DROP)) + address_script)
+        else:
+            yield (bytes((lbry_opcodes.OP_UPDATE_CLAIM,)) + push(name) + push(claim_id) + push(value) +
+                   bytes((lbry_opcodes.OP_2DROP, lbry_opcodes.OP_2DROP)) + address_script)
+
+
+def block_scripts():
+    scripts = []
+    for file_name in sorted(os.listdir(BLOCKS_PATH)):
+        if file_name.startswith('block'):
+            with open(os.path.join(BLOCKS_PATH, file_name)) as block_file:
+                block_info = json.load(block_file)
+            block = LBC.block(unhexlify(block_info['block']), block_info['height'])
+            scripts.extend(output.pk_script for tx, _ in block.transactions for output in tx.outputs)
+    return scripts
+
+
+def main(rounds=20):
+    # the test blocks are claim heavy, only their other outputs are repeated to get the mainnet share
+    block_claims, others = [], []
+    for script in block_scripts():
+        (block_claims if decode_claim(script) else others).append(script)
+    scripts = others * (10000 // len(others) + 1)
+    scripts.extend(block_claims)
+    scripts.extend(claim_scripts(len(scripts) // 100 - len(block_claims)))
+    for script in scripts:
+        new, old = decode_claim(script), legacy_decode_claim_script(script)
+        assert (new[0] if new else None) == (old[0] if old else None)
+
+    def run_fast():
+        for script in scripts:
+            decode_claim(script)
+
+    def run_legacy():
+        for script in scripts:
+            legacy_decode_claim_script(script)
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=rounds))
+    fast = min(timeit.repeat(run_fast, number=1, repeat=rounds))
+    print('{:,d} scripts, {:,d} of them claims'.format(len(scripts), sum(1 for s in scripts if decode_claim(s))))
+    print('legacy: {:.1f}ms, fast: {:.1f}ms, {:.1f}x faster'.format(legacy * 1000, fast * 1000, legacy / fast))
+
+
+def legacy_decode_claim_script(bytes_script):
+    '''decode_claim_script before the fast path, tokenizing the whole script first.'''
+    try:
+        decoded_script = [x for x in script_GetOp(bytes_script)]
+    except Exception as e:
+        print(e)
+        return None
+    if len(decoded_script) <= 6:
+        return False
+    op = 0
+    claim_type = decoded_script[op][0]
+    if claim_type == lbry_opcodes.OP_UPDATE_CLAIM:
+        if len(decoded_script) <= 7:
+            return False
+    if claim_type not in [
+        lbry_opcodes.OP_CLAIM_NAME,
+        lbry_opcodes.OP_SUPPORT_CLAIM,
+        lbry_opcodes.OP_UPDATE_CLAIM
+    ]:
+        return False
+    op += 1
+    value = None
+    claim_id = None
+    claim = None
+    if not (0 <= decoded_script[op][0] <= lbry_opcodes.OP_PUSHDATA4):
+        return False
+    name = decoded_script[op][1]
+    op += 1
+    if not (0 <= decoded_script[op][0] <= lbry_opcodes.OP_PUSHDATA4):
+        return False
+    if decoded_script[0][0] in [
+        lbry_opcodes.OP_SUPPORT_CLAIM,
+        lbry_opcodes.OP_UPDATE_CLAIM
+    ]:
+        claim_id = decoded_script[op][1]
+        if len(claim_id) != 20:
+            return False
+    else:
+        value = decoded_script[op][1]
+    op += 1
+    if decoded_script[0][0] == lbry_opcodes.OP_UPDATE_CLAIM:
+        value = decoded_script[op][1]
+        op += 1
+    if decoded_script[op][0] != lbry_opcodes.OP_2DROP:
+        return False
+    op += 1
+    if decoded_script[op][0] != lbry_opcodes.OP_DROP and decoded_script[0][0] == lbry_opcodes.OP_CLAIM_NAME:
+        return False
+    elif decoded_script[op][0] != lbry_opcodes.OP_2DROP and decoded_script[0][0] == lbry_opcodes.OP_UPDATE_CLAIM:
+        return False
+    op += 1
+    if decoded_script[0][0] == lbry_opcodes.OP_CLAIM_NAME:
+        if name is None or value is None:
+            return False
+        claim = NameClaim(name, value)
+    elif decoded_script[0][0] == lbry_opcodes.OP_UPDATE_CLAIM:
+        if name is None or value is None or claim_id is None:
+            return False
+        claim = ClaimUpdate(name, claim_id, value)
+    elif decoded_script[0][0] == lbry_opcodes.OP_SUPPORT_CLAIM:
+        if name is None or claim_id is None:
+            return False
+        claim = ClaimSupport(name, claim_id)
+    return claim, decoded_script[op:]
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,226 @@
+'''Benchmarks of the claim indexing hot paths: advancing, flushing and backing up blocks, decoding claim
+scripts and formatting claims for sessions.
+
+Usage: python benchmarks/run.py [--distribution FILE] [--seed N] [--blocks N] [--output FILE] [--compare FILE]
+
+Runs offline, each workload on a block processor over a temporary DB directory the same way the
+block_processor fixture of the tests does. Workloads are the regtest chain the tests use and a synthetic
+chain drawn from a seeded distribution. Results are printed and, with --output, saved as JSON so --compare can show how they
+changed between commits.
+'''
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from binascii import unhexlify
+
+from electrumx.lib.hash import hash_to_hex_str
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lbryumx.coin import LBC, LBCRegTest  # noqa
+from lbryumx.opcodes import decode_claim  # noqa
+from tests.synthetic import generate_blocks, feed_block_processor, load_distribution, open_block_processor, \
+    close_block_processor  # noqa
+from tests.data.regtest_chain import hex_blocks  # noqa
+
+
+def timed(timings, method):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings.append(time.perf_counter() - start)
+    return wrapper
+
+
+def peak_rss():
+    '''Peak resident set size of the process so far, in bytes.'''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def bench_decode(raw_blocks, coin, rounds=5):
+    scripts = [output.pk_script for height, raw_block in enumerate(raw_blocks)
+               for tx, _ in coin.block(raw_block, height).transactions for output in tx.outputs]
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for script in scripts:
+            decode_claim(bytes(script))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'scripts': len(scripts), 'scripts_per_sec': len(scripts) / best}
+
+
+def bench_chain(coin, generated, batch_size, flush_every, backup_depth, daemon_height=None):
+    '''Advances (fork_depth, raw_block) tuples in batches the way the prefetcher hands them, flushing as
+    when syncing and backing up on reorgs, then backs up the last backup_depth blocks.'''
+    db_dir = tempfile.mkdtemp(prefix='lbryumx-bench-')
+    bp = open_block_processor(coin, db_dir)
+    try:
+        flush_claims_timings, flush_timings, backup_timings = [], [], []
+        bp.flush_claims = timed(flush_claims_timings, bp.flush_claims)
+        bp.flush = timed(flush_timings, bp.flush)
+
+        start = time.perf_counter()
+        blocks = [coin.block(raw_block, 0) for _, raw_block in generated]
+        deserialize_time = time.perf_counter() - start
+        claims = sum(1 for block in blocks for tx, _ in block.transactions for output in tx.outputs
+                     if output.claim)
+        del blocks
+
+        raw_blocks = {}
+        bp.backup_blocks = timed(backup_timings, bp.backup_blocks)
+        bp.advance_blocks = remember_raw_blocks(raw_blocks, bp, bp.advance_blocks)
+        start = time.perf_counter()
+        feed_block_processor(bp, generated, batch_size, flush_every, daemon_height)
+        advance_time = time.perf_counter() - start - sum(backup_timings)
+        reorgs = sum(1 for fork_depth, _ in generated if fork_depth)
+
+        session_result = bench_session_formatting(bp)
+
+        start = time.perf_counter()
+        bp.backup_blocks([raw_blocks[height] for height in range(bp.height, bp.height - backup_depth, -1)])
+        backup_time = time.perf_counter() - start
+
+        result = {
+            'blocks': len(generated),
+            'claims': claims,
+            'deserialize_sec': deserialize_time,
+            'advance_sec': advance_time,
+            'blocks_per_sec': len(generated) / advance_time,
+            'claims_per_sec': claims / advance_time,
+            'flushes': len(flush_timings),
+            'flush_avg_ms': 1000 * sum(flush_timings) / len(flush_timings),
+            'flush_max_ms': 1000 * max(flush_timings),
+            'flush_claims_avg_ms': 1000 * sum(flush_claims_timings) / len(flush_claims_timings),
+            'flush_claims_max_ms': 1000 * max(flush_claims_timings),
+            'backup_blocks': backup_depth,
+            'backup_sec': backup_time,
+        }
+        stats = bp.value_store_stats
+        if stats['stored_bytes']:
+            result['value_compression_ratio'] = stats['value_bytes'] / stats['stored_bytes']
+        if reorgs:
+            result.update(reorgs=reorgs, reorg_avg_ms=1000 * sum(backup_timings[:reorgs]) / reorgs)
+        result.update(session_result)
+        return result
+    finally:
+        close_block_processor(bp)
+        shutil.rmtree(db_dir)
+
+
+def remember_raw_blocks(raw_blocks, bp, advance_blocks):
+    '''Keeps the raw blocks bp advances by height, to back them up at the end.'''
+    def wrapper(blocks):
+        for height, block in enumerate(blocks, start=bp.height + 1):
+            raw_blocks[height] = block.raw
+        return advance_blocks(blocks)
+    return wrapper
+
+
+def bench_session_formatting(bp, limit=1000):
+    '''Formats indexed claims as they come back from the daemon, with a session that only has the block processor.'''
+    session = bp.coin.SESSIONCLS.__new__(bp.coin.SESSIONCLS)
+    session.bp = bp
+    claims = []
+    for claim_id, _ in bp.claims_db.iterator():
+        info = bp.get_claim_info(claim_id)
+        claims.append({'name': info.name.decode('ISO-8859-1'), 'claimId': hash_to_hex_str(claim_id),
+                       'txid': hash_to_hex_str(info.txid), 'n': info.nout, 'amount': info.amount,
+                       'height': info.height, 'value': bp.get_claim_value(claim_id).decode('ISO-8859-1'),
+                       'valid at height': info.height})
+        if len(claims) >= limit:
+            break
+    if not claims:
+        return {}
+    start = time.perf_counter()
+    for claim in claims:
+        session.format_claim_from_daemon(claim)
+    elapsed = time.perf_counter() - start
+    return {'formatted_claims': len(claims), 'formatted_claims_per_sec': len(claims) / elapsed}
+
+
+def run(args):
+    distribution = load_distribution(args.distribution, blocks=args.blocks, claims_per_block=args.claims_per_block)
+    regtest_blocks = [(0, raw_block) for raw_block in map(unhexlify, hex_blocks)]
+    start = time.perf_counter()
+    synthetic_blocks = list(generate_blocks(LBC, distribution, args.seed))
+    generate_time = time.perf_counter() - start
+    synthetic_height = len(synthetic_blocks) - 1
+    results = {
+        'decode_claim': bench_decode([raw_block for _, raw_block in regtest_blocks + synthetic_blocks], LBC),
+        'regtest_chain': bench_chain(LBCRegTest, regtest_blocks, args.batch_size, args.flush_every,
+                                     min(len(regtest_blocks) - 1, LBCRegTest.REORG_LIMIT),
+                                     daemon_height=len(regtest_blocks) - 1),
+        # without reorgs the daemon is ahead as when syncing, so only the last blocks keep their undo
+        'synthetic_chain': bench_chain(LBC, synthetic_blocks, args.batch_size, args.flush_every,
+                                       min(args.backup_depth, distribution['blocks'] - 1),
+                                       daemon_height=None if distribution['reorg_interval'] else synthetic_height),
+    }
+    results['synthetic_chain']['generate_sec'] = generate_time
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'time': time.time(),
+        'params': vars(args),
+        'distribution': distribution,
+        'peak_rss_bytes': peak_rss(),
+        'results': results,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.realpath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    print('commit {}, python {}, peak RSS {:,.1f}MB'.format(report['commit'], report['python'],
+                                                            report['peak_rss_bytes'] / 1024 / 1024))
+    for name, result in report['results'].items():
+        print(name)
+        old = baseline['results'].get(name, {}) if baseline else {}
+        for metric, value in result.items():
+            line = '  {:<28}{:>16,.2f}'.format(metric, value)
+            if old.get(metric):
+                line += '  {:+.1f}% from {:,.2f}'.format(100 * (value - old[metric]) / old[metric], old[metric])
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks claim indexing.')
+    parser.add_argument('--distribution', help='JSON file with the synthetic chain distribution, see tests/synthetic.py')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic chain')
+    parser.add_argument('--blocks', type=int, help='synthetic chain length, overriding the distribution')
+    parser.add_argument('--claims-per-block', type=int, help='overrides the distribution')
+    parser.add_argument('--batch-size', type=int, default=50, help='blocks handed to advance_blocks at once')
+    parser.add_argument('--flush-every', type=int, default=100, help='blocks advanced between flushes')
+    parser.add_argument('--backup-depth', type=int, default=50, help='synthetic blocks backed up at the end')
+    parser.add_argument('--output', help='file to save the results to, as JSON')
+    parser.add_argument('--compare', help='results file of a previous run to compare with')
+    args = parser.parse_args()
+    output = args.output and os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    report = run(args)
+    print_report(report, baseline)
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,13 @@
 import hashlib
+import logging
+import os
+import shutil
 import struct
 import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from heapq import merge
+from itertools import chain, repeat, groupby, islice
 
 import msgpack
 from electrumx.lib.hash import hash_to_hex_str
@@ -10,65 +17,434 @@ from lbryschema.proto.claim_pb2 import Claim
 from lbryschema.uri import parse_lbry_uri
 from lbryschema.decode import smart_decode
 
-from lbryumx.model import NameClaim, ClaimInfo, ClaimUpdate, ClaimSupport
+from lbryumx.bloom import BloomFilter
+from lbryumx.cache import LRUCache
+from lbryumx.compression import ValueCompressor, train_zdict
+from lbryumx.storage import PrefixedDB, ReadAhead
+from lbryumx.model import NameClaim, ClaimInfo, ClaimUpdate, ClaimSupport, SupportInfo
+
+# all the claim state lives on a single DB, under these prefixes for what used to be separate DBs
+CLAIM_DB_NAME = 'claim_state'
+CLAIMS_PREFIX = b'i'
+NAMES_PREFIX = b'N'
+SIGNATURES_PREFIX = b'S'
+OUTPOINTS_PREFIX = b'O'
+CLAIMTRIE_PREFIX = b'T'
+CLAIM_UNDO_PREFIX = b'U'
+VALUES_PREFIX = b'v'
+# height the claim state on disk corresponds to, written on every flush
+CLAIMS_HEIGHT_KEY = b'H'
+# the separate DBs of older versions, copied over on start while they exist, and the mark of a complete copy
+# after which they are removed
+SEPARATE_CLAIM_DBS = (('claims', CLAIMS_PREFIX), ('names', NAMES_PREFIX), ('signatures', SIGNATURES_PREFIX),
+                      ('outpoint_claim_id', OUTPOINTS_PREFIX), ('claim_undo', CLAIM_UNDO_PREFIX))
+SEPARATE_CLAIM_DBS_COPIED_KEY = b'M'
+# claim trie database key prefixes: the supports of each claim, and the claim each support outpoint is for
+SUPPORTS_PREFIX = b's'
+SUPPORT_OUTPOINT_PREFIX = b'o'
+# supports keys: claim id + outpoint of each support of the claim
+CLAIM_ID_LENGTH = 20
+# names DB keys: claims for a name by position, and the position of each claim
+NAME_CLAIM_PREFIX = b'c'
+CLAIM_POSITION_PREFIX = b'r'
+# marks names DB using the layout above instead of a msgpack {claim_id: sequence} blob per name
+NAMES_DB_VERSION_KEY = b'\xffversion'
+NAMES_DB_VERSION = 1
+# signatures DB keys: certificate id + claim id of each claim signed by it, and the claim count of each certificate
+CERT_CLAIM_PREFIX = b'c'
+CERT_COUNT_PREFIX = b'n'
+SIGNATURES_DB_VERSION_KEY = b'\xffversion'
+SIGNATURES_DB_VERSION = 1
+# values DB keys: compressed value of each claim, and the dictionary they are compressed with
+VALUES_ZDICT_KEY = b'\xffzdict'
+VALUES_DB_VERSION_KEY = b'\xffversion'
+VALUES_DB_VERSION = 1
+# claim values the compression dictionary is trained on, once a flush has at least the minimum of them
+ZDICT_SAMPLES = 2000
+ZDICT_MIN_SAMPLES = 1000
+# write caches of the claim state, handed over to flush_claims and emptied on every flush
+CLAIM_WRITE_CACHES = ('claim_cache', 'claim_value_cache', 'claims_for_name_cache', 'claim_positions_cache', 'last_claim_position_cache',
+                      'claims_signed_by_cert_cache', 'signed_claim_count_cache', 'outpoint_to_claim_id_cache',
+                      'claimtrie_cache', 'claim_supports_cache')
+# rough size of a claim cache entry besides the serialized values, counted separately as they vary in size
+CLAIM_CACHE_ENTRY_SIZE = 150
+# below this many claims, shipping them to the process pool costs more than parsing them here
+MIN_PARALLEL_CLAIM_OUTPUTS = 100
+# hash functions of the filter over claim and support outpoints, about 0.2% false positives at 16 bits per outpoint
+OUTPOINT_FILTER_HASHES = 4
 
 
 class LBRYBlockProcessor(BlockProcessor):
 
     def __init__(self, *args, **kwargs):
         self.claim_cache = {}
+        self.claim_value_cache = {}
         self.claims_for_name_cache = {}
+        self.claim_positions_cache = {}
+        self.last_claim_position_cache = {}
         self.claims_signed_by_cert_cache = {}
+        self.signed_claim_count_cache = {}
         self.outpoint_to_claim_id_cache = {}
+        self.claimtrie_cache = {}
+        self.claim_supports_cache = {}
+        self.claim_db = None
         self.claims_db = self.names_db = self.signatures_db = self.outpoint_to_claim_id_db = self.claim_undo_db = None
+        self.claimtrie_db = self.supports_db = self.values_db = None
+        # claim values are compressed with a dictionary trained on the first ones, counting how well
+        self.value_compressor = None
+        self.value_store_stats = Counter()
+        # (height, claim undo, claim trie undo) of the blocks advanced since the last flush
+        self.pending_claim_undo = []
+        # bytes of the serialized claims and claim trie values in the write caches, kept as they are written
+        self.claim_cache_bytes = 0
         super().__init__(*args, **kwargs)
 
         # stores deletes not yet flushed to disk
         self.pending_abandons = {}
+        # claim trie state before the block being advanced changed it
+        self.claimtrie_undo = {}
         self.should_validate_signatures = self.env.boolean('VALIDATE_CLAIM_SIGNATURES', False)
         self.logger.info("LbryumX Block Processor - Validating signatures: {}".format(self.should_validate_signatures))
+        # per claim trace, checked once here so it costs nothing when disabled
+        self.debug_claims = self.logger.isEnabledFor(logging.DEBUG)
+        # cumulative claim processing counters, and the totals when the last block started and the last flush ended
+        self.claim_metrics = Counter()
+        self.block_start_metrics = self.flushed_metrics = Counter()
+        self.last_block_metrics = Counter()
+        # claim outputs parsed ahead of processing by a process pool, keyed by outpoint
+        self.claim_parse_workers = self.env.integer('CLAIM_PARSE_WORKERS', 0)
+        self.claim_parse_executor = None
+        self.parsed_claim_outputs = {}
+        # blocks parsed on the pool ahead of the one being applied, pipelining both instead of parsing the batch first
+        self.claim_pipeline_depth = self.env.integer('CLAIM_PIPELINE_DEPTH', 0) if self.claim_parse_workers else 0
+        # decoded certificates keyed by certificate claim id, signatures checked ahead on the pool by outpoint
+        self.certificate_cache = LRUCache(self.env.integer('CERTIFICATE_CACHE_SIZE', 10000))
+        # decoded claims read by sessions and the block processor alike
+        self.claim_info_cache = LRUCache(self.env.integer('CLAIM_INFO_CACHE_SIZE', 100000))
+        self.checked_signatures = {}
+        # outpoints of every claim and support ever indexed, so spending other outputs skips the DB lookups
+        self.outpoint_filter_size = self.env.integer('CLAIM_OUTPOINT_FILTER_MB', 32) * 1024 * 1024
+        self.outpoint_filter = None
+        # claim state a block looks up, read in key order before advancing it
+        self.should_prefetch_claims = self.env.boolean('PREFETCH_CLAIM_STATE', True)
+        self.claim_read_ahead = None
+        # claim undo of the blocks being backed up by height, and how long the last reorg took
+        self.backup_claim_undo = {}
+        self.last_reorg = None
 
     async def _open_dbs(self, for_sync):
         await super()._open_dbs(for_sync=for_sync)
+        self.open_claim_db(for_sync)
+
+    def open_claim_db(self, for_sync, name=CLAIM_DB_NAME, read_only=False):
+        '''Opens the claim DB called name, migrating it from the layouts of older versions. Only the server's own
+        claim DB takes in the separate claim DBs of older versions, another one such as a DB being rebuilt starts
+        empty in the current layout. A read_only DB must exist in the current layout and is opened as is, without
+        migrations or the outpoint filter.'''
         def log_reason(message, is_for_sync):
             reason = 'sync' if is_for_sync else 'serving'
             self.logger.info('{} for {}'.format(message, reason))
 
-        if self.claims_db:
-            if self.claims_db.for_sync == for_sync:
+        if self.claim_db:
+            if self.claim_db.for_sync == for_sync:
                 return
-            log_reason('closing claim DBs to re-open', for_sync)
-            self.claims_db.close()
-            self.names_db.close()
-            self.signatures_db.close()
-            self.outpoint_to_claim_id_db.close()
-            self.claim_undo_db.close()
-        self.claims_db = self.db_class('claims', for_sync)
-        self.names_db = self.db_class('names', for_sync)
-        self.signatures_db = self.db_class('signatures', for_sync)
-        self.outpoint_to_claim_id_db = self.db_class('outpoint_claim_id', for_sync)
-        self.claim_undo_db = self.db_class('claim_undo', for_sync)
-        log_reason('opened claim DBs', self.claims_db.for_sync)
+            log_reason('closing claim DB to re-open', for_sync)
+            self.claim_db.close()
+        if read_only and not os.path.isdir(name):
+            raise self.DBError('no claim DB in {}'.format(os.getcwd()))
+        self.claim_db = self.db_class(name, for_sync)
+        read_ahead = self.claim_read_ahead = ReadAhead(self.claim_db) if self.should_prefetch_claims else None
+        self.claims_db = PrefixedDB(self.claim_db, CLAIMS_PREFIX, read_ahead)
+        self.names_db = PrefixedDB(self.claim_db, NAMES_PREFIX, read_ahead)
+        self.signatures_db = PrefixedDB(self.claim_db, SIGNATURES_PREFIX, read_ahead)
+        self.outpoint_to_claim_id_db = PrefixedDB(self.claim_db, OUTPOINTS_PREFIX, read_ahead)
+        self.claimtrie_db = PrefixedDB(self.claim_db, CLAIMTRIE_PREFIX, read_ahead)
+        self.supports_db = PrefixedDB(self.claim_db, CLAIMTRIE_PREFIX + SUPPORTS_PREFIX, read_ahead)
+        self.claim_undo_db = PrefixedDB(self.claim_db, CLAIM_UNDO_PREFIX)
+        self.values_db = PrefixedDB(self.claim_db, VALUES_PREFIX)
+        if read_only:
+            for db, version_key, version in self.claim_db_versions():
+                if db.get(version_key) != version:
+                    raise self.DBError('claim DB is not in the current layout, start the server on it to migrate it')
+            self.value_compressor = ValueCompressor(self.values_db.get(VALUES_ZDICT_KEY))
+            log_reason('opened claim DB read only', self.claim_db.for_sync)
+            return
+        if name == CLAIM_DB_NAME and any(os.path.exists(old_name) for old_name, _ in SEPARATE_CLAIM_DBS):
+            self.migrate_separate_claim_dbs()
+        if self.claimtrie_db.is_empty() and not self.claims_db.is_empty():
+            self.logger.warning('claim trie DB created on top of existing claim DBs, supports will be missing '
+                                'until the data folder is reset (reindex)')
+        if not self.names_db.get(NAMES_DB_VERSION_KEY):
+            if self.names_db.is_empty():
+                self.names_db.put(NAMES_DB_VERSION_KEY, struct.pack('>H', NAMES_DB_VERSION))
+            else:
+                self.migrate_names_db()
+        if not self.signatures_db.get(SIGNATURES_DB_VERSION_KEY):
+            if self.signatures_db.is_empty():
+                self.signatures_db.put(SIGNATURES_DB_VERSION_KEY, struct.pack('>H', SIGNATURES_DB_VERSION))
+            else:
+                self.migrate_signatures_db()
+        if not self.values_db.get(VALUES_DB_VERSION_KEY):
+            if self.claims_db.is_empty():
+                self.values_db.put(VALUES_DB_VERSION_KEY, struct.pack('>H', VALUES_DB_VERSION))
+            else:
+                self.migrate_claim_values()
+        self.value_compressor = ValueCompressor(self.values_db.get(VALUES_ZDICT_KEY))
+        if self.outpoint_filter is None and self.outpoint_filter_size:
+            self.outpoint_filter = self.build_outpoint_filter()
+        log_reason('opened claim DB', self.claim_db.for_sync)
+
+    def claim_db_versions(self):
+        '''(view, version key, version) of the claim DB views with a layout version.'''
+        return ((self.names_db, NAMES_DB_VERSION_KEY, struct.pack('>H', NAMES_DB_VERSION)),
+                (self.signatures_db, SIGNATURES_DB_VERSION_KEY, struct.pack('>H', SIGNATURES_DB_VERSION)),
+                (self.values_db, VALUES_DB_VERSION_KEY, struct.pack('>H', VALUES_DB_VERSION)))
+
+    def build_outpoint_filter(self):
+        start = time.time()
+        outpoint_filter = BloomFilter(self.outpoint_filter_size, OUTPOINT_FILTER_HASHES)
+        for outpoint, _ in self.outpoint_to_claim_id_db.iterator():
+            outpoint_filter.add(outpoint)
+        for key, _ in self.claimtrie_db.iterator(prefix=SUPPORT_OUTPOINT_PREFIX):
+            outpoint_filter.add(key[1:])
+        self.logger.info('built filter of {:,d} claim and support outpoints in {:,d}MB in {:.1f}s'.format(
+            len(outpoint_filter), self.outpoint_filter_size // 1024 // 1024, time.time() - start))
+        return outpoint_filter
+
+    def may_be_claim_outpoint(self, tx_hash, tx_idx):
+        '''False if the outpoint is known to be neither a claim nor a support.'''
+        if self.outpoint_filter is None:
+            return True
+        if tx_hash + struct.pack('>I', tx_idx) in self.outpoint_filter:
+            return True
+        self.claim_metrics['outpoint_filter_skips'] += 1
+        return False
+
+    def migrate_separate_claim_dbs(self):
+        '''Copies the claim DBs of older versions into the prefixed keyspaces of the single claim DB. They are
+        only removed once all of them were copied, a copy cut short starting over on the next start.'''
+        if not self.claim_db.get(SEPARATE_CLAIM_DBS_COPIED_KEY):
+            for name, prefix in SEPARATE_CLAIM_DBS:
+                if os.path.exists(name):
+                    self.copy_separate_claim_db(name, prefix)
+            self.claim_db.put(SEPARATE_CLAIM_DBS_COPIED_KEY, b'')
+        for name, _ in SEPARATE_CLAIM_DBS:
+            if os.path.exists(name):
+                shutil.rmtree(name)
+        with self.claim_db.write_batch() as batch:
+            batch.delete(SEPARATE_CLAIM_DBS_COPIED_KEY)
+
+    def copy_separate_claim_db(self, name, prefix):
+        '''Copies a claim DB of older versions under prefix, 10,000 entries per batch.'''
+        self.logger.info('copying {} DB into the claim DB...'.format(name))
+        start, count = time.time(), 0
+        old_db = self.db_class(name, True)
+        try:
+            entries = self.combined_claim_undo(old_db) if prefix == CLAIM_UNDO_PREFIX else old_db.iterator()
+            while True:
+                with self.claim_db.write_batch() as batch:
+                    for key, value in entries:
+                        batch.put(prefix + key, value)
+                        count += 1
+                        if count % 10000 == 0:
+                            break
+                    else:
+                        break
+                self.logger.info('copied {:,d} entries from {} DB'.format(count, name))
+        finally:
+            old_db.close()
+        self.logger.info('copied {:,d} entries from {} DB in {:.1f}s'.format(count, name, time.time() - start))
+
+    def combined_claim_undo(self, old_db):
+        '''Claim undo of every height from the separate undo DB of older versions, with an empty claim trie undo
+        as they had no claim trie.'''
+        for key, undo_info in old_db.iterator():
+            yield key, msgpack.dumps((msgpack.loads(undo_info), {}))
+
+    def migrate_names_db(self):
+        '''Rewrites the msgpack {claim_id: sequence} blob of every name into the keyed layout.'''
+        def migrate_name(batch, name, serialized):
+            for claim_id, sequence in msgpack.loads(serialized).items():
+                batch.put(name_claims_prefix(name) + struct.pack('>I', sequence), claim_id)
+                batch.put(CLAIM_POSITION_PREFIX + claim_id, struct.pack('>I', sequence))
+
+        def is_migrated(key, value):
+            # names can start like the keyed layout, but a msgpack {claim_id: sequence} is never as long as the
+            # claim id or the position it maps to
+            return key[:1] in (NAME_CLAIM_PREFIX, CLAIM_POSITION_PREFIX) and len(value) in (CLAIM_ID_LENGTH, 4)
+        self.migrate_db(self.names_db, 'names', migrate_name, is_migrated,
+                        NAMES_DB_VERSION_KEY, struct.pack('>H', NAMES_DB_VERSION))
+
+    def migrate_signatures_db(self):
+        '''Rewrites the msgpack list of claim ids signed by every certificate into the keyed layout.'''
+        def migrate_certificate(batch, cert_id, serialized):
+            claim_ids = set(msgpack.loads(serialized))
+            for claim_id in claim_ids:
+                batch.put(CERT_CLAIM_PREFIX + cert_id + claim_id, b'')
+            batch.put(CERT_COUNT_PREFIX + cert_id, struct.pack('>I', len(claim_ids)))
+
+        def is_migrated(key, value):
+            # a msgpack list of claim ids is never as short as a signature or a claim count
+            return key[:1] in (CERT_CLAIM_PREFIX, CERT_COUNT_PREFIX) and len(value) in (0, 4)
+        self.migrate_db(self.signatures_db, 'certificates', migrate_certificate, is_migrated,
+                        SIGNATURES_DB_VERSION_KEY, struct.pack('>H', SIGNATURES_DB_VERSION))
+
+    def migrate_claim_values(self):
+        '''Moves the values out of the claim info of older versions into the compressed values DB, along with
+        the values in the claim undo.'''
+        self.logger.info('moving claim values to the values DB...')
+        start, count, stats = time.time(), 0, Counter()
+        # a migration cut short resumes with the dictionary the values it moved were compressed with
+        zdict, unstored_zdict = self.values_db.get(VALUES_ZDICT_KEY), None
+        if not zdict:
+            samples = [fields[1] for fields in map(msgpack.loads, islice(
+                (value for _, value in self.claims_db.iterator()), ZDICT_SAMPLES)) if len(fields) == 8]
+            zdict = unstored_zdict = train_zdict(samples) if len(samples) >= ZDICT_MIN_SAMPLES else None
+        compressor = ValueCompressor(zdict)
+        entries = self.claims_db.iterator()
+        while True:
+            with self.claim_db.write_batch() as batch:
+                claims_batch, values_batch = self.claims_db.batch(batch), self.values_db.batch(batch)
+                if unstored_zdict:
+                    values_batch.put(VALUES_ZDICT_KEY, unstored_zdict)
+                    unstored_zdict = None
+                for claim_id, serialized in entries:
+                    fields = msgpack.loads(serialized)
+                    if len(fields) != 8:
+                        continue
+                    name, value, *rest = fields
+                    claims_batch.put(claim_id, ClaimInfo(name, *rest).serialized)
+                    stored = compressor.compress(value)
+                    values_batch.put(claim_id, stored)
+                    stats.update(value_bytes=len(value), stored_bytes=len(stored))
+                    count += 1
+                    if count % 10000 == 0:
+                        break
+                else:
+                    undo_batch = self.claim_undo_db.batch(batch)
+                    for height, undo in self.claim_undo_db.iterator():
+                        undo_info, trie_undo = msgpack.loads(undo)
+                        undo_info = [(claim_id, info and [info[0]] + info[2:], info and info[1])
+                                     for claim_id, info in undo_info]
+                        undo_batch.put(height, msgpack.dumps((undo_info, trie_undo)))
+                    values_batch.put(VALUES_DB_VERSION_KEY, struct.pack('>H', VALUES_DB_VERSION))
+                    break
+            self.logger.info('moved {:,d} claim values'.format(count))
+        self.logger.info('moved {:,d} claim values in {:.1f}s, {:,d} bytes compressed to {:,d}'.format(
+            count, time.time() - start, stats['value_bytes'], stats['stored_bytes']))
+
+    def migrate_db(self, db, description, migrate_entry, is_migrated, version_key, version):
+        '''Replaces every entry of a DB with what migrate_entry writes for it, 10,000 entries per batch. The
+        version is only written with the last batch, so a migration cut short resumes, leaving the entries
+        is_migrated tells it already wrote as they are.'''
+        self.logger.info('migrating {} DB to the keyed layout...'.format(description))
+        start, count = time.time(), 0
+        entries = db.iterator()
+        while True:
+            with db.write_batch() as batch:
+                for key, value in entries:
+                    if is_migrated(key, value):
+                        continue
+                    batch.delete(key)
+                    migrate_entry(batch, key, value)
+                    count += 1
+                    if count % 10000 == 0:
+                        break
+                else:
+                    batch.put(version_key, version)
+                    break
+            self.logger.info('migrated {:,d} {}'.format(count, description))
+        self.logger.info('migrated {:,d} {} in {:.1f}s'.format(count, description, time.time() - start))
 
     def flush(self, flush_utxos=False):
         # flush claims together with utxos as they are parsed together
         self.batched_flush_claims()
         return super().flush(flush_utxos=flush_utxos)
 
+    def assert_flushed(self):
+        super().assert_flushed()
+        assert not self.claim_cache
+        assert not self.claim_value_cache
+        assert not self.claims_for_name_cache
+        assert not self.claim_positions_cache
+        assert not self.claims_signed_by_cert_cache
+        assert not self.signed_claim_count_cache
+        assert not self.outpoint_to_claim_id_cache
+        assert not self.claimtrie_cache
+        assert not self.claim_supports_cache
+        assert not self.pending_abandons
+        assert not self.pending_claim_undo
+
+    def check_cache_size(self):
+        '''electrumx's check with the claim caches counted. They are flushed on every flush like the history,
+        so they share its share of CACHE_MB.'''
+        one_MB = 1000 * 1000
+        utxo_MB = (len(self.db_deletes) * 57 + len(self.utxo_cache) * 205) // one_MB
+        tx_hash_size = (self.tx_count - self.fs_tx_count) * 32 + (self.height - self.fs_height) * 42
+        hist_MB = (self.history.unflushed_memsize() + tx_hash_size) // one_MB
+        claim_MB = self.claim_cache_size() // one_MB
+        self.logger.info('our height: {:,d} daemon: {:,d} UTXOs {:,d}MB hist {:,d}MB claims {:,d}MB'
+                         .format(self.height, self.daemon.cached_height(), utxo_MB, hist_MB, claim_MB))
+        if utxo_MB + hist_MB + claim_MB >= self.cache_MB or hist_MB + claim_MB >= self.cache_MB // 5:
+            self.flush(utxo_MB >= self.cache_MB * 4 // 5)
+
+    def claim_cache_size(self):
+        '''Approximate bytes held by the claim write caches, the serialized values plus a fixed size per entry.'''
+        entries = sum(len(getattr(self, attr)) for attr in CLAIM_WRITE_CACHES)
+        entries += sum(map(len, self.claims_for_name_cache.values()))
+        entries += sum(map(len, self.claims_signed_by_cert_cache.values()))
+        entries += sum(map(len, self.claim_supports_cache.values()))
+        return self.claim_cache_bytes + entries * CLAIM_CACHE_ENTRY_SIZE
+
     def batched_flush_claims(self):
-        with self.claims_db.write_batch() as claims_batch:
-            with self.names_db.write_batch() as names_batch:
-                with self.signatures_db.write_batch() as signed_claims_batch:
-                    with self.outpoint_to_claim_id_db.write_batch() as outpoint_batch:
-                        self.flush_claims(claims_batch, names_batch, signed_claims_batch,
-                                          outpoint_batch)
-
-    def flush_claims(self, batch, names_batch, signed_claims_batch, outpoint_batch):
-        flush_start = time.time()
-        write_claim, write_name, write_cert = batch.put, names_batch.put, signed_claims_batch.put
-        write_outpoint = outpoint_batch.put
-        delete_claim, delete_outpoint, delete_name = batch.delete, outpoint_batch.delete, names_batch.delete
-        delete_cert = signed_claims_batch.delete
+        '''Commits claim state, its undo and the height they are at in a single batch.'''
+        caches = self.freeze_claims()
+        self.write_claims(caches, self.pending_claim_undo, self.height)
+        self.pending_claim_undo = []
+
+    def write_claims(self, caches, pending_claim_undo, height):
+        with self.claim_db.write_batch() as batch:
+            self.flush_claims(caches, self.claims_db.batch(batch), self.names_db.batch(batch),
+                              self.signatures_db.batch(batch), self.outpoint_to_claim_id_db.batch(batch),
+                              self.claimtrie_db.batch(batch))
+            self.flush_claim_values(caches['claim_value_cache'], self.values_db.batch(batch))
+            self.flush_claim_undo(self.claim_undo_db.batch(batch), pending_claim_undo, height)
+            batch.put(CLAIMS_HEIGHT_KEY, struct.pack('>i', height))
+
+    def flush_claim_values(self, values, batch):
+        '''Compresses and writes the flushed claim values, training the dictionary on the first flush
+        with enough of them.'''
+        if not self.value_compressor.zdict and len(values) >= ZDICT_MIN_SAMPLES:
+            zdict = train_zdict([value for value in islice(values.values(), ZDICT_SAMPLES) if value])
+            batch.put(VALUES_ZDICT_KEY, zdict)
+            self.value_compressor = ValueCompressor(zdict)
+            self.logger.info('trained a {:,d} bytes claim value dictionary'.format(len(zdict)))
+        compress, stats = self.value_compressor.compress, Counter()
+        for claim_id, value in values.items():
+            if value is None:
+                batch.delete(claim_id)
+                continue
+            stored = compress(value)
+            batch.put(claim_id, stored)
+            stats.update(values=1, value_bytes=len(value), stored_bytes=len(stored))
+        self.value_store_stats.update(stats)
+
+    def flush_claim_undo(self, batch, pending_claim_undo, height):
+        '''Writes the undo of the blocks advanced since the last flush and prunes the undo past the reorg limit.'''
+        for height_undo, undo_info, trie_undo in pending_claim_undo:
+            batch.put(struct.pack('>I', height_undo), msgpack.dumps((undo_info, trie_undo)))
+        min_height = self.min_undo_height(height)
+        pruned = 0
+        for key, _ in self.claim_undo_db.iterator():
+            if struct.unpack('>I', key)[0] >= min_height:
+                break
+            batch.delete(key)
+            pruned += 1
+        if pruned:
+            self.logger.info('pruned claim undo of {:,d} blocks'.format(pruned))
+
+    def freeze_claims(self):
+        '''Applies the pending abandons and hands over the claim caches to be written by flush_claims.'''
         for claim_id, outpoints in self.pending_abandons.items():
             claim = self.get_claim_info(claim_id)
             self.remove_claim_for_name(claim.name, claim_id)
@@ -76,70 +452,252 @@ class LBRYBlockProcessor(BlockProcessor):
                 self.remove_claim_from_certificate_claims(claim.cert_id, claim_id)
             self.remove_certificate(claim_id)
             self.claim_cache[claim_id] = None
+            self.claim_value_cache[claim_id] = None
+            self.claim_info_cache.invalidate(claim_id)
+            self.certificate_cache.invalidate(claim_id)
             for txid, tx_index in outpoints:
                 self.put_claim_id_for_outpoint(txid, tx_index, None)
-        for key, claim in self.claim_cache.items():
+        self.logger.info('flushing {:,d} blocks with {:,d} claims, {:,d} outpoints, {:,d} names, '
+                         '{:,d} certificates and {:,d} claim trie entries added while {:,d} were abandoned'
+                         .format(abs(self.height - self.db_height),
+                                 len(self.claim_cache), len(self.outpoint_to_claim_id_cache),
+                                 len(self.claims_for_name_cache),
+                                 len(self.claims_signed_by_cert_cache), len(self.claimtrie_cache),
+                                 len(self.pending_abandons)))
+        metrics = self.get_claim_metrics()
+        self.logger.info('claim metrics for the flushed blocks: {}'.format(format_metrics(metrics - self.flushed_metrics)))
+        if self.claim_pipeline_depth:
+            utilization = pipeline_utilization(metrics - self.flushed_metrics, self.claim_parse_workers)
+            self.logger.info('claim pipeline utilization: parse {parse:.0%}, apply {apply:.0%}, '
+                             'apply waiting on parse {apply_waiting:.0%}'.format(**utilization))
+        self.flushed_metrics = metrics
+        self.pending_abandons = {}
+        self.claim_cache_bytes = 0
+        caches = {attr: getattr(self, attr) for attr in CLAIM_WRITE_CACHES}
+        for attr in CLAIM_WRITE_CACHES:
+            setattr(self, attr, {})
+        return caches
+
+    def flush_claims(self, caches, batch, names_batch, signed_claims_batch, outpoint_batch, claimtrie_batch):
+        '''Writes the claim caches handed over by freeze_claims to the batches.'''
+        flush_start = time.time()
+        write_claim, write_name, write_cert = batch.put, names_batch.put, signed_claims_batch.put
+        write_outpoint = outpoint_batch.put
+        delete_claim, delete_outpoint, delete_name = batch.delete, outpoint_batch.delete, names_batch.delete
+        delete_cert = signed_claims_batch.delete
+        for key, claim in caches['claim_cache'].items():
             if claim:
                 write_claim(key, claim)
             else:
                 delete_claim(key)
-        for name, claims in self.claims_for_name_cache.items():
-            if not claims:
-                delete_name(name)
+        for name, claims in caches['claims_for_name_cache'].items():
+            prefix = name_claims_prefix(name)
+            for position, claim_id in claims.items():
+                if claim_id:
+                    write_name(prefix + struct.pack('>I', position), claim_id)
+                else:
+                    delete_name(prefix + struct.pack('>I', position))
+        for claim_id, position in caches['claim_positions_cache'].items():
+            if position:
+                write_name(CLAIM_POSITION_PREFIX + claim_id, struct.pack('>I', position))
             else:
-                write_name(name, msgpack.dumps(claims))
-        for cert_id, claims in self.claims_signed_by_cert_cache.items():
-            if not claims:
-                delete_cert(cert_id)
+                delete_name(CLAIM_POSITION_PREFIX + claim_id)
+        for cert_id, claims in caches['claims_signed_by_cert_cache'].items():
+            for claim_id, is_signed in claims.items():
+                if is_signed:
+                    write_cert(CERT_CLAIM_PREFIX + cert_id + claim_id, b'')
+                else:
+                    delete_cert(CERT_CLAIM_PREFIX + cert_id + claim_id)
+        for cert_id, count in caches['signed_claim_count_cache'].items():
+            if count:
+                write_cert(CERT_COUNT_PREFIX + cert_id, struct.pack('>I', count))
             else:
-                write_cert(cert_id, msgpack.dumps(claims))
-        for key, claim_id in self.outpoint_to_claim_id_cache.items():
+                delete_cert(CERT_COUNT_PREFIX + cert_id)
+        for key, claim_id in caches['outpoint_to_claim_id_cache'].items():
             if claim_id:
                 write_outpoint(key, claim_id)
             else:
                 delete_outpoint(key)
-        self.logger.info('flushed {:,d} blocks with {:,d} claims, {:,d} outpoints, {:,d} names '
-                         'and {:,d} certificates added while {:,d} were abandoned in {:.1f}s, committing...'
-                         .format(self.height - self.db_height,
-                                 len(self.claim_cache), len(self.outpoint_to_claim_id_cache),
-                                 len(self.claims_for_name_cache),
-                                 len(self.claims_signed_by_cert_cache), len(self.pending_abandons),
-                                 time.time() - flush_start))
-        self.claim_cache = {}
-        self.claims_for_name_cache = {}
-        self.claims_signed_by_cert_cache = {}
-        self.outpoint_to_claim_id_cache = {}
-        self.pending_abandons = {}
-
-    def assert_flushed(self):
-        super().assert_flushed()
-        assert not self.claim_cache
-        assert not self.claims_for_name_cache
-        assert not self.claims_signed_by_cert_cache
-        assert not self.outpoint_to_claim_id_cache
-        assert not self.pending_abandons
+        for key, value in caches['claimtrie_cache'].items():
+            if value:
+                claimtrie_batch.put(key, value)
+            else:
+                claimtrie_batch.delete(key)
+        for claim_id, supports in caches['claim_supports_cache'].items():
+            for outpoint, support in supports.items():
+                if support:
+                    claimtrie_batch.put(SUPPORTS_PREFIX + claim_id + outpoint, support)
+                else:
+                    claimtrie_batch.delete(SUPPORTS_PREFIX + claim_id + outpoint)
+        self.logger.info('wrote claims in {:.1f}s, committing...'.format(time.time() - flush_start))
 
     def advance_blocks(self, blocks):
-        # save height, advance blocks as usual, then hook our claim tx processing
+        # index the claims first, electrumx may flush them with its height once it advanced the blocks
         height = self.height + 1
+        min_undo_height = self.min_undo_height(self.daemon.cached_height())
+        start = time.perf_counter()
+        pipeline = unparsed = None
+        if self.claim_pipeline_depth:
+            # the parse stage starts on the pool ahead of the UTXO and claim updates, the apply stage below
+            pipeline, unparsed = deque(), deque(blocks)
+            self.submit_claim_parses(unparsed, pipeline)
+        if self.claim_parse_workers and pipeline is None:
+            self.parsed_claim_outputs = self.parse_claim_outputs_in_parallel(blocks)
+        try:
+            for index, block in enumerate(blocks):
+                self.block_start_metrics = self.get_claim_metrics()
+                if pipeline is not None:
+                    self.parsed_claim_outputs = self.take_claim_parse(pipeline)
+                    self.submit_claim_parses(unparsed, pipeline)
+                    apply_start = time.perf_counter()
+                self.advance_claim_block(block.transactions, height + index, height + index >= min_undo_height)
+                if pipeline is not None:
+                    self.claim_metrics['pipeline_apply_us'] += int(1e6 * (time.perf_counter() - apply_start))
+                self.last_block_metrics = self.get_claim_metrics() - self.block_start_metrics
+        finally:
+            if pipeline:
+                for _, future in pipeline:
+                    if future:
+                        future.cancel()
+            if pipeline is not None:
+                self.claim_metrics['pipeline_wall_us'] += int(1e6 * (time.perf_counter() - start))
+            # what was read ahead is only valid until the next flush writes the DB
+            if self.claim_read_ahead is not None:
+                self.claim_read_ahead.clear()
+        self.parsed_claim_outputs = {}
+        self.checked_signatures = {}
         super().advance_blocks(blocks)
-        pending_undo = []
-        for index, block in enumerate(blocks):
-            undo = self.advance_claim_txs(block.transactions, height + index)
-            pending_undo.append((height+index, undo,))
-        with self.claim_undo_db.write_batch() as writer:
-            for height, undo_info in pending_undo:
-                writer.put(struct.pack(">I", height), msgpack.dumps(undo_info))
+
+    def advance_claim_block(self, txs, height, keep_undo):
+        '''Indexes the claims of a block, keeping its undo if a reorg can reach it.'''
+        if self.claim_read_ahead is not None:
+            self.prefetch_claim_state(txs)
+        if self.should_validate_signatures and self.claim_parse_workers:
+            self.validate_signatures_in_parallel(txs)
+        undo, trie_undo = self.advance_claim_txs(txs, height, keep_undo)
+        if keep_undo:
+            self.pending_claim_undo.append((height, undo, trie_undo,))
+
+    def prefetch_claim_state(self, txs):
+        '''Reads the claim state advancing txs looks up in sorted key order, in place of the scattered point
+        reads it would do otherwise. Takes two rounds as the claims and supports spent outpoints point to are only
+        known after reading the first one.'''
+        read = self.claim_read_ahead.read
+        outpoints, support_outpoints, claim_ids, names = set(), [], set(), set()
+        for tx, txid in txs:
+            if tx.has_claims:
+                for nout, output in enumerate(tx.outputs):
+                    claim = output.claim
+                    if isinstance(claim, ClaimSupport):
+                        support_outpoints.append(txid + struct.pack('>I', nout))
+                    if isinstance(claim, (ClaimUpdate, ClaimSupport)):
+                        claim_ids.add(claim.claim_id)
+                    if claim:
+                        names.add(claim.name)
+            for txin in tx.inputs:
+                outpoint = txin.prev_hash + struct.pack('>I', txin.prev_idx)
+                if self.outpoint_filter is None or outpoint in self.outpoint_filter:
+                    outpoints.add(outpoint)
+        keys = [OUTPOINTS_PREFIX + outpoint for outpoint in outpoints]
+        keys.extend(CLAIMTRIE_PREFIX + SUPPORT_OUTPOINT_PREFIX + outpoint for outpoint in outpoints)
+        # new supports look up their outpoint for the undo
+        keys.extend(CLAIMTRIE_PREFIX + SUPPORT_OUTPOINT_PREFIX + outpoint for outpoint in support_outpoints)
+        reads = read(keys, [NAMES_PREFIX + name_claims_prefix(name) for name in names])
+
+        values = self.claim_read_ahead.values
+        claim_ids.update(filter(None, (values[key] for key in keys[:2 * len(outpoints)])))
+        spent_supports = [(values[key], key[2:]) for key in keys[len(outpoints):2 * len(outpoints)] if values[key]]
+        keys = [CLAIMS_PREFIX + claim_id for claim_id in claim_ids]
+        keys.extend(NAMES_PREFIX + CLAIM_POSITION_PREFIX + claim_id for claim_id in claim_ids)
+        keys.extend(CLAIMTRIE_PREFIX + SUPPORTS_PREFIX + claim_id + outpoint for claim_id, outpoint in spent_supports)
+        reads += read(keys)
+        self.claim_metrics['prefetched_reads'] += reads
+
+    def submit_claim_parses(self, unparsed, pipeline):
+        '''Parse stage of the pipeline: keeps the claim outputs of up to claim_pipeline_depth blocks
+        parsing on the process pool, the queue holding their outpoints and futures in block order.'''
+        while unparsed and len(pipeline) < self.claim_pipeline_depth:
+            outpoints, outputs = claim_outputs_to_parse([unparsed.popleft()])
+            future = outputs and self.get_claim_parse_executor().submit(timed_parse_claim_outputs, self.coin, outputs)
+            pipeline.append((outpoints, future))
+
+    def take_claim_parse(self, pipeline):
+        '''Waits for the parse of the next block, the time waited being the apply stage starving.'''
+        outpoints, future = pipeline.popleft()
+        if not future:
+            return {}
+        start = time.perf_counter()
+        parsed, parse_time = future.result()
+        self.claim_metrics['pipeline_wait_us'] += int(1e6 * (time.perf_counter() - start))
+        self.claim_metrics['pipeline_parse_us'] += int(1e6 * parse_time)
+        return dict(zip(outpoints, parsed))
+
+    def parse_claim_outputs_in_parallel(self, blocks):
+        '''Runs the state independent part of claim parsing for all blocks on a process pool.'''
+        outpoints, outputs = claim_outputs_to_parse(blocks)
+        if len(outputs) < MIN_PARALLEL_CLAIM_OUTPUTS:
+            return {}
+        chunk_size = len(outputs) // (self.claim_parse_workers * 4) + 1
+        chunks = [outputs[start:start + chunk_size] for start in range(0, len(outputs), chunk_size)]
+        results = self.get_claim_parse_executor().map(parse_claim_outputs, repeat(self.coin), chunks)
+        return dict(zip(outpoints, chain.from_iterable(results)))
+
+    def validate_signatures_in_parallel(self, txs):
+        '''Checks the signatures of a block on the process pool, grouped so each certificate is decoded once.
+        Claims signed by a certificate changed in this same block are left to be checked in order.'''
+        claims_by_cert, outpoints_by_cert, changed_claim_ids = {}, {}, set()
+        for tx, txid in txs:
+            if not tx.has_claims:
+                continue
+            for nout, output in enumerate(tx.outputs):
+                claim = output.claim
+                if isinstance(claim, NameClaim):
+                    changed_claim_ids.add(claim_id_hash(txid, nout))
+                elif isinstance(claim, ClaimUpdate):
+                    changed_claim_ids.add(claim.claim_id)
+                else:
+                    continue
+                parsed = self.parsed_claim_outputs.get((txid, nout))
+                if not parsed:
+                    parsed = parse_claim_outputs(self.coin, [(claim.name, claim.value, output.pk_script)])[0]
+                    self.parsed_claim_outputs[(txid, nout)] = parsed
+                address, cert_id = parsed
+                if cert_id:
+                    claims_by_cert.setdefault(cert_id, []).append((claim.value, address))
+                    outpoints_by_cert.setdefault(cert_id, []).append((txid, nout))
+        certificates = []
+        for cert_id in claims_by_cert:
+            cert_value = None if cert_id in changed_claim_ids else self.get_claim_value(cert_id)
+            if cert_value:
+                certificates.append((cert_id, cert_value))
+        if sum(len(claims_by_cert[cert_id]) for cert_id, _ in certificates) < MIN_PARALLEL_CLAIM_OUTPUTS:
+            return
+        chunk_size = len(certificates) // (self.claim_parse_workers * 4) + 1
+        results = self.get_claim_parse_executor().map(
+            validate_signatures, [value for _, value in certificates],
+            [claims_by_cert[cert_id] for cert_id, _ in certificates], chunksize=chunk_size)
+        for (cert_id, _), valid_signatures in zip(certificates, results):
+            for outpoint, is_valid in zip(outpoints_by_cert[cert_id], valid_signatures):
+                self.checked_signatures[outpoint] = is_valid
+                self.claim_metrics['signatures_validated' if is_valid else 'signatures_rejected'] += 1
+
+    def get_claim_parse_executor(self):
+        if not self.claim_parse_executor:
+            self.claim_parse_executor = ProcessPoolExecutor(self.claim_parse_workers)
+        return self.claim_parse_executor
 
     def spend_utxo(self, tx_hash, tx_idx):
         # this is called during electrumx tx advance, we gather spents in the process to avoid looping again
         result = super().spend_utxo(tx_hash, tx_idx)
         return result
 
-    def advance_claim_txs(self, txs, height):
-        # TODO: generate claim undo info!
+    def advance_claim_txs(self, txs, height, keep_undo=True):
+        '''Indexes the claims of a block. The undo only has the values claims had if keep_undo, as reading
+        them back is only worth it for the blocks a reorg can reach.'''
         undo_info = []
         add_undo = undo_info.append
+        metrics = self.claim_metrics
+        self.claimtrie_undo = {}
         update_inputs = set()
         for tx, txid in txs:
             update_inputs.clear()
@@ -147,36 +705,47 @@ class LBRYBlockProcessor(BlockProcessor):
                 for index, output in enumerate(tx.outputs):
                     claim = output.claim
                     if isinstance(claim, NameClaim):
+                        metrics['claims'] += 1
                         add_undo(self.advance_claim_name_transaction(output, height, txid, index))
                     elif isinstance(claim, ClaimUpdate):
                         update_input = self.get_update_input(claim, tx.inputs)
                         if update_input:
+                            metrics['updates'] += 1
                             update_inputs.add(update_input)
-                            add_undo(self.advance_update_claim(output, height, txid, index))
+                            add_undo(self.advance_update_claim(output, height, txid, index, keep_undo))
                         else:
+                            metrics['rejected_updates'] += 1
                             info = (hash_to_hex_str(txid), hash_to_hex_str(claim.claim_id),)
                             self.logger.error("REJECTED: {} updating {}".format(*info))
                     elif isinstance(claim, ClaimSupport):
+                        metrics['supports'] += 1
                         self.advance_support(claim, txid, index, height, output.value)
             for txin in tx.inputs:
-                if txin not in update_inputs:
+                if txin not in update_inputs and self.may_be_claim_outpoint(txin.prev_hash, txin.prev_idx):
                     abandoned_claim_id = self.abandon_spent(txin.prev_hash, txin.prev_idx)
                     if abandoned_claim_id:
-                        add_undo((abandoned_claim_id, self.get_claim_info(abandoned_claim_id)))
-        return undo_info
+                        metrics['abandons'] += 1
+                        abandoned_claim_info = self.get_claim_info(abandoned_claim_id)
+                        add_undo((abandoned_claim_id, abandoned_claim_info,
+                                  self.get_claim_value(abandoned_claim_id) if keep_undo else None))
+                    elif not self.spend_support(txin.prev_hash, txin.prev_idx) and self.outpoint_filter is not None:
+                        metrics['outpoint_filter_false_positives'] += 1
+        return undo_info, self.claimtrie_undo
 
-    def advance_update_claim(self, output, height, txid, nout):
+    def advance_update_claim(self, output, height, txid, nout, keep_undo=True):
         claim_id = output.claim.claim_id
         claim_info = self.claim_info_from_output(output, txid, nout, height)
         old_claim_info = self.get_claim_info(claim_id)
+        old_value = self.get_claim_value(claim_id) if keep_undo else None
         self.put_claim_id_for_outpoint(old_claim_info.txid, old_claim_info.nout, None)
         if old_claim_info.cert_id:
             self.remove_claim_from_certificate_claims(old_claim_info.cert_id, claim_id)
         if claim_info.cert_id:
             self.put_claim_id_signed_by_cert_id(claim_info.cert_id, claim_id)
         self.put_claim_info(claim_id, claim_info)
+        self.put_claim_value(claim_id, output.claim.value)
         self.put_claim_id_for_outpoint(txid, nout, claim_id)
-        return claim_id, old_claim_info
+        return claim_id, old_claim_info, old_value
 
     def advance_claim_name_transaction(self, output, height, txid, nout):
         claim_id = claim_id_hash(txid, nout)
@@ -184,11 +753,12 @@ class LBRYBlockProcessor(BlockProcessor):
         if claim_info.cert_id:
             self.put_claim_id_signed_by_cert_id(claim_info.cert_id, claim_id)
         self.put_claim_info(claim_id, claim_info)
+        self.put_claim_value(claim_id, output.claim.value)
         self.put_claim_for_name(claim_info.name, claim_id)
         self.put_claim_id_for_outpoint(txid, nout, claim_id)
-        return claim_id, None
+        return claim_id, None, None
 
-    def backup_from_undo_info(self, claim_id, undo_claim_info):
+    def backup_from_undo_info(self, claim_id, undo_claim_info, undo_value):
         """
         Undo information holds a claim state **before** a transaction changes it
         There are 4 possibilities when processing it, of which only 3 are valid ones:
@@ -217,58 +787,170 @@ class LBRYBlockProcessor(BlockProcessor):
                             "Please report. Resetting the data folder (reindex) solves it for now.")
         if undo_claim_info:
             self.put_claim_info(claim_id, undo_claim_info)
+            self.put_claim_value(claim_id, undo_value)
             if undo_claim_info.cert_id:
-                cert_id = self._checksig(undo_claim_info.name, undo_claim_info.value, undo_claim_info.address)
-                self.put_claim_id_signed_by_cert_id(cert_id, claim_id)
+                # the undo has the certificate the signature was checked against when advancing
+                self.put_claim_id_signed_by_cert_id(undo_claim_info.cert_id, claim_id)
             self.put_claim_for_name(undo_claim_info.name, claim_id)
             self.put_claim_id_for_outpoint(undo_claim_info.txid, undo_claim_info.nout, claim_id)
 
     def backup_txs(self, txs):
         self.logger.info("Reorg at height {} with {} transactions.".format(self.height, len(txs)))
-        undo_info = msgpack.loads(self.claim_undo_db.get(struct.pack(">I", self.height)), use_list=False)
-        for claim_id, undo_claim_info in reversed(undo_info):
-            self.backup_from_undo_info(claim_id, undo_claim_info)
+        undo = self.backup_claim_undo.pop(self.height, None)
+        if undo is None:
+            undo = msgpack.loads(self.claim_undo_db.get(struct.pack(">I", self.height)), use_list=False)
+        undo_info, trie_undo = undo
+        for claim_id, undo_claim_info, undo_value in reversed(undo_info):
+            self.backup_from_undo_info(claim_id, undo_claim_info, undo_value)
+        self.restore_claimtrie(trie_undo)
+        if self.outpoint_filter is not None:
+            for key, claim_id in trie_undo.items():
+                if claim_id and key[:1] == SUPPORT_OUTPOINT_PREFIX:
+                    self.outpoint_filter.add(key[1:])
         return super().backup_txs(txs)
 
+    def restore_claimtrie(self, trie_undo):
+        '''Puts back the claim trie entries a block changed, as they were before it.'''
+        for key, value in trie_undo.items():
+            if key[:1] != SUPPORTS_PREFIX:
+                self.claimtrie_cache[key] = value
+            else:
+                claim_id, outpoint = key[1:1 + CLAIM_ID_LENGTH], key[1 + CLAIM_ID_LENGTH:]
+                self.claim_supports_cache.setdefault(claim_id, {})[outpoint] = value
+
     def backup_blocks(self, raw_blocks):
+        '''Backs up the claims of the blocks from their undo, read ahead in a single scan, and commits them once
+        with electrumx's backup flush.'''
+        start = time.perf_counter()
         self.batched_flush_claims()
-        super().backup_blocks(raw_blocks=raw_blocks)
+        self.backup_claim_undo = self.read_claim_undo(self.height - len(raw_blocks) + 1, self.height)
+        try:
+            if self.claim_read_ahead is not None:
+                # nothing is written until the backup flush, so the claims read ahead stay valid for every block
+                undo_infos = (undo_info for undo_info, _ in self.backup_claim_undo.values())
+                self.claim_read_ahead.read(keys=[CLAIMS_PREFIX + entry[0] for entry in chain.from_iterable(undo_infos)])
+            super().backup_blocks(raw_blocks=raw_blocks)
+        finally:
+            self.backup_claim_undo = {}
+            if self.claim_read_ahead is not None:
+                self.claim_read_ahead.clear()
+        duration = time.perf_counter() - start
+        self.claim_metrics.update(reorgs=1, reorg_blocks=len(raw_blocks), reorg_us=int(1e6 * duration))
+        self.last_reorg = {'height': self.height, 'blocks': len(raw_blocks), 'duration': duration}
+
+    def read_claim_undo(self, min_height, max_height):
+        '''Claim undo and claim trie undo of the heights between min_height and max_height, scanning the undo DB
+        down from its top as it only holds the blocks a reorg can reach.'''
+        undo = {}
+        for key, value in self.claim_undo_db.iterator(reverse=True):
+            height = struct.unpack('>I', key)[0]
+            if height < min_height:
+                break
+            if height <= max_height:
+                undo[height] = msgpack.loads(value, use_list=False)
+        return undo
+
+    def backup_flush(self):
+        # what was read ahead for the backup is stale once it is written
+        if self.claim_read_ahead is not None:
+            self.claim_read_ahead.clear()
         self.batched_flush_claims()
+        super().backup_flush()
 
     def shutdown(self, executor):
         self.batched_flush_claims()
+        if self.claim_parse_executor:
+            self.claim_parse_executor.shutdown()
         return super().shutdown(executor=executor)
 
     def backup_claim_name(self, txid, nout):
         self.abandon_spent(txid, nout)
 
     def advance_support(self, claim_support, txid, nout, height, amount):
-        # TODO: check for more controller claim rules, like takeover or ordering
-        pass
+        claim_id = claim_support.claim_id
+        self.put_support(claim_id, SupportInfo(claim_support.name, txid, nout, amount, height))
+        self._put_trie(SUPPORT_OUTPOINT_PREFIX + txid + struct.pack('>I', nout), claim_id)
+        if self.outpoint_filter is not None:
+            self.outpoint_filter.add(txid + struct.pack('>I', nout))
+
+    def spend_support(self, tx_hash, tx_idx):
+        outpoint_key = SUPPORT_OUTPOINT_PREFIX + tx_hash + struct.pack('>I', tx_idx)
+        claim_id = self._get_trie(outpoint_key)
+        if claim_id:
+            if self.debug_claims:
+                self.logger.debug("[-] Spent support: {}:{} for {}".format(hash_to_hex_str(tx_hash), tx_idx,
+                                                                         hash_to_hex_str(claim_id)))
+            support = self.get_support(claim_id, tx_hash, tx_idx)
+            if support:
+                self.remove_support(claim_id, support)
+            self._put_trie(outpoint_key, None)
+            self.claim_metrics['spent_supports'] += 1
+            return claim_id
 
     def claim_info_from_output(self, output, txid, nout, height):
         amount = output.value
-        address = self.coin.address_from_script(output.pk_script)
-        name, value, cert_id = output.claim.name, output.claim.value, None
+        name, value = output.claim.name, output.claim.value
+        parsed = self.parsed_claim_outputs.pop((txid, nout), None)
+        address, cert_id = parsed or parse_claim_outputs(self.coin, [(name, value, output.pk_script)])[0]
         assert txid and address
-        cert_id = self._checksig(name, value, address)
-        return ClaimInfo(name, value, txid, nout, amount, address, height, cert_id)
+        is_valid = self.checked_signatures.pop((txid, nout), None)
+        if is_valid is None:
+            cert_id = self.validate_signature(value, address, cert_id)
+        elif not is_valid:
+            cert_id = None
+        return ClaimInfo(name, txid, nout, amount, address, height, cert_id)
 
-    def _checksig(self, name, value, address):
-        try:
-            parse_lbry_uri(name.decode())  # skip invalid names
-            cert_id = Claim.FromString(value).publisherSignature.certificateId[::-1] or None
-            if not self.should_validate_signatures:
-                return cert_id
-            if cert_id:
-                cert_claim = self.get_claim_info(cert_id)
-                if cert_claim:
-                    certificate = smart_decode(cert_claim.value)
-                    claim_dict = smart_decode(value)
-                    claim_dict.validate_signature(address, certificate)
-                    return cert_id
-        except Exception as e:
-            pass
+    def validate_signature(self, value, address, cert_id):
+        if not cert_id or not self.should_validate_signatures:
+            return cert_id
+        certificate = self.get_certificate(cert_id)
+        is_valid = certificate is not None and is_signature_valid(certificate, value, address)
+        self.claim_metrics['signatures_validated' if is_valid else 'signatures_rejected'] += 1
+        return cert_id if is_valid else None
+
+    def get_certificate(self, cert_id):
+        '''Decoded certificate claim, None if it doesn't exist or can't be decoded.'''
+        certificate = self.certificate_cache.get(cert_id)
+        if certificate:
+            return certificate
+        cert_value = self.get_claim_value(cert_id)
+        certificate = decode_certificate(cert_value) if cert_value else None
+        if certificate:
+            self.certificate_cache.set(cert_id, certificate)
+        return certificate
+
+    def get_claim_metrics(self):
+        '''Cumulative claim processing counters, including the caches ones.'''
+        metrics = self.claim_metrics.copy()
+        metrics.update(claim_info_cache_hits=self.claim_info_cache.hits,
+                       claim_info_cache_misses=self.claim_info_cache.misses,
+                       certificate_cache_hits=self.certificate_cache.hits,
+                       certificate_cache_misses=self.certificate_cache.misses)
+        return metrics
+
+    async def rpc_claim_metrics(self):
+        '''Admin RPC: claim processing counters of the last block, since the last flush and since startup.'''
+        metrics = self.get_claim_metrics()
+        result = {'height': self.height,
+                  'last_block': dict(self.last_block_metrics),
+                  'since_flush': dict(metrics - self.flushed_metrics),
+                  'total': dict(metrics)}
+        if self.outpoint_filter is not None:
+            false_positives = metrics['outpoint_filter_false_positives']
+            misses = false_positives + metrics['outpoint_filter_skips']
+            result['outpoint_filter'] = {'size': self.outpoint_filter_size,
+                                         'outpoints': len(self.outpoint_filter),
+                                         'false_positive_rate': false_positives / misses if misses else 0.0}
+        if self.last_reorg:
+            result['last_reorg'] = self.last_reorg
+        stats = self.value_store_stats
+        result['value_store'] = {'values_written': stats['values'],
+                                 'compression_ratio': stats['value_bytes'] / stats['stored_bytes']
+                                 if stats['stored_bytes'] else 0.0,
+                                 'dictionary_size': len(self.value_compressor.zdict or b'')}
+        if self.claim_pipeline_depth:
+            result['pipeline'] = pipeline_utilization(metrics, self.claim_parse_workers)
+        return result
 
     def get_update_input(self, claim, inputs):
         claim_id = claim.claim_id
@@ -283,72 +965,296 @@ class LBRYBlockProcessor(BlockProcessor):
     def abandon_spent(self, tx_hash, tx_idx):
         claim_id = self.get_claim_id_from_outpoint(tx_hash, tx_idx)
         if claim_id:
-            self.logger.info("[!] Abandon: {}".format(hash_to_hex_str(claim_id)))
+            if self.debug_claims:
+                self.logger.debug("[!] Abandon: {}".format(hash_to_hex_str(claim_id)))
             self.pending_abandons.setdefault(claim_id, []).append((tx_hash, tx_idx,))
             return claim_id
 
     def put_claim_id_for_outpoint(self, tx_hash, tx_idx, claim_id):
-        self.logger.info("[+] Adding outpoint: {}:{} for {}.".format(hash_to_hex_str(tx_hash), tx_idx,
-                                                                     hash_to_hex_str(claim_id) if claim_id else None))
-        self.outpoint_to_claim_id_cache[tx_hash + struct.pack('>I', tx_idx)] = claim_id
+        if self.debug_claims:
+            self.logger.debug("[+] Adding outpoint: {}:{} for {}.".format(hash_to_hex_str(tx_hash), tx_idx,
+                                                                         hash_to_hex_str(claim_id) if claim_id else None))
+        key = tx_hash + struct.pack('>I', tx_idx)
+        self.outpoint_to_claim_id_cache[key] = claim_id
+        if claim_id and self.outpoint_filter is not None:
+            self.outpoint_filter.add(key)
 
     def remove_claim_id_for_outpoint(self, tx_hash, tx_idx):
-        self.logger.info("[-] Remove outpoint: {}:{}.".format(hash_to_hex_str(tx_hash), tx_idx))
+        if self.debug_claims:
+            self.logger.debug("[-] Remove outpoint: {}:{}.".format(hash_to_hex_str(tx_hash), tx_idx))
         self.outpoint_to_claim_id_cache[tx_hash + struct.pack('>I', tx_idx)] = None
 
     def get_claim_id_from_outpoint(self, tx_hash, tx_idx):
         key = tx_hash + struct.pack('>I', tx_idx)
-        return self.outpoint_to_claim_id_cache.get(key) or self.outpoint_to_claim_id_db.get(key)
+        if key in self.outpoint_to_claim_id_cache:
+            return self.outpoint_to_claim_id_cache[key]
+        self.claim_metrics['db_reads'] += 1
+        return self.outpoint_to_claim_id_db.get(key)
 
     def get_claims_for_name(self, name):
-        if name in self.claims_for_name_cache: return self.claims_for_name_cache[name]
-        db_claims = self.names_db.get(name)
-        return msgpack.loads(db_claims) if db_claims else {}
+        '''{claim_id: sequence}, the sequence being the 1 based order of the claim among the ones for the name.'''
+        return {claim_id: sequence for sequence, claim_id in enumerate(self.get_claim_ids_for_name(name), start=1)}
+
+    def get_claim_ids_for_name(self, name):
+        prefix = name_claims_prefix(name)
+        claims = {struct.unpack('>I', key[len(prefix):])[0]: claim_id
+                  for key, claim_id in self.names_db.iterator(prefix=prefix)}
+        claims.update(self.claims_for_name_cache.get(name, {}))
+        return [claim_id for _, claim_id in sorted(claims.items()) if claim_id]
+
+    def get_claim_sequence(self, name, claim_id):
+        '''Sequence of a claim for a name, None if the claim isn't for that name.'''
+        if self.get_claim_position(claim_id):
+            for sequence, other_claim_id in enumerate(self.get_claim_ids_for_name(name), start=1):
+                if other_claim_id == claim_id:
+                    return sequence
+
+    def get_claim_id_for_sequence(self, name, sequence):
+        claim_ids = self.get_claim_ids_for_name(name)
+        if 0 < sequence <= len(claim_ids):
+            return claim_ids[sequence - 1]
+
+    def get_claim_position(self, claim_id):
+        '''Position never changes while the claim exists, sequences are ranks of positions.'''
+        if claim_id in self.claim_positions_cache:
+            return self.claim_positions_cache[claim_id]
+        self.claim_metrics['db_reads'] += 1
+        position = self.names_db.get(CLAIM_POSITION_PREFIX + claim_id)
+        return struct.unpack('>I', position)[0] if position else None
+
+    def get_last_claim_position(self, name):
+        if name in self.last_claim_position_cache:
+            return self.last_claim_position_cache[name]
+        for key, _ in self.names_db.iterator(prefix=name_claims_prefix(name), reverse=True):
+            return struct.unpack('>I', key[-4:])[0]
+        return 0
 
     def put_claim_for_name(self, name, claim_id):
-        self.logger.info("[+] Adding claim {} for name {}.".format(hash_to_hex_str(claim_id), name))
-        claims = self.get_claims_for_name(name)
-        claims.setdefault(claim_id, max(claims.values() or [0]) + 1)
-        self.claims_for_name_cache[name] = claims
+        if self.debug_claims:
+            self.logger.debug("[+] Adding claim {} for name {}.".format(hash_to_hex_str(claim_id), name))
+        if self.get_claim_position(claim_id):
+            return
+        position = self.get_last_claim_position(name) + 1
+        self.claims_for_name_cache.setdefault(name, {})[position] = claim_id
+        self.claim_positions_cache[claim_id] = position
+        self.last_claim_position_cache[name] = position
 
     def remove_claim_for_name(self, name, claim_id):
-        self.logger.info("[-] Removing claim from name: {} - {}".format(hash_to_hex_str(claim_id), name))
-        claims = self.get_claims_for_name(name)
-        claim_n = claims.pop(claim_id)
-        for claim_id, number in claims.items():
-            if number > claim_n:
-                claims[claim_id] = number - 1
-        self.claims_for_name_cache[name] = claims
-
-    def get_signed_claim_ids_by_cert_id(self, cert_id):
-        if cert_id in self.claims_signed_by_cert_cache: return self.claims_signed_by_cert_cache[cert_id]
-        db_claims = self.signatures_db.get(cert_id)
-        return msgpack.loads(db_claims, use_list=True) if db_claims else []
+        if self.debug_claims:
+            self.logger.debug("[-] Removing claim from name: {} - {}".format(hash_to_hex_str(claim_id), name))
+        position = self.get_claim_position(claim_id)
+        if not position:
+            return
+        self.claims_for_name_cache.setdefault(name, {})[position] = None
+        self.claim_positions_cache[claim_id] = None
+
+    def get_signed_claim_ids_by_cert_id(self, cert_id, after=None, limit=None):
+        '''Claim ids signed by a certificate, sorted by claim id, read with a range scan seeking past the claim id
+        after up to limit of them.'''
+        prefix = CERT_CLAIM_PREFIX + cert_id
+        # copied at once, as sessions list signed claims while the block processor thread changes them
+        pending = dict(self.claims_signed_by_cert_cache.get(cert_id, {}))
+        entries = self.signatures_db.iterator(prefix=prefix, start=after + b'\x00' if after else None)
+        db_claim_ids = (key[len(prefix):] for key, _ in entries)
+        added_claim_ids = sorted(claim_id for claim_id, is_signed in pending.items()
+                                 if is_signed and (after is None or claim_id > after))
+        claim_ids = (claim_id for claim_id, _ in groupby(merge(db_claim_ids, added_claim_ids))
+                     if pending.get(claim_id, True))
+        return list(islice(claim_ids, limit))
+
+    def get_signed_claim_count(self, cert_id):
+        if cert_id in self.signed_claim_count_cache:
+            return self.signed_claim_count_cache[cert_id]
+        count = self.signatures_db.get(CERT_COUNT_PREFIX + cert_id)
+        return struct.unpack('>I', count)[0] if count else 0
+
+    def is_signed_by(self, cert_id, claim_id):
+        pending = self.claims_signed_by_cert_cache.get(cert_id, {})
+        if claim_id in pending:
+            return pending[claim_id]
+        self.claim_metrics['db_reads'] += 1
+        return self.signatures_db.get(CERT_CLAIM_PREFIX + cert_id + claim_id) is not None
 
     def put_claim_id_signed_by_cert_id(self, cert_id, claim_id):
-        self.logger.info("[+] Adding signature: {} - {}".format(hash_to_hex_str(claim_id), hash_to_hex_str(cert_id)))
-        certs = self.get_signed_claim_ids_by_cert_id(cert_id)
-        certs.append(claim_id)
-        self.claims_signed_by_cert_cache[cert_id] = certs
+        if self.debug_claims:
+            self.logger.debug("[+] Adding signature: {} - {}".format(hash_to_hex_str(claim_id),
+                                                                     hash_to_hex_str(cert_id)))
+        if not self.is_signed_by(cert_id, claim_id):
+            self.claims_signed_by_cert_cache.setdefault(cert_id, {})[claim_id] = True
+            self.signed_claim_count_cache[cert_id] = self.get_signed_claim_count(cert_id) + 1
 
     def remove_certificate(self, cert_id):
-        self.logger.info("[-] Removing certificate: {}".format(hash_to_hex_str(cert_id)))
-        self.claims_signed_by_cert_cache[cert_id] = []
+        if not self.get_signed_claim_count(cert_id):
+            return
+        if self.debug_claims:
+            self.logger.debug("[-] Removing certificate: {}".format(hash_to_hex_str(cert_id)))
+        pending = self.claims_signed_by_cert_cache.setdefault(cert_id, {})
+        for claim_id in self.get_signed_claim_ids_by_cert_id(cert_id):
+            pending[claim_id] = False
+        self.signed_claim_count_cache[cert_id] = 0
 
     def remove_claim_from_certificate_claims(self, cert_id, claim_id):
-        self.logger.info("[-] Removing signature: {} - {}".format(hash_to_hex_str(claim_id), hash_to_hex_str(cert_id)))
-        certs = self.get_signed_claim_ids_by_cert_id(cert_id)
-        if claim_id in certs:
-            certs.remove(claim_id)
-        self.claims_signed_by_cert_cache[cert_id] = certs
+        if self.debug_claims:
+            self.logger.debug("[-] Removing signature: {} - {}".format(hash_to_hex_str(claim_id),
+                                                                       hash_to_hex_str(cert_id)))
+        if self.is_signed_by(cert_id, claim_id):
+            self.claims_signed_by_cert_cache.setdefault(cert_id, {})[claim_id] = False
+            self.signed_claim_count_cache[cert_id] = self.get_signed_claim_count(cert_id) - 1
 
     def get_claim_info(self, claim_id):
-        serialized = self.claim_cache.get(claim_id) or self.claims_db.get(claim_id)
-        return ClaimInfo.from_serialized(serialized) if serialized else None
+        claim_info = self.claim_info_cache.get(claim_id)
+        if claim_info:
+            return claim_info
+        generation = self.claim_info_cache.generation
+        if claim_id in self.claim_cache:
+            serialized = self.claim_cache[claim_id]
+        else:
+            self.claim_metrics['db_reads'] += 1
+            serialized = self.claims_db.get(claim_id)
+        if not serialized:
+            return None
+        claim_info = ClaimInfo.from_serialized(serialized)
+        self.claim_info_cache.set(claim_id, claim_info, generation)
+        return claim_info
 
     def put_claim_info(self, claim_id, claim_info):
-        self.logger.info("[+] Adding claim info for: {}".format(hash_to_hex_str(claim_id)))
-        self.claim_cache[claim_id] = claim_info.serialized
+        if self.debug_claims:
+            self.logger.debug("[+] Adding claim info for: {}".format(hash_to_hex_str(claim_id)))
+        serialized = claim_info.serialized
+        self.claim_cache_bytes += len(serialized) - len(self.claim_cache.get(claim_id) or b'')
+        self.claim_cache[claim_id] = serialized
+        self.claim_info_cache.invalidate(claim_id)
+        self.certificate_cache.invalidate(claim_id)
+
+    def get_claim_value(self, claim_id):
+        '''Value of a claim, kept apart from the claim info as only certificates and signatures need it.'''
+        if claim_id in self.claim_value_cache:
+            return self.claim_value_cache[claim_id]
+        stored = self.values_db.get(claim_id)
+        return self.value_compressor.decompress(stored) if stored else None
+
+    def put_claim_value(self, claim_id, value):
+        self.claim_cache_bytes += len(value or b'') - len(self.claim_value_cache.get(claim_id) or b'')
+        self.claim_value_cache[claim_id] = value
+
+    def _get_trie(self, key):
+        if key in self.claimtrie_cache:
+            return self.claimtrie_cache[key]
+        self.claim_metrics['db_reads'] += 1
+        return self.claimtrie_db.get(key)
+
+    def _put_trie(self, key, value):
+        if key not in self.claimtrie_undo:
+            self.claimtrie_undo[key] = self._get_trie(key)
+        self.claim_cache_bytes += len(value or b'') - len(self.claimtrie_cache.get(key) or b'')
+        self.claimtrie_cache[key] = value
+
+    def get_supports(self, claim_id):
+        '''Supports of a claim in the order they were made, read with a range scan.'''
+        supports = {key[CLAIM_ID_LENGTH:]: value for key, value in self.supports_db.iterator(prefix=claim_id)}
+        supports.update(self.claim_supports_cache.get(claim_id, {}))
+        supports = [SupportInfo(*msgpack.loads(support)) for support in supports.values() if support]
+        return sorted(supports, key=lambda support: (support.height, support.txid, support.nout))
+
+    def get_support(self, claim_id, tx_hash, tx_idx):
+        outpoint = tx_hash + struct.pack('>I', tx_idx)
+        pending = self.claim_supports_cache.get(claim_id, {})
+        if outpoint in pending:
+            serialized = pending[outpoint]
+        else:
+            self.claim_metrics['db_reads'] += 1
+            serialized = self.supports_db.get(claim_id + outpoint)
+        return SupportInfo(*msgpack.loads(serialized)) if serialized else None
+
+    def put_support(self, claim_id, support, old_support=None):
+        '''Adds or changes a support of a claim, old_support being the one it replaces for the undo.'''
+        self._put_support(claim_id, support.txid + struct.pack('>I', support.nout), msgpack.dumps(support),
+                          old_support)
+
+    def remove_support(self, claim_id, support):
+        self._put_support(claim_id, support.txid + struct.pack('>I', support.nout), None, support)
+
+    def _put_support(self, claim_id, outpoint, serialized, old_support):
+        key = SUPPORTS_PREFIX + claim_id + outpoint
+        if key not in self.claimtrie_undo:
+            self.claimtrie_undo[key] = msgpack.dumps(old_support) if old_support else None
+        supports = self.claim_supports_cache.setdefault(claim_id, {})
+        self.claim_cache_bytes += len(serialized or b'') - len(supports.get(outpoint) or b'')
+        supports[outpoint] = serialized
+
+
+def pipeline_utilization(metrics, workers):
+    '''Share of the time in advance_blocks each stage was busy. The apply stage waiting on the parse one
+    means parsing is the bottleneck, the parse stage idling means applying is.'''
+    wall = metrics['pipeline_wall_us']
+    return {'parse': metrics['pipeline_parse_us'] / (wall * workers) if wall else 0.0,
+            'apply': metrics['pipeline_apply_us'] / wall if wall else 0.0,
+            'apply_waiting': metrics['pipeline_wait_us'] / wall if wall else 0.0}
+
+
+def format_metrics(metrics):
+    return ', '.join('{} {:,d}'.format(key, value) for key, value in sorted(metrics.items())) or 'none'
+
+
+def name_claims_prefix(name):
+    # length prefixed so the claims of a name are never mixed with the ones of a longer name starting with it
+    return NAME_CLAIM_PREFIX + struct.pack('>H', len(name)) + name
+
+
+def get_certificate_id(name, value):
+    try:
+        parse_lbry_uri(name.decode())  # skip invalid names
+        return Claim.FromString(value).publisherSignature.certificateId[::-1] or None
+    except Exception:
+        return None
+
+
+def parse_claim_outputs(coin, outputs):
+    '''State independent part of claim parsing, safe to run on a process pool.
+    Takes (name, value, pk_script) tuples and returns (address, cert_id) tuples.'''
+    return [(coin.address_from_script(pk_script), get_certificate_id(name, value)) for name, value, pk_script in outputs]
+
+
+def timed_parse_claim_outputs(coin, outputs):
+    '''parse_claim_outputs and the time it took in the worker.'''
+    start = time.perf_counter()
+    parsed = parse_claim_outputs(coin, outputs)
+    return parsed, time.perf_counter() - start
+
+
+def claim_outputs_to_parse(blocks):
+    '''Outpoints of the claims and updates of blocks and the (name, value, pk_script) tuples to parse them from.'''
+    outpoints, outputs = [], []
+    for block in blocks:
+        for tx, txid in block.transactions:
+            if not tx.has_claims:
+                continue
+            for nout, output in enumerate(tx.outputs):
+                if isinstance(output.claim, (NameClaim, ClaimUpdate)):
+                    outpoints.append((txid, nout))
+                    outputs.append((output.claim.name, output.claim.value, output.pk_script))
+    return outpoints, outputs
+
+
+def decode_certificate(value):
+    try:
+        return smart_decode(value)
+    except Exception:
+        return None
+
+
+def is_signature_valid(certificate, value, address):
+    try:
+        return bool(smart_decode(value).validate_signature(address, certificate))
+    except Exception:
+        return False
+
+
+def validate_signatures(certificate_value, claims):
+    '''Checks (value, address) tuples signed by the same certificate, safe to run on a process pool.'''
+    certificate = decode_certificate(certificate_value)
+    return [certificate is not None and is_signature_valid(certificate, value, address) for value, address in claims]
+
 
 def claim_id_hash(txid, n):
     # TODO: This should be in lbryschema
@@ -0,0 +1,132 @@
+import glob
+import logging
+import mmap
+import os
+import struct
+import time
+
+from electrumx.lib.hash import hash_to_hex_str
+from electrumx.server.block_processor import ChainError
+
+# lbrycrd stores blocks as records of the network magic, the block size and the raw block
+BLOCK_FILE_PATTERN = 'blk*.dat'
+RECORD_HEADER_SIZE = 8
+# previous block hash of the genesis block
+NO_PREV_HASH = bytes(32)
+
+
+def block_work(bits):
+    '''Expected number of hashes to find a block with the compact target bits, as lbrycrd counts chain work.'''
+    size, mantissa = bits >> 24, bits & 0x007fffff
+    target = mantissa >> 8 * (3 - size) if size <= 3 else mantissa << 8 * (size - 3)
+    if not target or bits & 0x00800000:
+        return 0
+    return (1 << 256) // (target + 1)
+
+
+class BlockFiles:
+    '''The blk*.dat files of a lbrycrd data directory, memory mapped and indexed by block hash so the blocks
+    of the main chain can be read in height order, which is not the order lbrycrd stores them in.'''
+
+    def __init__(self, coin, blocks_dir):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.coin = coin
+        self.paths, self.files = [], []
+        # block hash -> (previous block hash, file index, offset, size), in the order they were stored
+        self.blocks = {}
+        # block hash -> work of the block
+        self.work = {}
+        for path in sorted(glob.glob(os.path.join(blocks_dir, BLOCK_FILE_PATTERN))):
+            if os.path.getsize(path):
+                self.paths.append(path)
+                with open(path, 'rb') as block_file:
+                    self.files.append(mmap.mmap(block_file.fileno(), 0, access=mmap.ACCESS_READ))
+        start = time.time()
+        for file_index, block_file in enumerate(self.files):
+            self.index_blocks(file_index, block_file)
+        self.logger.info('indexed {:,d} blocks of {:,d} block files in {:.1f}s'.format(
+            len(self.blocks), len(self.files), time.time() - start))
+
+    def index_blocks(self, file_index, block_file):
+        header_size, magic = self.coin.BASIC_HEADER_SIZE, self.coin.NETWORK_MAGIC
+        offset = 0
+        while offset + RECORD_HEADER_SIZE <= len(block_file):
+            # the end of a file is preallocated and left zeroed
+            if block_file[offset:offset + 4] != magic:
+                break
+            size, = struct.unpack_from('<I', block_file, offset + 4)
+            offset += RECORD_HEADER_SIZE
+            if offset + size > len(block_file):
+                self.logger.warning('block file {:,d} ends with a truncated block'.format(file_index))
+                break
+            header = block_file[offset:offset + header_size]
+            block_hash = self.coin.header_hash(header)
+            self.blocks[block_hash] = (self.coin.header_prevhash(header), file_index, offset, size)
+            self.work[block_hash] = block_work(self.coin.header_bits(header))
+            offset += size
+
+    def main_chain(self):
+        '''Hashes of the chain of blocks from the genesis block with the most work, in height order. Of chains
+        with as much work, the one whose tip was stored first wins, as lbrycrd keeps the first it receives.'''
+        chain_work = {NO_PREV_HASH: 0}
+        for block_hash in self.blocks:
+            path = []
+            while block_hash not in chain_work and block_hash in self.blocks:
+                path.append(block_hash)
+                block_hash = self.blocks[block_hash][0]
+            # None for blocks whose ancestors were not stored, they can't be on the chain
+            work = chain_work.get(block_hash)
+            for block_hash in reversed(path):
+                work = None if work is None else work + self.work[block_hash]
+                chain_work[block_hash] = work
+        tip = max((block_hash for block_hash in self.blocks if chain_work[block_hash] is not None),
+                  key=chain_work.__getitem__)
+        chain = []
+        while tip != NO_PREV_HASH:
+            chain.append(tip)
+            tip = self.blocks[tip][0]
+        chain.reverse()
+        return chain
+
+    def location(self, block_hash):
+        '''Path, offset and size of a block, to read it elsewhere.'''
+        _, file_index, offset, size = self.blocks[block_hash]
+        return self.paths[file_index], offset, size
+
+    def raw_block(self, block_hash):
+        _, file_index, offset, size = self.blocks[block_hash]
+        return self.files[file_index][offset:offset + size]
+
+    def close(self):
+        for block_file in self.files:
+            block_file.close()
+
+
+class ChainHeight:
+    '''Stands for the daemon when ingesting, the block processor only asks it for its height.'''
+
+    def __init__(self, height):
+        self.height = height
+
+    def cached_height(self):
+        return self.height
+
+
+def ingest_block_files(bp, block_files, batch_size=1000):
+    '''Advances bp through the main chain of block_files from its height on, in batches of batch_size blocks.
+    The DBs end up as a sync through the daemon leaves them, the undo kept for the last blocks only.'''
+    chain = block_files.main_chain()
+    if bp.height >= len(chain):
+        raise ChainError('DB height {:,d} is past the {:,d} blocks of the block files'.format(bp.height, len(chain)))
+    if bp.height >= 0 and chain[bp.height] != bp.tip:
+        raise ChainError('DB tip {} at height {:,d} is not on the chain of the block files'
+                         .format(hash_to_hex_str(bp.tip), bp.height))
+    bp.daemon = ChainHeight(len(chain) - 1)
+    start, first_height = time.time(), bp.height + 1
+    for batch_start in range(first_height, len(chain), batch_size):
+        heights = range(batch_start, min(batch_start + batch_size, len(chain)))
+        bp.advance_blocks([bp.coin.block(block_files.raw_block(chain[height]), height) for height in heights])
+        bp.logger.info('ingested blocks up to height {:,d} of {:,d}'.format(bp.height, len(chain) - 1))
+    bp.flush(True)
+    bp.logger.info('ingested {:,d} blocks in {:.1f}s'.format(len(chain) - first_height, time.time() - start))
+
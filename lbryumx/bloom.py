@@ -0,0 +1,34 @@
+from hashlib import blake2b
+
+
+class BloomFilter:
+    '''Set of keys in a fixed number of bytes, which can tell for sure a key was never added but may
+    wrongly say it was. Keys can't be removed, removing them from what it stands for leaves them as
+    false positives until it gets rebuilt.'''
+
+    def __init__(self, size, hashes=4):
+        self.bits = bytearray(size)
+        self.bit_count = size * 8
+        self.hashes = hashes
+        self.added = 0
+
+    def __len__(self):
+        return self.added
+
+    def _positions(self, key):
+        digest = blake2b(key, digest_size=16).digest()
+        start, step = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(start + i * step) % self.bit_count for i in range(self.hashes)]
+
+    def add(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.added += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & 1 << (position & 7):
+                return False
+        return True
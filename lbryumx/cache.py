@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    '''Size bounded mapping that evicts the least recently used entries and counts hits and misses.
+
+    It is shared between the block processor thread and the sessions, so entries read from
+    disk are only inserted if nothing was invalidated while they were being read.'''
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = self.misses = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def set(self, key, value, generation=None):
+        '''Caches value, unless generation is given and something was invalidated since it was read.'''
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
@@ -2,20 +2,22 @@ import struct
 
 from electrumx.lib.script import ScriptPubKey, _match_ops, OpCodes
 from electrumx.lib.util import cachedproperty
-from electrumx.lib.hash import hash_to_hex_str, HASHX_LEN
+from electrumx.lib.hash import hash_to_hex_str, hash160, HASHX_LEN
 from hashlib import sha256
 from electrumx.lib.coins import Coin, CoinError
 
-from lbryumx.opcodes import decode_claim_script, opcodes as lbry_opcodes
+from lbryumx.model import ClaimScript
+from lbryumx.opcodes import decode_claim, script_GetOp, CLAIM_OPCODES
 
 
 class LBC(Coin):
-    from lbryumx.session import LBRYElectrumX
+    from lbryumx.session import LBRYElectrumX, LBRYSessionManager
     from lbryumx.block_processor import LBRYBlockProcessor
     from lbryumx.tx import LBRYDeserializer
     from lbryumx.daemon import LBCDaemon
     DAEMON = LBCDaemon
     SESSIONCLS = LBRYElectrumX
+    SESSION_MANAGER = LBRYSessionManager
     BLOCK_PROCESSOR = LBRYBlockProcessor
     DESERIALIZER = LBRYDeserializer
     NAME = "LBRY"
@@ -34,6 +36,8 @@ class LBC(Coin):
     TX_COUNT_HEIGHT = 329554
     TX_PER_BLOCK = 1
     RPC_PORT = 9245
+    # starts every block record of lbrycrd's blk*.dat files
+    NETWORK_MAGIC = bytes.fromhex('fae4aaf1')
     REORG_LIMIT = 200
     PEERS = [
     ]
@@ -52,6 +56,12 @@ class LBC(Coin):
 
         return block
 
+    @classmethod
+    def header_bits(cls, header):
+        '''Compact target of a header, the work of its block.'''
+        bits, = struct.unpack_from('<I', header, 104)
+        return bits
+
     @classmethod
     def electrum_header(cls, header, height):
         version, = struct.unpack('<I', header[:4])
@@ -77,15 +87,37 @@ class LBC(Coin):
             strange=cls.claim_address_handler,
         )
 
+    @classmethod
+    def address_from_script(cls, script):
+        '''Claim scripts go straight to their handler instead of being tokenized first.'''
+        if script and script[0] in CLAIM_OPCODES:
+            return cls.claim_address_handler(script)
+        return super().address_from_script(script)
+
     @classmethod
     def claim_address_handler(cls, script):
         '''Parse a claim script, returns the address
         '''
-        decoded = decode_claim_script(script)
-        if not decoded:
+        payee = cls.claim_payee(script)
+        if not payee:
             return None
+        is_p2sh, hash_bytes = payee
+        if is_p2sh:
+            return cls.P2SH_address_from_hash160(hash_bytes)
+        return cls.P2PKH_address_from_hash160(hash_bytes)
+
+    @classmethod
+    def claim_payee(cls, script):
+        '''Returns (is_p2sh, hash160) of what a claim script pays to, None if it can't be paid to an address.
+        Scripts coming from the deserializer are already split, so only the address part is parsed.
+        '''
+        if not isinstance(script, ClaimScript):
+            decoded = decode_claim(script)
+            if not decoded:
+                return None
+            script = ClaimScript(script, *decoded)
         ops = []
-        for op, data, _ in decoded[1]:
+        for op, data, _ in script_GetOp(script.address_script):
             if not data:
                 ops.append(op)
             else:
@@ -97,13 +129,11 @@ class LBC(Coin):
         TO_PUBKEY_OPS = [-1, OpCodes.OP_CHECKSIG]
 
         if match(ops, TO_ADDRESS_OPS):
-            return cls.P2PKH_address_from_hash160(ops[2][-1])
+            return False, ops[2][-1]
         if match(ops, TO_P2SH_OPS):
-            return cls.P2SH_address_from_hash160(ops[1][-1])
+            return True, ops[1][-1]
         if match(ops, TO_PUBKEY_OPS):
-            return cls.P2PKH_address_from_pubkey(ops[0][-1])
-        if ops and ops[0] == OpCodes.OP_RETURN:
-            return None
+            return False, hash160(ops[0][-1])
         return None
 
     @classmethod
@@ -113,19 +143,19 @@ class LBC(Coin):
         '''
         if script and script[0] == OpCodes.OP_RETURN:
             return None
-        if script[0] in [
-            lbry_opcodes.OP_CLAIM_NAME,
-            lbry_opcodes.OP_SUPPORT_CLAIM,
-            lbry_opcodes.OP_UPDATE_CLAIM
-        ]:
-            return cls.address_to_hashX(cls.claim_address_handler(script))
-        else:
-            return sha256(script).digest()[:HASHX_LEN]
+        if script[0] in CLAIM_OPCODES:
+            # same as address_to_hashX on the claim address, without going through base58
+            payee = cls.claim_payee(script)
+            if payee:
+                is_p2sh, hash_bytes = payee
+                script = ScriptPubKey.P2SH_script(hash_bytes) if is_p2sh else ScriptPubKey.P2PKH_script(hash_bytes)
+        return sha256(script).digest()[:HASHX_LEN]
 
 
 class LBCRegTest(LBC):
     NET = "regtest"
     GENESIS_HASH = '6e3fcf1299d4ec5d79c3a4c91d624a4acf9e2e173d95a1a0504f677669687556'
+    NETWORK_MAGIC = bytes.fromhex('fae4aad1')
     XPUB_VERBYTES = bytes.fromhex('043587cf')
     XPRV_VERBYTES = bytes.fromhex('04358394')
     P2PKH_VERBYTE = bytes.fromhex("6f")
@@ -0,0 +1,48 @@
+import zlib
+from collections import Counter
+
+# zlib looks back 32KB at most, so a bigger preset dictionary would never be used
+ZDICT_SIZE = 32 * 1024
+# stored value formats, the first byte of what is stored
+RAW, DEFLATE, DEFLATE_ZDICT = b'\x00', b'\x01', b'\x02'
+
+
+def train_zdict(samples, size=ZDICT_SIZE, ngram=8):
+    '''Preset dictionary made of the substrings most samples share, the most common ones last as zlib
+    finds them at the shortest distance there.'''
+    counts = Counter()
+    for sample in samples:
+        counts.update({sample[start:start + ngram] for start in range(len(sample) - ngram + 1)})
+    common = [substring for substring, count in counts.most_common(size // ngram) if count > 1]
+    return b''.join(reversed(common))
+
+
+class ValueCompressor:
+    '''Compresses claim values with raw deflate and a preset dictionary trained on earlier values, which
+    are protobufs sharing most of their field layout and metadata. Values stored before there was a
+    dictionary, or which don't compress, keep their own format byte and are still read back.'''
+
+    def __init__(self, zdict=None, level=6):
+        self.zdict = zdict
+        # copied for every value, setting the dictionary up anew costs more than compressing most values
+        if zdict:
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+        else:
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+
+    def compress(self, value):
+        compressor = self.compressor.copy()
+        compressed = compressor.compress(value) + compressor.flush()
+        if len(compressed) >= len(value):
+            return RAW + value
+        return (DEFLATE_ZDICT if self.zdict else DEFLATE) + compressed
+
+    def decompress(self, stored):
+        kind, data = stored[:1], stored[1:]
+        if kind == RAW:
+            return data
+        if kind == DEFLATE_ZDICT:
+            decompressor = zlib.decompressobj(-15, zdict=self.zdict)
+        else:
+            decompressor = zlib.decompressobj(-15)
+        return decompressor.decompress(data) + decompressor.flush()
@@ -0,0 +1,15 @@
+from electrumx.server import controller
+from electrumx.server.controller import Controller
+from electrumx.server.session import SessionManager
+
+
+class LBRYController(Controller):
+    '''The electrumx controller, serving with the session manager of the coin.'''
+
+    async def serve(self, shutdown_event):
+        # electrumx's serve builds the session manager of its module, having no hook for the class
+        controller.SessionManager = self.env.coin.SESSION_MANAGER
+        try:
+            await super().serve(shutdown_event)
+        finally:
+            controller.SessionManager = SessionManager
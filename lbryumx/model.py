@@ -4,8 +4,8 @@ from electrumx.lib.util import cachedproperty
 # Classes representing data and their serializers, if any.
 
 
-class ClaimInfo(namedtuple("NameClaim", "name value txid nout amount address height cert_id")):
-    '''Claim information as its stored on database'''
+class ClaimInfo(namedtuple("NameClaim", "name txid nout amount address height cert_id")):
+    '''Claim information as its stored on database, the value being stored apart'''
 
     @classmethod
     def from_serialized(cls, serialized):
@@ -16,6 +16,11 @@ class ClaimInfo(namedtuple("NameClaim", "name value txid nout amount address hei
         return msgpack.dumps(self)
 
 
+class SupportInfo(namedtuple("SupportInfo", "name txid nout amount height")):
+    '''Support for a claim as stored on the claim trie database'''
+    pass
+
+
 class NameClaim(namedtuple("NameClaim", "name value")):
     pass
 
@@ -45,3 +50,21 @@ class LBRYTx(namedtuple("Tx", "version inputs outputs locktime")):
 
 class TxClaimOutput(namedtuple("TxClaimOutput", "value pk_script claim")):
     pass
+
+
+class ClaimScript(bytes):
+    '''Output script of a claim, as read by the deserializer, carrying its decoded claim and the
+    offset where the script paying to an address starts so it doesn't need decoding again.'''
+
+    def __new__(cls, script, claim, address_start):
+        self = super().__new__(cls, script)
+        self.claim = claim
+        self.address_start = address_start
+        return self
+
+    def __getnewargs__(self):
+        return bytes(self), self.claim, self.address_start
+
+    @property
+    def address_script(self):
+        return self[self.address_start:]
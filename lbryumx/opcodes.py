@@ -61,66 +61,99 @@ def script_GetOp(bytes):
         yield (opcode, vch, i)
 
 
-def decode_claim_script(bytes_script):
-    try:
-        decoded_script = [x for x in script_GetOp(bytes_script)]
-    except Exception as e:
-        print(e)
+CLAIM_OPCODES = frozenset((opcodes.OP_CLAIM_NAME, opcodes.OP_SUPPORT_CLAIM, opcodes.OP_UPDATE_CLAIM))
+
+
+def decode_claim(script):
+    '''Claim of a claim script and the offset where the script paying to an address starts,
+    None for any other script. Called for every output, so it bails out on the first byte of
+    non claim scripts and reads claim scripts without tokenizing them.'''
+    if not script or script[0] not in CLAIM_OPCODES:
         return None
-    if len(decoded_script) <= 6:
-        return False
-    op = 0
-    claim_type = decoded_script[op][0]
-    if claim_type == opcodes.OP_UPDATE_CLAIM:
-        if len(decoded_script) <= 7:
-            return False
-    if claim_type not in [
-        opcodes.OP_CLAIM_NAME,
-        opcodes.OP_SUPPORT_CLAIM,
-        opcodes.OP_UPDATE_CLAIM
-    ]:
-        return False
-    op += 1
-    value = None
-    claim_id = None
-    claim = None
-    if not (0 <= decoded_script[op][0] <= opcodes.OP_PUSHDATA4):
-        return False
-    name = decoded_script[op][1]
-    op += 1
-    if not (0 <= decoded_script[op][0] <= opcodes.OP_PUSHDATA4):
-        return False
-    if decoded_script[0][0] in [
-        opcodes.OP_SUPPORT_CLAIM,
-        opcodes.OP_UPDATE_CLAIM
-    ]:
-        claim_id = decoded_script[op][1]
+    claim_type, view, length = script[0], memoryview(script), len(script)
+    name_start, name_end = _read_push(view, 1, length)
+    if name_start < 0:
+        return None
+    data_start, data_end = _read_push(view, name_end, length)
+    if data_start < 0:
+        return None
+    value = claim_id = None
+    if claim_type == opcodes.OP_CLAIM_NAME:
+        value = view[data_start:data_end]
+    else:
+        claim_id = view[data_start:data_end]
         if len(claim_id) != 20:
-            return False
+            return None
+    i = data_end
+    if claim_type == opcodes.OP_UPDATE_CLAIM:
+        value_start, i = _read_push(view, i, length)
+        if i < 0:
+            return None
+        if value_start > 0:
+            value = view[value_start:i]
+    if i >= length or view[i] != opcodes.OP_2DROP:
+        return None
+    i += 1
+    if i >= length:
+        return None
+    if claim_type == opcodes.OP_CLAIM_NAME and view[i] != opcodes.OP_DROP:
+        return None
+    if claim_type == opcodes.OP_UPDATE_CLAIM and view[i] != opcodes.OP_2DROP:
+        return None
+    _, address_start = _read_push(view, i, length)
+    # the address script has to be made of at least two valid ops
+    ops, j = 0, address_start
+    while 0 <= j < length:
+        _, j = _read_push(view, j, length)
+        ops += 1
+    if j < 0 or ops < 2:
+        return None
+    if claim_type == opcodes.OP_SUPPORT_CLAIM:
+        claim = ClaimSupport(bytes(view[name_start:name_end]), bytes(claim_id))
+    elif value is None:
+        return None
+    elif claim_type == opcodes.OP_UPDATE_CLAIM:
+        claim = ClaimUpdate(bytes(view[name_start:name_end]), bytes(claim_id), bytes(value))
     else:
-        value = decoded_script[op][1]
-    op += 1
-    if decoded_script[0][0] == opcodes.OP_UPDATE_CLAIM:
-        value = decoded_script[op][1]
-        op += 1
-    if decoded_script[op][0] != opcodes.OP_2DROP:
-        return False
-    op += 1
-    if decoded_script[op][0] != opcodes.OP_DROP and decoded_script[0][0] == opcodes.OP_CLAIM_NAME:
-        return False
-    elif decoded_script[op][0] != opcodes.OP_2DROP and decoded_script[0][0] == opcodes.OP_UPDATE_CLAIM:
+        claim = NameClaim(bytes(view[name_start:name_end]), bytes(value))
+    return claim, address_start
+
+
+def _read_push(view, i, length):
+    '''Reads the op at i. Returns where its pushed data starts, -1 if it pushes nothing or i is past the end,
+    and where the next op starts, -1 if the push is truncated.'''
+    if i < 0 or i >= length:
+        return -1, -1
+    opcode = view[i]
+    i += 1
+    if opcode > opcodes.OP_PUSHDATA4:
+        return -1, i
+    if opcode < opcodes.OP_PUSHDATA1:
+        size = opcode
+    elif opcode == opcodes.OP_PUSHDATA1:
+        if i + 1 > length:
+            return -1, -1
+        size = view[i]
+        i += 1
+    elif opcode == opcodes.OP_PUSHDATA2:
+        if i + 2 > length:
+            return -1, -1
+        size = view[i] | view[i + 1] << 8
+        i += 2
+    else:
+        if i + 4 > length:
+            return -1, -1
+        size, = struct.unpack_from('<I', view, i)
+        i += 4
+    if i + size > length:
+        return -1, -1
+    return i, i + size
+
+
+def decode_claim_script(bytes_script):
+    '''Claim of a claim script and the ops of the script paying to an address, False for other scripts.'''
+    decoded = decode_claim(bytes_script)
+    if not decoded:
         return False
-    op += 1
-    if decoded_script[0][0] == opcodes.OP_CLAIM_NAME:
-        if name is None or value is None:
-            return False
-        claim = NameClaim(name, value)
-    elif decoded_script[0][0] == opcodes.OP_UPDATE_CLAIM:
-        if name is None or value is None or claim_id is None:
-            return False
-        claim = ClaimUpdate(name, claim_id, value)
-    elif decoded_script[0][0] == opcodes.OP_SUPPORT_CLAIM:
-        if name is None or claim_id is None:
-            return False
-        claim = ClaimSupport(name, claim_id)
-    return claim, decoded_script[op:]
+    claim, address_start = decoded
+    return claim, list(script_GetOp(bytes_script[address_start:]))
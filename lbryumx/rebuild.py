@@ -0,0 +1,170 @@
+import logging
+import os
+import shutil
+import struct
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from electrumx.lib.hash import hash_to_hex_str
+from electrumx.lib.tx import TxInput
+from electrumx.server.block_processor import ChainError
+
+from lbryumx.block_processor import CLAIM_DB_NAME, CLAIMS_HEIGHT_KEY, CLAIM_POSITION_PREFIX, NAME_CLAIM_PREFIX, \
+    CERT_CLAIM_PREFIX, CERT_COUNT_PREFIX, name_claims_prefix, claim_outputs_to_parse, \
+    parse_claim_outputs, format_metrics
+from lbryumx.model import ClaimInfo, LBRYTx, TxClaimOutput
+
+# the claim DB is rebuilt apart and only replaces the current one once complete
+REBUILT_CLAIM_DB_NAME = CLAIM_DB_NAME + '.rebuild'
+OLD_CLAIM_DB_NAME = CLAIM_DB_NAME + '.old'
+# what indexing claims needs of the outputs that are not claims, they only take their position
+NO_CLAIM_OUTPUT = TxClaimOutput(0, b'', None)
+# examples of each kind of drift logged by verify_claims
+DRIFT_EXAMPLES = 10
+
+logger = logging.getLogger(__name__)
+
+
+class ScannedBlock:
+    '''Transactions of a block reduced to what indexing claims needs: the outpoints they spend and their claims.'''
+
+    def __init__(self, transactions, parsed_claim_outputs):
+        self.transactions = transactions
+        self.parsed_claim_outputs = parsed_claim_outputs
+
+
+def scan_blocks(coin, locations):
+    '''Reads and deserializes the blocks at the (path, offset, size) locations and parses their claims, on a worker
+    process. Only what indexing claims needs is sent back.'''
+    blocks = []
+    for path, offset, size in locations:
+        with open(path, 'rb') as block_file:
+            block_file.seek(offset)
+            block = coin.block(block_file.read(size), 0)
+        transactions = []
+        for tx, txid in block.transactions:
+            inputs = [TxInput(txin.prev_hash, txin.prev_idx, b'', 0) for txin in tx.inputs]
+            outputs = [output if output.claim else NO_CLAIM_OUTPUT for output in tx.outputs]
+            transactions.append((LBRYTx(tx.version, inputs, outputs, tx.locktime), txid))
+        outpoints, outputs = claim_outputs_to_parse([block])
+        blocks.append(ScannedBlock(transactions, dict(zip(outpoints, parse_claim_outputs(coin, outputs)))))
+    return blocks
+
+
+def read_utxo_state(bp):
+    '''Reads the height and tip of the UTXO DB into bp, which opening it for sync would also repair.'''
+    if not os.path.isdir('utxo'):
+        raise bp.DBError('no UTXO DB in {}'.format(os.getcwd()))
+    bp.utxo_db = bp.db_class('utxo', False)
+    try:
+        bp.read_utxo_state()
+    finally:
+        bp.utxo_db.close()
+        bp.utxo_db = None
+
+
+def rebuild_claims(bp, block_files, workers, chunk_size=100):
+    '''Rebuilds the claim DB of bp by indexing the claims of the main chain of block_files again, up to the height
+    of the UTXO DB, which is left as is. Blocks are scanned in chunks on a process pool and indexed in height order,
+    so the result is the same whatever the number of workers. The rebuilt DB replaces the current one once complete.'''
+    height = bp.db_height
+    chain = block_files.main_chain()
+    if height >= len(chain) or chain[height] != bp.db_tip:
+        raise ChainError('DB tip {} at height {:,d} is not on the chain of the block files'
+                         .format(hash_to_hex_str(bp.db_tip), height))
+    if os.path.exists(REBUILT_CLAIM_DB_NAME):
+        shutil.rmtree(REBUILT_CLAIM_DB_NAME)
+    bp.open_claim_db(True, REBUILT_CLAIM_DB_NAME)
+    bp.height, min_undo_height = -1, bp.min_undo_height(height)
+    # the claim caches have the whole cache to themselves, as nothing else is indexed
+    cache_size = bp.cache_MB * 1000 * 1000
+    start = time.time()
+    chunks = deque(range(chunk_start, min(chunk_start + chunk_size, height + 1))
+                   for chunk_start in range(0, height + 1, chunk_size))
+    with ProcessPoolExecutor(workers) as executor:
+        scans = deque()
+        while chunks or scans:
+            while chunks and len(scans) < 2 * workers:
+                locations = [block_files.location(chain[block_height]) for block_height in chunks[0]]
+                scans.append((chunks.popleft(), executor.submit(scan_blocks, bp.coin, locations)))
+            heights, scan = scans.popleft()
+            for block_height, block in zip(heights, scan.result()):
+                bp.parsed_claim_outputs = block.parsed_claim_outputs
+                bp.advance_claim_block(block.transactions, block_height, block_height >= min_undo_height)
+                bp.height = block_height
+            if bp.claim_read_ahead is not None:
+                bp.claim_read_ahead.clear()
+            bp.parsed_claim_outputs, bp.checked_signatures = {}, {}
+            if bp.claim_cache_size() >= cache_size:
+                bp.batched_flush_claims()
+            logger.info('rebuilt claims up to height {:,d} of {:,d}'.format(bp.height, height))
+    bp.batched_flush_claims()
+    bp.claim_db.close()
+    if os.path.exists(CLAIM_DB_NAME):
+        os.rename(CLAIM_DB_NAME, OLD_CLAIM_DB_NAME)
+    os.rename(REBUILT_CLAIM_DB_NAME, CLAIM_DB_NAME)
+    if os.path.exists(OLD_CLAIM_DB_NAME):
+        shutil.rmtree(OLD_CLAIM_DB_NAME)
+    logger.info('rebuilt claims of {:,d} blocks in {:.1f}s'.format(height + 1, time.time() - start))
+
+
+def verify_claims(bp):
+    '''Cross-checks the claims, names, signatures and outpoints of bp's claim DB against each other and the height
+    of the UTXO DB. Returns how many entries of each kind drifted, logging some of them.'''
+    drift = Counter()
+
+    def report(kind, *keys):
+        drift[kind] += 1
+        if drift[kind] <= DRIFT_EXAMPLES:
+            logger.warning('{}: {}'.format(kind, ' '.join(map(hash_to_hex_str, keys))))
+
+    def get_claim_info(claim_id):
+        serialized = bp.claims_db.get(claim_id)
+        return ClaimInfo.from_serialized(serialized) if serialized else None
+
+    claims_height = bp.claim_db.get(CLAIMS_HEIGHT_KEY)
+    if claims_height is None or struct.unpack('>i', claims_height)[0] != bp.db_height:
+        drift['height_mismatch'] += 1
+        logger.warning('claim DB at height {} while the UTXO DB is at {:,d}'.format(
+            struct.unpack('>i', claims_height)[0] if claims_height else None, bp.db_height))
+    claims = 0
+    for claim_id, serialized in bp.claims_db.iterator():
+        claims += 1
+        info = ClaimInfo.from_serialized(serialized)
+        if bp.outpoint_to_claim_id_db.get(info.txid + struct.pack('>I', info.nout)) != claim_id:
+            report('claim_without_outpoint', claim_id)
+        position = bp.names_db.get(CLAIM_POSITION_PREFIX + claim_id)
+        if not position or bp.names_db.get(name_claims_prefix(info.name) + position) != claim_id:
+            report('claim_without_name', claim_id)
+        if info.cert_id and bp.signatures_db.get(CERT_CLAIM_PREFIX + info.cert_id + claim_id) is None:
+            report('claim_without_signature', claim_id, info.cert_id)
+        if bp.values_db.get(claim_id) is None:
+            report('claim_without_value', claim_id)
+    for outpoint, claim_id in bp.outpoint_to_claim_id_db.iterator():
+        info = get_claim_info(claim_id)
+        if not info or info.txid + struct.pack('>I', info.nout) != outpoint:
+            report('stale_outpoint', outpoint, claim_id)
+    for key, claim_id in bp.names_db.iterator(prefix=NAME_CLAIM_PREFIX):
+        name_length, = struct.unpack('>H', key[1:3])
+        name, position = key[3:3 + name_length], key[3 + name_length:]
+        info = get_claim_info(claim_id)
+        if not info or info.name != name or bp.names_db.get(CLAIM_POSITION_PREFIX + claim_id) != position:
+            report('stale_name', claim_id)
+    for key, _ in bp.names_db.iterator(prefix=CLAIM_POSITION_PREFIX):
+        if not get_claim_info(key[1:]):
+            report('stale_claim_position', key[1:])
+    signed_claims = Counter()
+    for key, _ in bp.signatures_db.iterator(prefix=CERT_CLAIM_PREFIX):
+        cert_id, claim_id = key[1:21], key[21:]
+        signed_claims[cert_id] += 1
+        info = get_claim_info(claim_id)
+        if not info or info.cert_id != cert_id:
+            report('stale_signature', claim_id, cert_id)
+    for key, count in bp.signatures_db.iterator(prefix=CERT_COUNT_PREFIX):
+        if struct.unpack('>I', count)[0] != signed_claims.pop(key[1:], 0):
+            report('wrong_signed_claim_count', key[1:])
+    for cert_id in signed_claims:
+        report('wrong_signed_claim_count', cert_id)
+    logger.info('verified {:,d} claims, drift: {}'.format(claims, format_metrics(drift)))
+    return drift
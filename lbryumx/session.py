@@ -1,14 +1,21 @@
+import asyncio
 import math
 from binascii import unhexlify, hexlify
+from functools import partial
 
 from aiorpcx import RPCError
 from electrumx.lib.hash import hash_to_hex_str
-from electrumx.server.session import ElectrumX
+from electrumx.server.session import ElectrumX, LocalRPC, SessionManager, non_negative_integer
 import electrumx.lib.util as util
 
 from lbryschema.uri import parse_lbry_uri
 from lbryschema.error import URIParseError, DecodeError
 
+# most claims a page of blockchain.claimtrie.getclaimssignedbyidpaginated can hold
+MAX_SIGNED_CLAIMS_PAGE = 500
+# most URIs blockchain.claimtrie.getvaluesforuris resolves at once
+MAX_BATCH_URIS = 500
+
 
 class LBRYElectrumX(ElectrumX):
     PROTOCOL_MIN = (0, 0)  # temporary, for supporting 0.10 protocol
@@ -21,6 +28,12 @@ class LBRYElectrumX(ElectrumX):
         self.bp = self.chain_state._bp
         # fixme: lbryum specific subscribe
         self.subscribe_height = False
+        # claims lbrycrdd returns are formatted from the index, but for what only lbrycrdd knows, unless configured
+        # otherwise
+        self.claims_from_daemon = self.env.boolean('CLAIMS_FROM_DAEMON', False)
+        # URIs of a batch resolved at the same time, and seconds a batch has before the rest of it times out
+        self.uri_resolve_concurrency = self.env.integer('URI_RESOLVE_CONCURRENCY', 20)
+        self.uri_batch_timeout = self.env.integer('URI_BATCH_TIMEOUT', 30)
 
     def set_request_handlers(self, ptuple):
         super().set_request_handlers(ptuple)
@@ -37,6 +50,8 @@ class LBRYElectrumX(ElectrumX):
             'blockchain.claimtrie.getvalueforuri': self.claimtrie_getvalueforuri,
             'blockchain.claimtrie.getvaluesforuris': self.claimtrie_getvalueforuris,
             'blockchain.claimtrie.getclaimssignedbyid': self.claimtrie_getclaimssignedbyid,
+            'blockchain.claimtrie.getclaimssignedbyidpaginated': self.claimtrie_getclaimssignedbyidpaginated,
+            'blockchain.claimtrie.getclaimssignedbyidcount': self.claimtrie_getclaimssignedbyidcount,
             'blockchain.block.get_server_height': self.get_server_height,
             'blockchain.block.get_block': self.get_block,
         }
@@ -125,25 +140,43 @@ class LBRYElectrumX(ElectrumX):
             return await self.claimtrie_getclaimssignedbyid(winning_claim['claimId'])
 
     async def claimtrie_getclaimssignedbyid(self, certificate_id):
+        # signed claims come sorted by claim id, as the paginated listing needs a stable order, instead of
+        # the order they were signed in as before the signatures DB was keyed by claim id
         claim_ids = self.get_claim_ids_signed_by(certificate_id)
         return await self.batched_formatted_claims_from_daemon(claim_ids)
 
-    def get_claim_ids_signed_by(self, certificate_id):
+    async def claimtrie_getclaimssignedbyidpaginated(self, certificate_id, after=None, limit=MAX_SIGNED_CLAIMS_PAGE):
+        '''A page of the claims signed by a certificate, the next one starting after the last claim id of this one.'''
+        self.assert_claim_id(certificate_id)
+        if after is not None:
+            self.assert_claim_id(after)
+        limit = non_negative_integer(limit)
+        if limit > MAX_SIGNED_CLAIMS_PAGE:
+            raise RPCError('limit has to be at most {}'.format(MAX_SIGNED_CLAIMS_PAGE))
+        claim_ids = self.get_claim_ids_signed_by(certificate_id, after, limit)
+        return await self.batched_formatted_claims_from_daemon(claim_ids)
+
+    async def claimtrie_getclaimssignedbyidcount(self, certificate_id):
+        self.assert_claim_id(certificate_id)
+        return self.bp.get_signed_claim_count(unhexlify(certificate_id)[::-1])
+
+    def get_claim_ids_signed_by(self, certificate_id, after=None, limit=None):
         raw_certificate_id = unhexlify(certificate_id)[::-1]
-        raw_claim_ids = self.bp.get_signed_claim_ids_by_cert_id(raw_certificate_id)
+        raw_after = unhexlify(after)[::-1] if after else None
+        raw_claim_ids = self.bp.get_signed_claim_ids_by_cert_id(raw_certificate_id, raw_after, limit)
         return list(map(hash_to_hex_str, raw_claim_ids))
 
     def get_signed_claims_with_name_for_channel(self, channel_id, name):
-        claim_ids_for_name = list(self.bp.get_claims_for_name(name.encode('ISO-8859-1')).keys())
+        claim_ids_for_name = self.bp.get_claim_ids_for_name(name.encode('ISO-8859-1'))
         claim_ids_for_name = set(map(hash_to_hex_str, claim_ids_for_name))
         channel_claim_ids = set(self.get_claim_ids_signed_by(channel_id))
         return claim_ids_for_name.intersection(channel_claim_ids)
 
     async def claimtrie_getclaimssignedbynthtoname(self, name, n):
         n = int(n)
-        for claim_id, sequence in self.bp.get_claims_for_name(name.encode('ISO-8859-1')).items():
-            if n == sequence:
-                return await self.claimtrie_getclaimssignedbyid(hash_to_hex_str(claim_id))
+        claim_id = self.bp.get_claim_id_for_sequence(name.encode('ISO-8859-1'), n)
+        if claim_id:
+            return await self.claimtrie_getclaimssignedbyid(hash_to_hex_str(claim_id))
 
     async def claimtrie_getclaimsintx(self, txid):
         # TODO: this needs further discussion.
@@ -161,30 +194,25 @@ class LBRYElectrumX(ElectrumX):
             result['transaction'] = transaction_info['hex']
             result['height'] = (self.bp.db_height - transaction_info['confirmations']) + 1
             raw_claim_id = self.bp.get_claim_id_from_outpoint(unhexlify(tx_hash)[::-1], nout)
-            sequence = self.bp.get_claims_for_name(name.encode('ISO-8859-1')).get(raw_claim_id)
+            sequence = self.bp.get_claim_sequence(name.encode('ISO-8859-1'), raw_claim_id)
             if sequence:
-                claim_id = hexlify(raw_claim_id[::-1]).decode()
-                claim_info = await self.daemon.getclaimbyid(claim_id)
-                if not claim_info or not claim_info.get('value'):
-                    claim_info = await self.slow_get_claim_by_id_using_name(claim_id)
                 result['claim_sequence'] = sequence
-                result['claim_id'] = claim_id
-                supports = self.format_supports_from_daemon(claim_info.get('supports', []))  # fixme: lbrycrd#124
-                result['supports'] = supports
+                result['claim_id'] = hexlify(raw_claim_id[::-1]).decode()
+                result['supports'] = self.format_supports_from_index(raw_claim_id)
             else:
                 self.logger.warning('tx has no claims in db: {} {}'.format(tx_hash, nout))
         return result
 
     async def claimtrie_getnthclaimforname(self, name, n):
         n = int(n)
-        for claim_id, sequence in self.bp.get_claims_for_name(name.encode('ISO-8859-1')).items():
-            if n == sequence:
-                return await self.claimtrie_getclaimbyid(hash_to_hex_str(claim_id))
+        claim_id = self.bp.get_claim_id_for_sequence(name.encode('ISO-8859-1'), n)
+        if claim_id:
+            return await self.claimtrie_getclaimbyid(hash_to_hex_str(claim_id))
 
     async def claimtrie_getclaimsforname(self, name):
         claims = await self.daemon.getclaimsforname(name)
         if claims:
-            claims['claims'] = [self.format_claim_from_daemon(claim, name) for claim in claims['claims']]
+            claims['claims'] = [self.format_claim(claim, name) for claim in claims['claims']]
             claims['supports_without_claims'] = claims['supports without claims']
             del claims['supports without claims']
             claims['last_takeover_height'] = claims['nLastTakeoverHeight']
@@ -197,13 +225,49 @@ class LBRYElectrumX(ElectrumX):
         result = []
         for claim, claim_id in zip(claims, claim_ids):
             if claim and claim.get('value'):
-                result.append(self.format_claim_from_daemon(claim))
+                result.append(self.format_claim(claim))
             else:
                 recovered_claim = await self.slow_get_claim_by_id_using_name(claim_id)
                 if recovered_claim:
-                    result.append(self.format_claim_from_daemon(recovered_claim))
+                    result.append(self.format_claim(recovered_claim))
         return result
 
+    def format_claim_from_index(self, raw_claim_id, claim, name=None):
+        '''Formats a claim lbrycrdd returned as lbrynet expects from the index, {} if it has no such claim. The
+        effective amount and activation height still come from lbrycrdd, they depend on takeovers and expiration.
+        None if the claim was indexed before its value was, so lbrycrdd has to fill it.'''
+        claim_info = self.bp.get_claim_info(raw_claim_id)
+        if not claim_info or (name and claim_info.name != name.encode('ISO-8859-1')):
+            return {}
+        sequence = self.bp.get_claim_sequence(claim_info.name, raw_claim_id)
+        if not sequence:
+            return {}
+        value = self.bp.get_claim_value(raw_claim_id)
+        if value is None:
+            return None
+        return {
+            "name": claim_info.name.decode('ISO-8859-1'),
+            "claim_id": hash_to_hex_str(raw_claim_id),
+            "txid": hash_to_hex_str(claim_info.txid),
+            "nout": claim_info.nout,
+            "amount": claim_info.amount,
+            "depth": self.bp.db_height - claim_info.height,
+            "height": claim_info.height,
+            "value": hexlify(value).decode(),
+            "claim_sequence": sequence,
+            "address": claim_info.address.decode(),
+            "supports": self.format_supports_from_index(raw_claim_id),
+            "effective_amount": get_from_possible_keys(claim, 'effective amount', 'nEffectiveAmount'),
+            "valid_at_height": get_from_possible_keys(claim, 'valid at height', 'nValidAtHeight')
+        }
+
+    def format_claim(self, claim, name=None):
+        '''Formats a claim lbrycrdd returned from the index, unless configured not to or the index can't.'''
+        formatted = None
+        if claim and not self.claims_from_daemon:
+            formatted = self.format_claim_from_index(unhexlify(claim['claimId'])[::-1], claim, name)
+        return self.format_claim_from_daemon(claim, name) if formatted is None else formatted
+
     def format_claim_from_daemon(self, claim, name=None):
         '''Changes the returned claim data to the format expected by lbrynet and adds missing fields.'''
         if not claim: return {}
@@ -214,10 +278,10 @@ class LBRYElectrumX(ElectrumX):
             #raise RPCError("Lbrycrd has {} but not lbryumx, please submit a bug report.".format(claim_id))
             return {}
         address = self.bp.get_claim_info(raw_claim_id).address.decode()
-        sequence = self.bp.get_claims_for_name(name.encode('ISO-8859-1')).get(raw_claim_id)
+        sequence = self.bp.get_claim_sequence(name.encode('ISO-8859-1'), raw_claim_id)
         if not sequence:
             return {}
-        supports = self.format_supports_from_daemon(claim.get('supports', []))  # fixme: lbrycrd#124
+        supports = self.format_supports_from_index(raw_claim_id)
 
         amount = get_from_possible_keys(claim, 'amount', 'nAmount')
         height = get_from_possible_keys(claim, 'height', 'nHeight')
@@ -235,21 +299,23 @@ class LBRYElectrumX(ElectrumX):
             "value": hexlify(claim['value'].encode('ISO-8859-1')).decode(),
             "claim_sequence": sequence,  # from index
             "address": address,  # from index
-            "supports": supports, # fixme: to be included in lbrycrd#124
+            "supports": supports,  # from index
             "effective_amount": effective_amount,
             "valid_at_height": valid_at_height  # TODO PR lbrycrd to include it
         }
 
-    def format_supports_from_daemon(self, supports):
-        return [[support['txid'], support['n'], get_from_possible_keys(support, 'amount', 'nAmount')] for
-                 support in supports]
+    def format_supports_from_index(self, raw_claim_id):
+        # supports for another name don't count towards the effective amount, lbrycrd doesn't list them either
+        claim_info = self.bp.get_claim_info(raw_claim_id)
+        return [[hash_to_hex_str(support.txid), support.nout, support.amount] for
+                support in self.bp.get_supports(raw_claim_id) if claim_info and support.name == claim_info.name]
 
     async def claimtrie_getclaimbyid(self, claim_id):
         self.assert_claim_id(claim_id)
         claim = await self.daemon.getclaimbyid(claim_id)
         if not claim or not claim.get('value'):
             claim = await self.slow_get_claim_by_id_using_name(claim_id)
-        return self.format_claim_from_daemon(claim)
+        return self.format_claim(claim)
 
     async def claimtrie_getclaimsbyids(self, *claim_ids):
         claims = await self.batched_formatted_claims_from_daemon(claim_ids)
@@ -334,7 +400,7 @@ class LBRYElectrumX(ElectrumX):
                 claims = await self.batched_formatted_claims_from_daemon(claim_ids_matching_name)
 
                 claims_in_channel = {claim['claim_id']: (claim['name'], claim['height'])
-                                     for claim in claims}
+                                     for claim in claims if claim}
                 result['unverified_claims_for_name'] = claims_in_channel
         else:
             claim = None
@@ -366,17 +432,35 @@ class LBRYElectrumX(ElectrumX):
         return result
 
     async def claimtrie_getvalueforuris(self, block_hash, *uris):
-        MAX_BATCH_URIS = 500
+        '''Resolves the URIs concurrently, at most URI_RESOLVE_CONCURRENCY at a time. The ones not resolved within
+        URI_BATCH_TIMEOUT seconds, or failing, get an error in place of their value instead of failing the batch.'''
         if len(uris) > MAX_BATCH_URIS:
             raise Exception("Exceeds max batch uris of {}".format(MAX_BATCH_URIS))
+        semaphore = asyncio.Semaphore(self.uri_resolve_concurrency)
 
-        return {uri: await self.claimtrie_getvalueforuri(block_hash, uri) for uri in uris}
+        async def getvalue(uri):
+            async with semaphore:
+                return await self.claimtrie_getvalueforuri(block_hash, uri)
 
-        # TODO: get it all concurrently when lbrycrd pending changes goes into a stable release
-        #async def getvalue(uri):
-        #    value = await self.claimtrie_getvalueforuri(block_hash, uri)
-        #    return uri, value,
-        #return dict([await asyncio.gather(*tuple(getvalue(uri) for uri in uris))][0])
+        resolving, done = {uri: asyncio.ensure_future(getvalue(uri)) for uri in uris}, set()
+        try:
+            if resolving:
+                done, _ = await asyncio.wait(resolving.values(), timeout=self.uri_batch_timeout)
+        finally:
+            for task in resolving.values():
+                task.cancel()
+        result = {}
+        for uri, task in resolving.items():
+            if task not in done:
+                result[uri] = {'error': 'timed out after {:,d}s'.format(self.uri_batch_timeout)}
+            elif isinstance(task.exception(), RPCError):
+                result[uri] = {'error': task.exception().message}
+            elif task.exception():
+                self.logger.error('failed resolving {}: {!r}'.format(uri, task.exception()))
+                result[uri] = {'error': 'failed resolving {}'.format(uri)}
+            else:
+                result[uri] = task.result()
+        return result
 
 
 def proof_has_winning_claim(proof):
@@ -387,3 +471,31 @@ def get_from_possible_keys(dictionary, *keys):
     for key in keys:
         if key in dictionary:
             return dictionary[key]
+
+
+class LBRYLocalRPC(LocalRPC):
+    '''The admin RPC session, with the LBRY commands added to the electrumx ones.'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.request_handlers = dict(LocalRPC.request_handlers, claim_metrics=self.session_mgr.rpc_claim_metrics)
+
+
+class LBRYSessionManager(SessionManager):
+    '''Session manager serving the admin RPC with LBRYLocalRPC.'''
+
+    async def _start_server(self, kind, *args, **kw_args):
+        if kind != 'RPC':
+            return await super()._start_server(kind, *args, **kw_args)
+        protocol_factory = partial(LBRYLocalRPC, self, self.chain_state, self.mempool, self.peer_mgr, kind)
+        host, port = args[:2]
+        try:
+            self.servers[kind] = await asyncio.get_event_loop().create_server(protocol_factory, *args, **kw_args)
+        except Exception as e:
+            self.logger.error('{} server failed to listen on {}:{:d} :{!r}'.format(kind, host, port, e))
+        else:
+            self.logger.info('{} server listening on {}:{:d}'.format(kind, host, port))
+
+    async def rpc_claim_metrics(self):
+        '''Claim processing counters of the last block, since the last flush and since startup.'''
+        return await self.chain_state._bp.rpc_claim_metrics()
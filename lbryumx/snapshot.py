@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+
+import msgpack
+from electrumx.server.storage import db_class
+
+from lbryumx.block_processor import CLAIM_DB_NAME, CLAIMS_HEIGHT_KEY
+from lbryumx.rebuild import read_utxo_state
+
+# a snapshot is the magic, a zlib stream of msgpack records and the SHA-256 of the records
+SNAPSHOT_MAGIC = b'lbryumx snapshot'
+SNAPSHOT_VERSION = 1
+# record kinds: the snapshot header first, then every DB followed by its entries, then the flat files in chunks
+HEADER, DB, ENTRY, FILE = range(4)
+# DBs of a DB directory, electrumx ones and the claim DB, and its flat files: headers, tx counts and hashes,
+# and the raw blocks a reorg can reach
+SNAPSHOT_DBS = ('utxo', 'hist', CLAIM_DB_NAME)
+META_DIRECTORY = 'meta'
+COIN_FILE = 'COIN'
+FILE_CHUNK_SIZE = 1024 * 1024
+READ_SIZE = 1024 * 1024
+# entries written to a DB at once when importing, they come in key order
+WRITE_BATCH_SIZE = 100000
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotError(Exception):
+    '''The snapshot can't be exported or imported.'''
+
+
+class SnapshotWriter:
+    '''Streams records compressed, keeping the checksum of what was compressed.'''
+
+    def __init__(self, out):
+        self.out = out
+        self.packer = msgpack.Packer(use_bin_type=True)
+        self.compressor = zlib.compressobj()
+        self.checksum = hashlib.sha256()
+        out.write(SNAPSHOT_MAGIC)
+
+    def write(self, *record):
+        data = self.packer.pack(record)
+        self.checksum.update(data)
+        self.out.write(self.compressor.compress(data))
+
+    def close(self):
+        self.out.write(self.compressor.flush())
+        self.out.write(self.checksum.digest())
+        return self.checksum.hexdigest()
+
+
+def open_exported_dbs(bp):
+    '''Opens the DBs of bp, on a DB directory no server is running on, to be exported as they are. Unlike opening
+    them for sync, nothing is migrated, repaired or built from them, as verifying the claim DB does.'''
+    read_utxo_state(bp)
+    bp.open_claim_db(False, read_only=True)
+    if not os.path.isdir('hist'):
+        raise SnapshotError('no history DB in {}'.format(os.getcwd()))
+    bp.utxo_db = bp.db_class('utxo', False)
+    bp.history.db = bp.db_class('hist', False)
+
+
+def export_snapshot(bp, out):
+    '''Writes the DBs and flat files of bp, opened on a DB directory no server is running on, to the out file.
+    Returns the snapshot header and checksum.'''
+    claims_height = bp.claim_db.get(CLAIMS_HEIGHT_KEY)
+    if claims_height is not None and struct.unpack('>i', claims_height)[0] != bp.db_height:
+        raise SnapshotError('claim DB at height {:,d} while the UTXO DB is at {:,d}'.format(
+            struct.unpack('>i', claims_height)[0], bp.db_height))
+    start = time.time()
+    header = {'version': SNAPSHOT_VERSION, 'coin': bp.coin.NAME, 'net': bp.coin.NET,
+              'genesis': bp.coin.GENESIS_HASH, 'height': bp.db_height, 'tip': bp.db_tip,
+              'tx_count': bp.db_tx_count}
+    writer = SnapshotWriter(out)
+    writer.write(HEADER, header)
+    for name, db in zip(SNAPSHOT_DBS, (bp.utxo_db, bp.history.db, bp.claim_db)):
+        writer.write(DB, name)
+        count = 0
+        for key, value in db.iterator():
+            writer.write(ENTRY, key, value)
+            count += 1
+        logger.info('exported {:,d} entries of the {} DB'.format(count, name))
+    paths = [COIN_FILE] + [os.path.join(META_DIRECTORY, name) for name in sorted(os.listdir(META_DIRECTORY))]
+    for path in paths:
+        with open(path, 'rb') as flat_file:
+            for chunk in iter(lambda: flat_file.read(FILE_CHUNK_SIZE), b''):
+                writer.write(FILE, path, chunk)
+    checksum = writer.close()
+    logger.info('exported snapshot at height {:,d} with checksum {} in {:.1f}s'.format(
+        bp.db_height, checksum, time.time() - start))
+    return header, checksum
+
+
+def read_snapshot(source):
+    '''Records of the snapshot in the source file, checking its checksum once all of them are read.'''
+    if source.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise SnapshotError('not a snapshot')
+    decompressor, checksum = zlib.decompressobj(), hashlib.sha256()
+    unpacker = msgpack.Unpacker(raw=False)
+    try:
+        while not decompressor.eof:
+            compressed = source.read(READ_SIZE)
+            if not compressed:
+                raise SnapshotError('snapshot is truncated')
+            data = decompressor.decompress(compressed)
+            checksum.update(data)
+            unpacker.feed(data)
+            yield from unpacker
+    except (zlib.error, ValueError) as error:
+        raise SnapshotError('snapshot is corrupted: {}'.format(error))
+    if decompressor.unused_data + source.read() != checksum.digest():
+        raise SnapshotError('snapshot checksum does not match')
+
+
+def import_snapshot(coin, source, db_dir, db_engine='leveldb'):
+    '''Loads the snapshot in the source file into db_dir, which must be empty, switching to it as electrumx does.
+    The snapshot is written to a directory next to db_dir, which takes its place once the checksum matches, so
+    nothing is left there if the snapshot turns out to be incomplete or corrupted. Returns the snapshot header.'''
+    db_dir = os.path.abspath(db_dir)
+    if os.listdir(db_dir):
+        raise SnapshotError('DB directory {} is not empty'.format(db_dir))
+    import_dir = tempfile.mkdtemp(prefix='.{}.import-'.format(os.path.basename(db_dir)), dir=os.path.dirname(db_dir))
+    os.chdir(import_dir)
+    start, db = time.time(), None
+    try:
+        records = read_snapshot(source)
+        kind, header = next(records, (None, None))
+        if kind != HEADER or header.get('version') != SNAPSHOT_VERSION:
+            raise SnapshotError('unknown snapshot version')
+        if header['genesis'] != coin.GENESIS_HASH:
+            raise SnapshotError('snapshot of {} {} while the coin is {} {}'.format(
+                header['coin'], header['net'], coin.NAME, coin.NET))
+        os.mkdir(META_DIRECTORY)
+        entries = []
+        for record in records:
+            kind = record[0]
+            if kind == ENTRY:
+                if db is None:
+                    raise SnapshotError('DB entries before any DB')
+                entries.append(record[1:])
+                if len(entries) >= WRITE_BATCH_SIZE:
+                    write_entries(db, entries)
+            elif kind == DB:
+                if record[1] not in SNAPSHOT_DBS:
+                    raise SnapshotError('unknown DB {}'.format(record[1]))
+                if db:
+                    close_db(db, entries)
+                db = None
+                db = db_class(db_engine)(record[1], True)
+            elif kind == FILE:
+                path = record[1]
+                if path != COIN_FILE and os.path.dirname(path) != META_DIRECTORY:
+                    raise SnapshotError('unexpected file {}'.format(path))
+                with open(path, 'ab') as flat_file:
+                    flat_file.write(record[2])
+            else:
+                raise SnapshotError('unknown record kind {}'.format(kind))
+        if db:
+            close_db(db, entries)
+        # read_snapshot checked the checksum once the records ran out
+        os.rmdir(db_dir)
+        os.rename(import_dir, db_dir)
+    except BaseException:
+        if db:
+            db.close()
+        os.chdir(os.path.dirname(db_dir))
+        shutil.rmtree(import_dir)
+        raise
+    os.chdir(db_dir)
+    logger.info('imported snapshot at height {:,d} in {:.1f}s'.format(header['height'], time.time() - start))
+    return header
+
+
+def write_entries(db, entries):
+    with db.write_batch() as batch:
+        for key, value in entries:
+            batch.put(key, value)
+    entries.clear()
+
+
+def close_db(db, entries):
+    '''Writes the entries left of a DB and closes it.'''
+    write_entries(db, entries)
+    db.close()
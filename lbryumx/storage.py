@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+
+from electrumx.lib.util import increment_byte_string
+
+# marks keys missing from what was read ahead, told apart from the keys read ahead that are missing from the DB
+NOT_READ = object()
+
+
+class PrefixedDB:
+    '''Keys of a DB starting with a prefix, seen as a DB of their own.
+
+    All the claim state lives on a single DB so it can be committed in a single batch, each of
+    these views taking the place of what used to be a separate DB.'''
+
+    def __init__(self, db, prefix, read_ahead=None):
+        self.db = db
+        self.prefix = prefix
+        self.read_ahead = read_ahead
+
+    def get(self, key):
+        key = self.prefix + key
+        if self.read_ahead is not None:
+            # a single lookup, as sessions read while the block processor thread clears what was read ahead
+            value = self.read_ahead.values.get(key, NOT_READ)
+            if value is not NOT_READ:
+                return value
+        return self.db.get(key)
+
+    def put(self, key, value):
+        self.db.put(self.prefix + key, value)
+
+    def iterator(self, prefix=b'', reverse=False, start=None):
+        '''Entries with keys starting with prefix, from the key prefix + start onwards if start is given, seeking
+        to it on the DB instead of iterating up to it.'''
+        key_start, prefix = len(self.prefix), self.prefix + prefix
+        entries = self.read_ahead.ranges.get(prefix) if self.read_ahead and start is None else None
+        if entries is None and start is not None:
+            entries = self.db.iterator(start=prefix + start, stop=increment_byte_string(prefix), reverse=reverse)
+        elif entries is None:
+            entries = self.db.iterator(prefix=prefix, reverse=reverse)
+        elif reverse:
+            entries = reversed(entries)
+        for key, value in entries:
+            yield key[key_start:], value
+
+    def is_empty(self):
+        return next(self.iterator(), None) is None
+
+    @contextmanager
+    def write_batch(self):
+        with self.db.write_batch() as batch:
+            yield self.batch(batch)
+
+    def batch(self, batch):
+        '''Writes to a batch of the underlying DB, for committing several views together.'''
+        return PrefixedBatch(batch, self.prefix)
+
+
+class ReadAhead:
+    '''Keys and prefixed key ranges of a DB read ahead of time, served to the views over it instead of the
+    DB until cleared. Only valid until the DB is written to.'''
+
+    def __init__(self, db):
+        self.db = db
+        self.values = {}
+        self.ranges = {}
+
+    def __bool__(self):
+        return bool(self.values or self.ranges)
+
+    def read(self, keys=(), prefixes=()):
+        '''Reads the keys and the ranges under prefixes not read yet, in key order so LevelDB walks its
+        blocks forward. Returns how many were read.'''
+        keys = sorted(set(keys).difference(self.values))
+        prefixes = sorted(set(prefixes).difference(self.ranges))
+        for key in keys:
+            self.values[key] = self.db.get(key)
+        for prefix in prefixes:
+            self.ranges[prefix] = list(self.db.iterator(prefix=prefix))
+        return len(keys) + len(prefixes)
+
+    def clear(self):
+        self.values.clear()
+        self.ranges.clear()
+
+
+class PrefixedBatch:
+
+    def __init__(self, batch, prefix):
+        self.batch = batch
+        self.prefix = prefix
+
+    def put(self, key, value):
+        self.batch.put(self.prefix + key, value)
+
+    def delete(self, key):
+        self.batch.delete(self.prefix + key)
@@ -1,6 +1,6 @@
 from electrumx.lib.tx import Deserializer
-from lbryumx.opcodes import decode_claim_script
-from lbryumx.model import TxClaimOutput, LBRYTx
+from lbryumx.opcodes import decode_claim
+from lbryumx.model import TxClaimOutput, LBRYTx, ClaimScript
 
 
 class LBRYDeserializer(Deserializer):
@@ -8,9 +8,10 @@ class LBRYDeserializer(Deserializer):
     def _read_output(self):
         value = self._read_le_int64()
         script = self._read_varbytes()  # pk_script
-        claim = decode_claim_script(script)
-        claim = claim[0] if claim else None
-        return TxClaimOutput(value, script, claim)
+        decoded = decode_claim(script)
+        if not decoded:
+            return TxClaimOutput(value, script, None)
+        return TxClaimOutput(value, ClaimScript(script, *decoded), decoded[0])
 
     def read_tx(self):
         return LBRYTx(
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+'''Checks the claim DB of a stopped server for drift between its indexes, or rebuilds it from the blk*.dat files
+of a lbrycrd data directory, leaving the UTXO and history DBs as they are.
+
+Configured over the same environment variables as lbryumx_server.py, DB_DIRECTORY being the DB directory
+checked or rebuilt, plus BLOCKS_DIRECTORY with the blocks folder of the lbrycrd data directory and
+CLAIM_REBUILD_WORKERS with the processes scanning blocks when rebuilding.
+'''
+import argparse
+import logging
+import os
+import sys
+import traceback
+
+from electrumx.server.env import Env
+
+from lbryumx.blockfiles import BlockFiles
+from lbryumx.coin import LBC
+from lbryumx.rebuild import read_utxo_state, rebuild_claims, verify_claims
+
+
+def verify(env):
+    bp = env.coin.BLOCK_PROCESSOR(env, None, None)
+    read_utxo_state(bp)
+    bp.open_claim_db(False, read_only=True)
+    return not verify_claims(bp)
+
+
+def rebuild(env):
+    block_files = BlockFiles(env.coin, os.path.abspath(env.required('BLOCKS_DIRECTORY')))
+    try:
+        bp = env.coin.BLOCK_PROCESSOR(env, None, None)
+        read_utxo_state(bp)
+        rebuild_claims(bp, block_files, env.integer('CLAIM_REBUILD_WORKERS', os.cpu_count()))
+        if bp.claim_parse_executor:
+            bp.claim_parse_executor.shutdown()
+    finally:
+        block_files.close()
+    return True
+
+
+def main():
+    '''Set up logging and verify or rebuild the claim DB.'''
+    parser = argparse.ArgumentParser(description='Verifies or rebuilds the claim DB.')
+    parser.add_argument('command', choices=('verify', 'rebuild'))
+    args = parser.parse_args()
+    log_fmt = Env.default('LOG_FORMAT', '%(levelname)s:%(name)s:%(message)s')
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    # blocks come from the files, the daemon is never asked for them
+    os.environ.setdefault('DAEMON_URL', '')
+    try:
+        env = Env(LBC)
+        consistent = (verify if args.command == 'verify' else rebuild)(env)
+    except Exception:
+        traceback.print_exc()
+        logging.critical('LbryumX claims {} terminated abnormally'.format(args.command))
+        sys.exit(1)
+    logging.info('LbryumX claims {} terminated normally'.format(args.command))
+    if not consistent:
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+'''Indexes the blocks of a lbrycrd data directory straight from its blk*.dat files, instead of fetching
+them from lbrycrdd. Meant for the initial sync or a reindex, with lbrycrdd stopped or not writing blocks.
+
+Configured over the same environment variables as lbryumx_server.py, DB_DIRECTORY being the DB to sync,
+plus BLOCKS_DIRECTORY with the blocks folder of the lbrycrd data directory and INGEST_BATCH_SIZE with the
+blocks advanced at once. Once done, lbryumx_server.py syncs the rest from lbrycrdd as usual.
+'''
+import asyncio
+import logging
+import os
+import traceback
+
+from electrumx.server.env import Env
+
+from lbryumx.blockfiles import BlockFiles, ingest_block_files
+from lbryumx.coin import LBC
+
+
+def main():
+    '''Set up logging and ingest the block files.'''
+    log_fmt = Env.default('LOG_FORMAT', '%(levelname)s:%(name)s:%(message)s')
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    # blocks come from the files, the daemon is never asked for them
+    os.environ.setdefault('DAEMON_URL', '')
+    try:
+        env = Env(LBC)
+        block_files = BlockFiles(env.coin, os.path.abspath(env.required('BLOCKS_DIRECTORY')))
+        bp = env.coin.BLOCK_PROCESSOR(env, None, None)
+        asyncio.get_event_loop().run_until_complete(bp._first_open_dbs())
+        bp._caught_up_event = asyncio.Event()
+        try:
+            ingest_block_files(bp, block_files, env.integer('INGEST_BATCH_SIZE', 1000))
+        finally:
+            block_files.close()
+            if bp.claim_parse_executor:
+                bp.claim_parse_executor.shutdown()
+    except Exception:
+        traceback.print_exc()
+        logging.critical('LbryumX ingest terminated abnormally')
+    else:
+        logging.info('LbryumX ingest terminated normally')
+
+
+if __name__ == '__main__':
+    main()
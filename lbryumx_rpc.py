@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+'''Sends a LBRY admin RPC command, one electrumx_rpc doesn't know about, to a running LbryumX server.
+
+Connects to the RPC port on localhost like electrumx_rpc, RPC_PORT or 8000 unless given with --port.
+'''
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from aiorpcx import ClientSession
+
+COMMANDS = {
+    'claim_metrics': 'claim processing counters of the last block, since the last flush and since startup',
+}
+
+
+def main():
+    '''Send the command and print its result.'''
+    parser = argparse.ArgumentParser(description='Sends a LBRY admin RPC command to a running LbryumX server.')
+    parser.add_argument('-p', '--port', type=int, default=int(os.environ.get('RPC_PORT', 8000)),
+                        help='RPC port number')
+    parser.add_argument('command', choices=tuple(COMMANDS),
+                        help='; '.join('{}: {}'.format(command, help) for command, help in COMMANDS.items()))
+    args = parser.parse_args()
+
+    async def send_request():
+        async with ClientSession('localhost', args.port) as session:
+            return await session.send_request(args.command, {})
+
+    try:
+        result = asyncio.get_event_loop().run_until_complete(send_request())
+    except OSError:
+        print('cannot connect - is LbryumX catching up, not running, or is {} the wrong RPC port?'.format(args.port))
+        sys.exit(1)
+    print(json.dumps(result, indent=4, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,9 +7,9 @@ import logging
 import traceback
 
 from electrumx.server.env import Env
-from electrumx.server.controller import Controller
 
 from lbryumx.coin import LBC
+from lbryumx.controller import LBRYController
 
 def main():
     '''Set up logging and run the server.'''
@@ -17,7 +17,7 @@ def main():
     logging.basicConfig(level=logging.INFO, format=log_fmt)
     logging.info('LbryumX server starting')
     try:
-        controller = Controller(Env(LBC))
+        controller = LBRYController(Env(LBC))
         controller.run()
     except Exception:
         traceback.print_exc()
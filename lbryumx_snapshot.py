@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+'''Exports the DBs of a stopped server to a snapshot file, or imports one into an empty DB directory so a new
+server starts serving from the snapshot height and syncs the rest from lbrycrdd as usual.
+
+Configured over the same environment variables as lbryumx_server.py, DB_DIRECTORY being the DB directory
+exported or imported into. A snapshot file of - is stdout or stdin.
+'''
+import argparse
+import logging
+import os
+import sys
+import traceback
+
+from electrumx.server.env import Env
+
+from lbryumx.coin import LBC
+from lbryumx.snapshot import export_snapshot, import_snapshot, open_exported_dbs
+
+
+def export(env, path):
+    out = sys.stdout.buffer if path == '-' else open(os.path.abspath(path), 'wb')
+    try:
+        bp = env.coin.BLOCK_PROCESSOR(env, None, None)
+        open_exported_dbs(bp)
+        header, checksum = export_snapshot(bp, out)
+        logging.info('snapshot at height {:,d} has SHA-256 {}'.format(header['height'], checksum))
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+def import_(env, path):
+    source = sys.stdin.buffer if path == '-' else open(os.path.abspath(path), 'rb')
+    try:
+        os.makedirs(env.db_dir, exist_ok=True)
+        header = import_snapshot(env.coin, source, env.db_dir, env.db_engine)
+        logging.info('imported snapshot at height {:,d}, start the server to sync from there'.format(header['height']))
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+
+
+def main():
+    '''Set up logging and export or import a snapshot.'''
+    parser = argparse.ArgumentParser(description='Exports or imports a snapshot of the DBs.')
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('snapshot', help='snapshot file, - for stdout or stdin')
+    args = parser.parse_args()
+    log_fmt = Env.default('LOG_FORMAT', '%(levelname)s:%(name)s:%(message)s')
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    # the daemon is not needed to export or import
+    os.environ.setdefault('DAEMON_URL', '')
+    try:
+        env = Env(LBC)
+        (export if args.command == 'export' else import_)(env, args.snapshot)
+    except Exception:
+        traceback.print_exc()
+        logging.critical('LbryumX snapshot {} terminated abnormally'.format(args.command))
+    else:
+        logging.info('LbryumX snapshot {} terminated normally'.format(args.command))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+'''Builds LBRY chains full of claims, updates, supports, abandons and channels, so the block processor can
+be fed without lbrycrdd. Blocks chain onto each other and only spend outputs created before, so they can
+be advanced and backed up like the ones coming from the daemon.
+
+What goes in the blocks is drawn from a distribution, DEFAULT_DISTRIBUTION updated with the keys of a JSON
+file given to load_distribution, with a seeded random generator so the same seed always builds the same chain.
+The tests and the benchmarks open block processors over temporary DB directories with open_block_processor.
+'''
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import struct
+from itertools import accumulate
+
+import ecdsa
+from electrumx.lib.hash import double_sha256, hash_to_hex_str
+from electrumx.lib.script import Script, ScriptPubKey
+from electrumx.lib.util import int_to_varint
+from electrumx.server.env import Env
+from electrumx.server.storage import Storage
+from lbryschema.claim import ClaimDict
+from lbryschema.proto.claim_pb2 import Claim
+from lbryschema.schema import SECP256k1
+from lbryschema.signer import get_signer
+
+from lbryumx.block_processor import claim_id_hash
+from lbryumx.opcodes import opcodes
+
+COIN = 100000000
+COINBASE_OUTPUT_AMOUNT = 10000 * COIN
+DESCRIPTION_ALPHABET = 'abcdefghijklmnopqrstuvwxyz      '
+
+DEFAULT_DISTRIBUTION = {
+    'blocks': 200,
+    # transactions of each kind per block, drawn between half and one and a half times these
+    'claims_per_block': 100,
+    'updates_per_block': 10,
+    'supports_per_block': 20,
+    'abandons_per_block': 5,
+    'spent_supports_per_block': 5,
+    # claim amounts in LBC, log uniform between these
+    'amount_range': [0.01, 100],
+    'names': 100000,
+    # share of the claims going to a handful of names
+    'hot_names': 10,
+    'hot_name_share': 0.1,
+    # channels are claimed in the first block, claims pick them with weights 1 / rank ** channel_skew
+    'channels': 20,
+    'channel_skew': 1.2,
+    'signed_share': 0.3,
+    # signed values are drawn from this many per channel, as signing every claim takes longer than indexing it
+    'signed_values_per_channel': 16,
+    'description_length_range': [0, 500],
+    # every reorg_interval blocks the last 1 to max_reorg_depth blocks get replaced, 0 never reorgs
+    'reorg_interval': 0,
+    'max_reorg_depth': 10,
+}
+
+
+def load_distribution(path=None, **overrides):
+    '''DEFAULT_DISTRIBUTION updated with the JSON file at path, then with the overrides that aren't None.'''
+    distribution = dict(DEFAULT_DISTRIBUTION)
+    if path:
+        with open(path) as distribution_file:
+            loaded = json.load(distribution_file)
+        unknown = set(loaded) - set(distribution)
+        if unknown:
+            raise ValueError('unknown distribution keys: {}'.format(', '.join(sorted(unknown))))
+        distribution.update(loaded)
+    distribution.update((key, value) for key, value in overrides.items() if value is not None)
+    return distribution
+
+
+def serialize_tx(inputs, outputs):
+    '''Raw transaction spending (txid, nout, script) inputs into (amount, script) outputs.'''
+    parts = [struct.pack('<i', 1), int_to_varint(len(inputs))]
+    for txid, nout, script in inputs:
+        parts.extend((txid, struct.pack('<I', nout), int_to_varint(len(script)), script, b'\xff\xff\xff\xff'))
+    parts.append(int_to_varint(len(outputs)))
+    for amount, script in outputs:
+        parts.extend((struct.pack('<q', amount), int_to_varint(len(script)), script))
+    parts.append(struct.pack('<I', 0))
+    return b''.join(parts)
+
+
+def claim_name_script(name, value, address_script):
+    return (bytes((opcodes.OP_CLAIM_NAME,)) + Script.push_data(name) + Script.push_data(value) +
+            bytes((opcodes.OP_2DROP, opcodes.OP_DROP)) + address_script)
+
+
+def support_claim_script(name, claim_id, address_script):
+    return (bytes((opcodes.OP_SUPPORT_CLAIM,)) + Script.push_data(name) + Script.push_data(claim_id) +
+            bytes((opcodes.OP_2DROP, opcodes.OP_DROP)) + address_script)
+
+
+def update_claim_script(name, claim_id, value, address_script):
+    return (bytes((opcodes.OP_UPDATE_CLAIM,)) + Script.push_data(name) + Script.push_data(claim_id) +
+            Script.push_data(value) + bytes((opcodes.OP_2DROP, opcodes.OP_2DROP)) + address_script)
+
+
+class SyntheticChain:
+    '''Serializes transactions into blocks on top of each other.
+
+    Every block pays its coinbase to coins that later transactions spend for their amounts, getting their
+    change back. The outpoints of claims and supports are kept so they can be updated, abandoned or spent,
+    and the whole state can be saved and restored to build a fork.'''
+
+    def __init__(self, coin, coinbase_outputs=10, address_hash160=bytes(20)):
+        self.coin = coin
+        self.coinbase_outputs = coinbase_outputs
+        self.address = coin.P2PKH_address_from_hash160(address_hash160)
+        self.address_script = ScriptPubKey.P2PKH_script(address_hash160)
+        self.tip = bytes(32)
+        self.height = -1
+        self.blocks_built = 0
+        self.coins = []
+        self.claims = {}  # claim_id -> [name, txid, nout, amount, tag]
+        self.claim_ids = []  # claims random_claim picks from, claim_index has their positions
+        self.claim_index = {}
+        self.supports = []  # [claim_id, txid, nout]
+        self.txs = []
+
+    def save(self):
+        assert not self.txs, 'state is saved between blocks'
+        return (self.tip, self.height, list(self.coins),
+                {claim_id: list(claim) for claim_id, claim in self.claims.items()},
+                list(self.claim_ids), dict(self.claim_index), [list(support) for support in self.supports])
+
+    def restore(self, state):
+        self.tip, self.height, self.coins, self.claims, self.claim_ids, self.claim_index, self.supports = state
+
+    def add_tx(self, inputs, outputs):
+        '''Spends inputs plus a coin into outputs, the change going back to the coins. Returns the txid.'''
+        amount = sum(output_amount for output_amount, _ in outputs)
+        if not self.coins:
+            raise ValueError('no coins left to spend, generate a block first')
+        coin_txid, coin_nout, coin_amount = self.coins.pop(0)
+        if coin_amount <= amount:
+            raise ValueError('coin of {:,d} can not pay {:,d}'.format(coin_amount, amount))
+        inputs = [(txid, nout, b'') for txid, nout in inputs] + [(coin_txid, coin_nout, b'')]
+        outputs = list(outputs) + [(coin_amount - amount, self.address_script)]
+        raw_tx = serialize_tx(inputs, outputs)
+        txid = double_sha256(raw_tx)
+        self.txs.append(raw_tx)
+        if coin_amount - amount > COINBASE_OUTPUT_AMOUNT // 10:
+            self.coins.append((txid, len(outputs) - 1, coin_amount - amount))
+        return txid
+
+    def claim(self, name, value, amount=COIN, tag=None, selectable=True):
+        '''Claims name, keeping tag along with the claim for the caller. Returns the claim id.'''
+        txid = self.add_tx([], [(amount, claim_name_script(name, value, self.address_script))])
+        claim_id = claim_id_hash(txid, 0)
+        self.claims[claim_id] = [name, txid, 0, amount, tag]
+        if selectable:
+            self.claim_index[claim_id] = len(self.claim_ids)
+            self.claim_ids.append(claim_id)
+        return claim_id
+
+    def random_claim(self, rng):
+        return self.claim_ids[rng.randrange(len(self.claim_ids))]
+
+    def update(self, claim_id, value):
+        claim = self.claims[claim_id]
+        name, txid, nout, amount, _ = claim
+        claim[1] = self.add_tx([(txid, nout)], [(amount, update_claim_script(name, claim_id, value,
+                                                                             self.address_script))])
+        claim[2] = 0
+
+    def abandon(self, claim_id):
+        _, txid, nout, _, _ = self.claims.pop(claim_id)
+        position = self.claim_index.pop(claim_id, None)
+        if position is not None:
+            last = self.claim_ids.pop()
+            if last != claim_id:
+                self.claim_ids[position] = last
+                self.claim_index[last] = position
+        self.add_tx([(txid, nout)], [])
+
+    def support(self, claim_id, amount=COIN):
+        name = self.claims[claim_id][0]
+        txid = self.add_tx([], [(amount, support_claim_script(name, claim_id, self.address_script))])
+        self.supports.append([claim_id, txid, 0])
+
+    def spend_support(self, index=0):
+        self.supports[index], self.supports[-1] = self.supports[-1], self.supports[index]
+        _, txid, nout = self.supports.pop()
+        self.add_tx([(txid, nout)], [])
+
+    def block(self):
+        '''Serializes the transactions added since the last block, after a new coinbase.'''
+        self.height += 1
+        self.blocks_built += 1
+        # the count of blocks built keeps blocks replacing others in a reorg from being the same
+        coinbase_script = struct.pack('<II', self.height, self.blocks_built)
+        coinbase = serialize_tx([(bytes(32), 0xffffffff, coinbase_script)],
+                                [(COINBASE_OUTPUT_AMOUNT, self.address_script)] * self.coinbase_outputs)
+        txs, self.txs = [coinbase] + self.txs, []
+        coinbase_txid = double_sha256(coinbase)
+        self.coins.extend((coinbase_txid, nout, COINBASE_OUTPUT_AMOUNT) for nout in range(self.coinbase_outputs))
+        header = (struct.pack('<I', 1) + self.tip + double_sha256(b''.join(map(double_sha256, txs))) +
+                  bytes(32) + struct.pack('<III', 1500000000 + self.height * 150, 0x207fffff, self.height))
+        self.tip = self.coin.header_hash(header)
+        return header + int_to_varint(len(txs)) + b''.join(txs)
+
+
+class Channel:
+    '''Certificate claim with the key its claims are signed with.'''
+
+    def __init__(self, rng, name):
+        self.name = name
+        signing_key = ecdsa.SigningKey.from_secret_exponent(rng.randrange(1, ecdsa.SECP256k1.order),
+                                                            curve=ecdsa.SECP256k1, hashfunc=hashlib.sha256)
+        self.signer = get_signer(SECP256k1)(signing_key)
+        self.value = ClaimDict.load_protobuf(self.signer.certificate).serialized
+        self.claim_id = None
+
+
+class ClaimValues:
+    '''Protobuf stream claim values, signed by a channel when given one.
+
+    Values are copies of a template with their title, description and source changed, as going through
+    lbryschema dictionaries for each of them would take most of the time spent generating.'''
+
+    def __init__(self, rng, distribution, address):
+        self.rng = rng
+        self.address = address
+        self.description_length_range = distribution['description_length_range']
+        self.signed_values_per_channel = distribution['signed_values_per_channel']
+        self.signed_values = {}
+        self.template = ClaimDict.load_dict({
+            'version': '_0_0_1',
+            'claimType': 'streamType',
+            'stream': {
+                'version': '_0_0_1',
+                'metadata': {
+                    'version': '_0_1_0', 'license': 'LBRY inc', 'language': 'en', 'nsfw': False,
+                    'title': '', 'author': 'synthetic', 'thumbnail': 'https://lbry.io/thumbnail.png',
+                    'description': '',
+                },
+                'source': {
+                    'version': '_0_0_1', 'sourceType': 'lbry_sd_hash', 'contentType': 'video/mp4',
+                    'source': '00' * 48,
+                },
+            },
+        }).protobuf
+
+    def stream(self, title):
+        rng, claim = self.rng, Claim()
+        claim.CopyFrom(self.template)
+        claim.stream.metadata.title = title
+        claim.stream.metadata.description = ''.join(rng.choices(DESCRIPTION_ALPHABET,
+                                                                k=rng.randint(*self.description_length_range)))
+        claim.stream.source.source = rng.getrandbits(384).to_bytes(48, 'big')
+        return claim
+
+    def value(self, title, channel=None):
+        if not channel:
+            return self.stream(title).SerializeToString()
+        key = (channel.claim_id, self.rng.randrange(self.signed_values_per_channel))
+        if key not in self.signed_values:
+            stream = ClaimDict.load_protobuf(self.stream('{} {}'.format(channel.name.decode(), key[1])))
+            signed = channel.signer.sign_stream_claim(stream, self.address, hash_to_hex_str(channel.claim_id))
+            self.signed_values[key] = ClaimDict.load_protobuf(signed).serialized
+        return self.signed_values[key]
+
+
+def generate_blocks(coin, distribution=None, seed=0):
+    '''Yields (fork_depth, raw_block) for the blocks of a chain drawn from distribution.
+
+    fork_depth is how many blocks have to be backed up before advancing the block, which is 0 but for
+    the first block of a fork. The chain ends up distribution['blocks'] long, not counting orphaned blocks.'''
+    distribution = distribution or DEFAULT_DISTRIBUTION
+    rng = random.Random(seed)
+    chain = SyntheticChain(coin, coinbase_outputs=distribution['claims_per_block'] * 2 + 10)
+    values = ClaimValues(rng, distribution, chain.address)
+    min_amount, max_amount = (math.log(amount * COIN) for amount in distribution['amount_range'])
+    hot_names = [b'hot-%d' % n for n in range(distribution['hot_names'])]
+    channels = [Channel(rng, b'@channel-%d' % n) for n in range(distribution['channels'])]
+    channel_weights = list(accumulate(1 / (rank + 1) ** distribution['channel_skew']
+                                      for rank in range(len(channels))))
+
+    def amount():
+        return int(math.exp(rng.uniform(min_amount, max_amount)))
+
+    def count(key):
+        mean = distribution[key]
+        return rng.randint(mean // 2, mean + mean // 2)
+
+    def name():
+        if hot_names and rng.random() < distribution['hot_name_share']:
+            return rng.choice(hot_names)
+        return b'name-%d' % rng.randrange(distribution['names'])
+
+    def signing_channel():
+        if channels and rng.random() < distribution['signed_share']:
+            return rng.choices(channels, cum_weights=channel_weights)[0]
+        return None
+
+    def next_block():
+        # the first block only funds the ones after it, channels get claimed on the second one
+        if chain.height == 0:
+            for channel in channels:
+                channel.claim_id = chain.claim(channel.name, channel.value, amount(), selectable=False)
+        elif chain.height > 0:
+            for _ in range(count('claims_per_block')):
+                channel = signing_channel()
+                chain.claim(name(), values.value('claim at {}'.format(chain.height + 1), channel), amount(),
+                            tag=channel)
+            for _ in range(min(count('updates_per_block'), len(chain.claim_ids))):
+                claim_id = chain.random_claim(rng)
+                chain.update(claim_id, values.value('update at {}'.format(chain.height + 1),
+                                                    chain.claims[claim_id][4]))
+            for _ in range(count('supports_per_block') if chain.claim_ids else 0):
+                chain.support(chain.random_claim(rng), amount())
+            for _ in range(min(count('abandons_per_block'), len(chain.claim_ids))):
+                chain.abandon(chain.random_claim(rng))
+            for _ in range(min(count('spent_supports_per_block'), len(chain.supports))):
+                chain.spend_support(rng.randrange(len(chain.supports)))
+        return chain.block()
+
+    reorg_interval = distribution['reorg_interval']
+    max_depth = min(distribution['max_reorg_depth'], coin.REORG_LIMIT)
+    next_reorg, reorg_height, fork_state = reorg_interval, None, None
+    while chain.height + 1 < distribution['blocks']:
+        if reorg_interval and reorg_height is None and chain.height + 1 >= next_reorg:
+            reorg_height, fork_state = chain.height + rng.randint(1, max_depth), chain.save()
+        yield 0, next_block()
+        if chain.height == reorg_height:
+            chain.restore(fork_state)
+            yield reorg_height - chain.height, next_block()
+            next_reorg, reorg_height = next_reorg + reorg_interval, None
+
+
+def open_block_processor(coin, db_dir):
+    '''Opens a block processor on db_dir, which electrumx makes the working directory.'''
+    os.environ['DB_DIRECTORY'] = db_dir
+    os.environ['DAEMON_URL'] = ''
+    bp = coin.BLOCK_PROCESSOR(Env(coin), None, None)
+    asyncio.get_event_loop().run_until_complete(bp._first_open_dbs())
+    bp._caught_up_event = asyncio.Event()
+    return bp
+
+
+def close_block_processor(bp):
+    if bp.claim_parse_executor:
+        bp.claim_parse_executor.shutdown()
+    for attr in dir(bp):
+        obj = getattr(bp, attr)
+        if isinstance(obj, Storage):
+            obj.close()
+    bp.history.close_db()
+
+
+class DaemonHeight:
+    '''Stands for the daemon, which the block processor only asks for its height while advancing.'''
+
+    def __init__(self, height=0):
+        self.height = height
+
+    def cached_height(self):
+        return self.height
+
+
+def feed_block_processor(bp, generated, batch_size=50, flush_every=100, daemon_height=None):
+    '''Advances bp through (fork_depth, raw_block) tuples in batches, backing up the blocks orphaned by reorgs.
+
+    The daemon is said to be at daemon_height. If not given it follows the blocks, as when at the tip,
+    so the undo information of every block is kept and any of them can be backed up.'''
+    coin, raw_blocks, batch, flushed_height = bp.coin, {}, [], bp.height
+    bp.daemon = DaemonHeight(daemon_height or 0)
+
+    def advance():
+        if batch:
+            if daemon_height is None:
+                bp.daemon.height = bp.height + len(batch)
+            bp.advance_blocks(batch)
+            batch.clear()
+
+    for fork_depth, raw_block in generated:
+        if fork_depth:
+            advance()
+            bp.flush(True)
+            bp.backup_blocks([raw_blocks[height] for height in range(bp.height, bp.height - fork_depth, -1)])
+            flushed_height = bp.height
+        height = bp.height + len(batch) + 1
+        raw_blocks[height] = raw_block
+        raw_blocks.pop(height - coin.REORG_LIMIT, None)
+        batch.append(coin.block(raw_block, height))
+        if len(batch) >= batch_size:
+            advance()
+            if bp.height - flushed_height >= flush_every:
+                bp.flush(True)
+                flushed_height = bp.height
+    advance()
+    bp.flush(True)
@@ -0,0 +1,81 @@
+import random
+import struct
+from collections import defaultdict
+
+from electrumx.lib.hash import HASHX_LEN
+
+from lbryumx.block_processor import NAMES_PREFIX
+from lbryumx.blockfiles import BlockFiles, ingest_block_files
+from lbryumx.coin import LBC
+
+from .synthetic import generate_blocks, feed_block_processor, load_distribution, open_block_processor, \
+    close_block_processor
+
+
+def test_block_files_ingest_matches_a_normal_sync(block_processor, tmpdir):
+    distribution = load_distribution(blocks=30, claims_per_block=10, channels=2, signed_share=0.5,
+                                     reorg_interval=10, max_reorg_depth=3)
+    generated = list(generate_blocks(LBC, distribution, seed=3))
+    chain = []
+    for fork_depth, raw_block in generated:
+        del chain[len(chain) - fork_depth:]
+        chain.append(raw_block)
+    assert len(chain) < len(generated)
+
+    # lbrycrd stores blocks as they arrive, orphaned ones included, and leaves the end of the files zeroed
+    stored = [raw_block for _, raw_block in generated]
+    random.Random(0).shuffle(stored)
+    for index, raw_blocks in enumerate((stored[:20], stored[20:])):
+        records = b''.join(LBC.NETWORK_MAGIC + struct.pack('<I', len(raw_block)) + raw_block
+                           for raw_block in raw_blocks)
+        tmpdir.join('blocks', 'blk{:05d}.dat'.format(index)).write_binary(records + bytes(1000), ensure=True)
+    tmpdir.join('blocks', 'blk00002.dat').write_binary(b'', ensure=True)
+    block_files = BlockFiles(LBC, tmpdir.join('blocks').strpath)
+    assert len(block_files.blocks) == len(generated)
+    assert [block_files.raw_block(block_hash) for block_hash in block_files.main_chain()] == chain
+
+    feed_block_processor(block_processor, [(0, raw_block) for raw_block in chain], batch_size=4, flush_every=8,
+                         daemon_height=len(chain) - 1)
+    synced = db_state(block_processor)
+    # LevelDB locks DBs by their relative path, which is the same on both
+    close_block_processor(block_processor)
+
+    ingested_bp = open_block_processor(LBC, tmpdir.mkdir('ingested').strpath)
+    try:
+        ingest_block_files(ingested_bp, block_files, batch_size=7)
+        assert db_state(ingested_bp) == synced
+    finally:
+        block_files.close()
+        close_block_processor(ingested_bp)
+
+
+def test_block_files_main_chain_has_the_most_work(tmpdir):
+    chain = [raw_block for _, raw_block in generate_blocks(LBC, load_distribution(blocks=6, claims_per_block=2))]
+    # a fork off the fourth block, one block shorter but mined at a much lower target
+    harder = chain[4][:104] + struct.pack('<I', 0x1d00ffff) + chain[4][108:]
+    # and one as long as the chain, with as much work
+    tied = chain[5][:108] + struct.pack('<I', 1 << 31) + chain[5][112:]
+    for stored, main_chain in (([tied] + chain, chain[:5] + [tied]), (chain + [tied], chain),
+                               (chain + [tied, harder], chain[:4] + [harder])):
+        records = b''.join(LBC.NETWORK_MAGIC + struct.pack('<I', len(raw_block)) + raw_block for raw_block in stored)
+        tmpdir.join('blocks', 'blk00000.dat').write_binary(records, ensure=True)
+        block_files = BlockFiles(LBC, tmpdir.join('blocks').strpath)
+        try:
+            assert [block_files.raw_block(block_hash) for block_hash in block_files.main_chain()] == main_chain
+        finally:
+            block_files.close()
+
+
+def db_state(bp):
+    '''Chain, UTXO, history and claim state of bp. What depends on when flushes happened is left out: how
+    the history of each address is split between them, and the positions of the claims of a name.'''
+    history = defaultdict(bytes)
+    for key, value in bp.history.db.iterator():
+        if not key.startswith(b'state'):
+            history[key[:HASHX_LEN]] += value
+    return {'tip': (bp.height, bp.tip, bp.tx_count),
+            'utxos': {key: value for key, value in bp.utxo_db.iterator() if key != b'state'},
+            'history': dict(history),
+            'claims': {key: value for key, value in bp.claim_db.iterator() if key[:1] != NAMES_PREFIX},
+            'names': {name: set(bp.get_claim_ids_for_name(name))
+                      for name in {bp.get_claim_info(claim_id).name for claim_id, _ in bp.claims_db.iterator()}}}
@@ -0,0 +1,36 @@
+from electrumx.lib.tx import TxInput
+
+from lbryumx.bloom import BloomFilter
+
+from .test_claimtrie import advance_claim, make_tx, random_hash, support_output
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1024)
+    keys = [random_hash() for _ in range(100)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert len(bloom) == 100
+    # 80 bits per key
+    assert sum(random_hash() in bloom for _ in range(1000)) < 10
+
+
+def test_spending_other_outputs_skips_claim_lookups(block_processor):
+    claim_id, claim_txid = advance_claim(block_processor, 10, b'name', 10)
+    tx, support_txid = make_tx([support_output(b'name', claim_id, 5)])
+    block_processor.advance_claim_txs([(tx, support_txid)], 11)
+    block_processor.flush(True)
+    metrics = block_processor.get_claim_metrics()
+
+    tx, txid = make_tx([], inputs=[TxInput(random_hash(), 0, b'', 0xffffffff)])
+    block_processor.advance_claim_txs([(tx, txid)], 12)
+    metrics = block_processor.get_claim_metrics() - metrics
+    assert metrics['outpoint_filter_skips'] == 1 and not metrics['outpoint_filter_false_positives']
+
+    # rebuilt from the DB, as on startup
+    block_processor.outpoint_filter = block_processor.build_outpoint_filter()
+    tx, txid = make_tx([], inputs=[TxInput(support_txid, 0, b'', 0xffffffff), TxInput(claim_txid, 0, b'', 0xffffffff)])
+    block_processor.advance_claim_txs([(tx, txid)], 13)
+    assert not block_processor.get_supports(claim_id)
+    assert claim_id in block_processor.pending_abandons
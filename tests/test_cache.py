@@ -0,0 +1,67 @@
+from unittest.mock import MagicMock
+
+from lbryumx.cache import LRUCache
+from lbryumx.model import ClaimInfo
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set(b'a', 1)
+    cache.set(b'b', 2)
+    assert cache.get(b'a') == 1
+    cache.set(b'c', 3)
+
+    assert cache.get(b'b') is None
+    assert cache.get(b'a') == 1 and cache.get(b'c') == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_lru_skips_values_read_before_an_invalidation():
+    cache = LRUCache(2)
+    generation = cache.generation
+    cache.invalidate(b'a')
+    cache.set(b'a', 1, generation)
+    assert cache.get(b'a') is None
+
+
+def test_claim_info_cache_invalidation(block_processor):
+    claim_id = b'claim_id'
+    claim_info = ClaimInfo(b'name', b'txid', 0, 10, b'address', 1, None)
+    block_processor.put_claim_info(claim_id, claim_info)
+    block_processor.put_claim_id_for_outpoint(b'txid', 0, claim_id)
+    assert block_processor.get_claim_info(claim_id) == claim_info
+    assert block_processor.get_claim_info(claim_id) == claim_info
+    assert block_processor.claim_info_cache.hits == 1
+
+    updated_claim_info = claim_info._replace(amount=20)
+    block_processor.put_claim_info(claim_id, updated_claim_info)
+    assert block_processor.get_claim_info(claim_id) == updated_claim_info
+
+    block_processor.abandon_spent(b'txid', 0)
+    block_processor.flush(True)
+    assert block_processor.get_claim_info(claim_id) is None
+
+
+def test_claim_caches_count_towards_cache_size(block_processor):
+    block_processor.daemon = MagicMock()
+    block_processor.daemon.cached_height.return_value = 0
+    block_processor.cache_MB = 5
+    claim_info = ClaimInfo(b'name', b'txid', 0, 10, b'address', 1, None)
+    block_processor.put_claim_info(b'claim_id', claim_info)
+    block_processor.put_claim_value(b'claim_id', b'value' * 40)
+    size = block_processor.claim_cache_size()
+    assert size >= len(claim_info.serialized) + 200
+    block_processor.put_claim_info(b'claim_id', claim_info)
+    block_processor.put_claim_value(b'claim_id', b'value' * 40)
+    assert block_processor.claim_cache_size() == size
+
+    block_processor.check_cache_size()
+    assert block_processor.claim_cache
+    # the claim caches alone reach the 20% of CACHE_MB shared with the history
+    for index in range(3000):
+        block_processor.put_claim_info(index.to_bytes(20, 'big'), claim_info)
+        block_processor.put_claim_value(index.to_bytes(20, 'big'), b'value' * 40)
+    block_processor.check_cache_size()
+    assert not block_processor.claim_cache and not block_processor.claim_cache_size()
+    assert block_processor.claims_db.get(b'claim_id') == claim_info.serialized
+
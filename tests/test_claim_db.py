@@ -1,3 +1,18 @@
+import os
+import shutil
+import struct
+
+import msgpack
+import pytest
+
+from lbryumx.block_processor import LBRYBlockProcessor, NAMES_DB_VERSION_KEY, SIGNATURES_DB_VERSION_KEY, \
+    CLAIMS_HEIGHT_KEY, CLAIM_POSITION_PREFIX, CERT_CLAIM_PREFIX, CERT_COUNT_PREFIX, name_claims_prefix
+from lbryumx.coin import LBC
+from lbryumx.model import ClaimInfo
+
+from .synthetic import DaemonHeight, generate_blocks, load_distribution
+
+
 def test_claim_sequence_remove_reorders(block_processor):
     name, db = b'name', block_processor
     db.put_claim_for_name(name, b'id1')
@@ -8,6 +23,55 @@ def test_claim_sequence_remove_reorders(block_processor):
     assert db.get_claims_for_name(name) == {b'id1': 1, b'id3': 2}
 
 
+def test_claim_sequence_merges_flushed_and_pending_claims(block_processor):
+    db = block_processor
+    db.put_claim_for_name(b'name', b'id1')
+    db.put_claim_for_name(b'name', b'id2')
+    db.put_claim_for_name(b'name_and_more', b'id3')
+    db.flush(True)
+    db.remove_claim_for_name(b'name', b'id1')
+    db.put_claim_for_name(b'name', b'id4')
+
+    assert db.get_claims_for_name(b'name') == {b'id2': 1, b'id4': 2}
+    assert db.get_claim_sequence(b'name', b'id4') == 2
+    assert db.get_claim_sequence(b'name', b'id3') is None
+    assert db.get_claim_id_for_sequence(b'name', 1) == b'id2'
+    db.flush(True)
+    assert db.get_claims_for_name(b'name') == {b'id2': 1, b'id4': 2}
+    assert db.get_claims_for_name(b'name_and_more') == {b'id3': 1}
+
+
+def test_names_db_migration(block_processor):
+    db = block_processor
+    with db.names_db.write_batch() as batch:
+        batch.delete(NAMES_DB_VERSION_KEY)
+        batch.put(b'name', msgpack.dumps({b'id1': 1, b'id2': 2}))
+    db.migrate_names_db()
+
+    assert db.names_db.get(b'name') is None
+    assert db.get_claims_for_name(b'name') == {b'id1': 1, b'id2': 2}
+    db.put_claim_for_name(b'name', b'id3')
+    assert db.get_claim_sequence(b'name', b'id3') == 3
+
+
+def test_names_db_migration_resumes(block_processor):
+    db = block_processor
+    first_ids, second_ids = [os.urandom(20) for _ in range(2)], [os.urandom(20) for _ in range(2)]
+    with db.names_db.write_batch() as batch:
+        batch.delete(NAMES_DB_VERSION_KEY)
+        # the first name was migrated by a run that stopped before writing the version
+        for sequence, claim_id in enumerate(first_ids, start=1):
+            batch.put(name_claims_prefix(b'c') + struct.pack('>I', sequence), claim_id)
+            batch.put(CLAIM_POSITION_PREFIX + claim_id, struct.pack('>I', sequence))
+        batch.put(b'r', msgpack.dumps({claim_id: sequence for sequence, claim_id in enumerate(second_ids, start=1)}))
+    db.migrate_names_db()
+
+    assert db.names_db.get(NAMES_DB_VERSION_KEY)
+    assert db.get_claim_ids_for_name(b'c') == first_ids
+    assert db.get_claim_ids_for_name(b'r') == second_ids
+    assert db.get_claim_sequence(b'c', first_ids[1]) == 2
+
+
 def test_cert_to_claims_storage(block_processor):
     db = block_processor
     db.put_claim_id_signed_by_cert_id(b'certificate_id', b'claim_id1')
@@ -31,6 +95,57 @@ def test_cert_to_claims_storage_removal_of_claim_id(block_processor):
     assert db.get_signed_claim_ids_by_cert_id(b'certificate_id') == [b'claim_id2']
 
 
+def test_signed_claims_pagination_and_count(block_processor):
+    db = block_processor
+    for claim_id in (b'claim_id3', b'claim_id1', b'claim_id4'):
+        db.put_claim_id_signed_by_cert_id(b'certificate_id', claim_id)
+    db.flush(True)
+    db.put_claim_id_signed_by_cert_id(b'certificate_id', b'claim_id2')
+    db.put_claim_id_signed_by_cert_id(b'certificate_id', b'claim_id2')
+    db.remove_claim_from_certificate_claims(b'certificate_id', b'claim_id3')
+
+    assert db.get_signed_claim_count(b'certificate_id') == 3
+    assert db.get_signed_claim_ids_by_cert_id(b'certificate_id', b'claim_id1', 2) == [b'claim_id2', b'claim_id4']
+    db.flush(True)
+    assert db.get_signed_claim_count(b'certificate_id') == 3
+    assert db.get_signed_claim_ids_by_cert_id(b'certificate_id', None, 2) == [b'claim_id1', b'claim_id2']
+    assert db.get_signed_claim_ids_by_cert_id(b'certificate_id', b'claim_id2', 2) == [b'claim_id4']
+    assert db.get_signed_claim_ids_by_cert_id(b'certificate_id', b'claim_id4') == []
+    db.remove_certificate(b'certificate_id')
+    assert db.get_signed_claim_count(b'certificate_id') == 0
+
+
+def test_signatures_db_migration(block_processor):
+    db = block_processor
+    with db.signatures_db.write_batch() as batch:
+        batch.delete(SIGNATURES_DB_VERSION_KEY)
+        batch.put(b'certificate_id', msgpack.dumps([b'claim_id2', b'claim_id1']))
+    db.migrate_signatures_db()
+
+    assert db.signatures_db.get(b'certificate_id') is None
+    assert db.get_signed_claim_ids_by_cert_id(b'certificate_id') == [b'claim_id1', b'claim_id2']
+    assert db.get_signed_claim_count(b'certificate_id') == 2
+
+
+def test_signatures_db_migration_resumes(block_processor):
+    db = block_processor
+    first_cert_id, second_cert_id = b'c' + os.urandom(19), b'n' + os.urandom(19)
+    first_ids, second_ids = sorted(os.urandom(20) for _ in range(2)), sorted(os.urandom(20) for _ in range(2))
+    with db.signatures_db.write_batch() as batch:
+        batch.delete(SIGNATURES_DB_VERSION_KEY)
+        # the first certificate was migrated by a run that stopped before writing the version
+        for claim_id in first_ids:
+            batch.put(CERT_CLAIM_PREFIX + first_cert_id + claim_id, b'')
+        batch.put(CERT_COUNT_PREFIX + first_cert_id, struct.pack('>I', 2))
+        batch.put(second_cert_id, msgpack.dumps(second_ids))
+    db.migrate_signatures_db()
+
+    assert db.signatures_db.get(SIGNATURES_DB_VERSION_KEY)
+    assert db.get_signed_claim_ids_by_cert_id(first_cert_id) == first_ids
+    assert db.get_signed_claim_ids_by_cert_id(second_cert_id) == second_ids
+    assert db.get_signed_claim_count(second_cert_id) == 2
+
+
 def test_claim_id_outpoint_retrieval(block_processor):
     db = block_processor
     db.put_claim_id_for_outpoint(b'txid bytes', tx_idx=2, claim_id=b'400cafe800')
@@ -43,3 +158,95 @@ def test_pending_abandons_trigger(block_processor):
     block_processor.put_claim_id_for_outpoint(b'existing_tx', tx_idx=4, claim_id=b'1337')
     block_processor.abandon_spent(b'existing_tx', 4)
     assert b'1337' in block_processor.pending_abandons
+
+
+def test_separate_claim_dbs_migration(block_processor):
+    db = block_processor
+    db.claim_db.close()
+    shutil.rmtree('claim_state')
+    old_claims_db, old_undo_db = db.db_class('claims', True), db.db_class('claim_undo', True)
+    # claim info of older versions had the value inline, the undo too
+    old_claim_info = [b'name', b'value', b'txid', 0, 10, b'address', 1, None]
+    old_claims_db.put(b'claim_id', msgpack.dumps(old_claim_info))
+    old_undo_db.put(struct.pack('>I', 10), msgpack.dumps([[b'claim_id', old_claim_info]]))
+    old_claims_db.close()
+    old_undo_db.close()
+    db.claim_db = None
+    db.open_claim_db(True)
+
+    assert not os.path.exists('claims') and not os.path.exists('claim_undo')
+    claim_info = ClaimInfo(b'name', b'txid', 0, 10, b'address', 1, None)
+    assert db.get_claim_info(b'claim_id') == claim_info
+    assert db.get_claim_value(b'claim_id') == b'value'
+    assert msgpack.loads(db.claim_undo_db.get(struct.pack('>I', 10))) == [[[b'claim_id', list(claim_info), b'value']],
+                                                                         {}]
+    assert db.names_db.get(NAMES_DB_VERSION_KEY)
+
+
+def test_separate_claim_dbs_are_kept_until_all_of_them_are_copied(block_processor, monkeypatch):
+    db = block_processor
+    db.claim_db.close()
+    shutil.rmtree('claim_state')
+    old_claims_db, old_undo_db = db.db_class('claims', True), db.db_class('claim_undo', True)
+    old_claims_db.put(b'claim_id', msgpack.dumps([b'name', b'value', b'txid', 0, 10, b'address', 1, None]))
+    old_undo_db.put(struct.pack('>I', 10), msgpack.dumps([]))
+    old_claims_db.close()
+    old_undo_db.close()
+    db.claim_db = None
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+    # stopped copying the undo, the last of them
+    monkeypatch.setattr(LBRYBlockProcessor, 'combined_claim_undo', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        db.open_claim_db(True)
+    assert os.path.exists('claims') and os.path.exists('claim_undo')
+
+    # the claim DB is no longer new on the next start, the copy starts over anyway
+    monkeypatch.undo()
+    db.claim_db.close()
+    db.claim_db = None
+    db.open_claim_db(True)
+    assert not os.path.exists('claims') and not os.path.exists('claim_undo')
+    assert db.get_claim_value(b'claim_id') == b'value'
+    assert db.claim_undo_db.get(struct.pack('>I', 10))
+
+
+def test_claim_undo_is_flushed_with_claims_and_pruned(block_processor):
+    db = block_processor
+    db.env.reorg_limit = 2
+    for height in range(5):
+        db.height = height
+        db.pending_claim_undo.append((height, [], {}))
+        db.batched_flush_claims()
+
+    assert [key for key, _ in db.claim_undo_db.iterator()] == [struct.pack('>I', 3), struct.pack('>I', 4)]
+    assert db.claim_db.get(CLAIMS_HEIGHT_KEY) == struct.pack('>i', 4)
+
+
+
+def test_claims_of_the_blocks_flushed_when_caught_up_are_on_disk(block_processor):
+    block_processor._caught_up_event.set()
+    block_processor.daemon = DaemonHeight(3)
+    generated = generate_blocks(LBC, load_distribution(blocks=3, claims_per_block=5))
+    for _, raw_block in generated:
+        # electrumx flushes each block it advanced, the claims of the block must go with it
+        block_processor.advance_blocks([LBC.block(raw_block, block_processor.height + 1)])
+        block_processor.assert_flushed()
+        assert block_processor.claim_db.get(CLAIMS_HEIGHT_KEY) == struct.pack('>i', block_processor.height)
+
+
+def test_claims_removed_in_the_caches_are_not_read_back_from_disk(block_processor):
+    db = block_processor
+    claim_info = ClaimInfo(b'name', b'txid', 0, 10, b'address', 1, None)
+    db.put_claim_info(b'id1', claim_info)
+    db.put_claim_id_for_outpoint(b'txid', 0, b'id1')
+    db.batched_flush_claims()
+
+    db.claim_cache[b'id1'] = None
+    db.remove_claim_id_for_outpoint(b'txid', 0)
+    assert db.get_claim_info(b'id1') is None
+    assert db.get_claim_id_from_outpoint(b'txid', 0) is None
+    # nor kept once the removal is written
+    db.batched_flush_claims()
+    assert db.get_claim_info(b'id1') is None
@@ -1,5 +1,8 @@
+import asyncio
+from binascii import unhexlify
 from hashlib import sha256
 from random import getrandbits
+from unittest.mock import MagicMock
 
 from electrumx.lib.hash import hash_to_hex_str
 from electrumx.lib.tx import TxInput
@@ -8,11 +11,13 @@ from lbryschema.schema import SECP256k1
 from lbryschema.claim import ClaimDict
 from lbryschema.signer import get_signer
 
-from lbryumx.block_processor import claim_id_hash
-from lbryumx.coin import LBC
-from lbryumx.model import NameClaim, TxClaimOutput, ClaimInfo, ClaimUpdate, ClaimSupport
+from lbryumx import block_processor as block_processor_module
+from lbryumx.block_processor import claim_id_hash, parse_claim_outputs
+from lbryumx.coin import LBC, LBCRegTest
+from lbryumx.model import NameClaim, TxClaimOutput, ClaimInfo, ClaimUpdate, ClaimSupport, LBRYTx
 
 from .data import claim_data
+from .data.regtest_chain import hex_blocks
 
 
 def test_simple_claim_info_advance(block_processor):
@@ -77,7 +82,7 @@ def test_claim_update_validator(block_processor):
     claim = ClaimUpdate(b'name', claim_id, b'new value')
     assert not block_processor.get_update_input(claim, [input])
 
-    block_processor.put_claim_info(claim_id, ClaimInfo(b'name', b'value', prev_hash, prev_idx, 20, b'address', 1, None))
+    block_processor.put_claim_info(claim_id, ClaimInfo(b'name', prev_hash, prev_idx, 20, b'address', 1, None))
 
     assert block_processor.get_update_input(claim, [input])
 
@@ -99,8 +104,7 @@ def make_claim(block_processor, name=None, value=None, key=None, cert_id=None, c
         output = create_claim_output(address, name, value, key, cert_id)
         block_processor.advance_claim_name_transaction(output, height, txid, nout)
 
-    return claim_id, ClaimInfo(name, output.claim.value, txid,
-                               nout, output.value, address.encode(), height, cert_id)
+    return claim_id, ClaimInfo(name, txid, nout, output.value, address.encode(), height, cert_id)
 
 
 def create_cert():
@@ -132,3 +136,122 @@ def assert_claim_info_equal(claim1, claim2):
     # helps printing what's different
     for idx, value in enumerate(claim1):
         assert value == claim2[idx]
+
+
+def test_parallel_claim_parsing_matches_serial(block_processor, monkeypatch):
+    monkeypatch.setattr(block_processor_module, 'MIN_PARALLEL_CLAIM_OUTPUTS', 1)
+    block_processor.coin = LBCRegTest
+    block_processor.claim_parse_workers = 2
+    blocks = [LBCRegTest.block(unhexlify(raw_block), height) for height, raw_block in enumerate(hex_blocks)]
+
+    parsed = block_processor.parse_claim_outputs_in_parallel(blocks)
+    block_processor.claim_parse_executor.shutdown()
+
+    expected = {}
+    for block in blocks:
+        for tx, txid in block.transactions:
+            for nout, output in enumerate(tx.outputs):
+                if isinstance(output.claim, (NameClaim, ClaimUpdate)):
+                    claim = output.claim
+                    expected[(txid, nout)] = parse_claim_outputs(LBCRegTest, [(claim.name, claim.value,
+                                                                               output.pk_script)])[0]
+    assert len(parsed) == 4
+    assert parsed == expected
+
+
+def test_pipelined_claim_parsing_matches_serial(block_processor):
+    daemon_mock = MagicMock()
+    daemon_mock.cached_height.return_value = 0
+    block_processor.coin = LBCRegTest
+    block_processor.daemon = daemon_mock
+    block_processor.claim_parse_workers = 2
+    block_processor.claim_pipeline_depth = 3
+    blocks = [LBCRegTest.block(unhexlify(raw_block), height) for height, raw_block in enumerate(hex_blocks)]
+
+    block_processor.advance_blocks(blocks[:104])
+    block_processor.claim_parse_executor.shutdown()
+
+    expected = {}
+    for block in blocks[:104]:
+        for tx, txid in block.transactions:
+            for nout, output in enumerate(tx.outputs):
+                claim = output.claim
+                if isinstance(claim, (NameClaim, ClaimUpdate)):
+                    claim_id = claim.claim_id if isinstance(claim, ClaimUpdate) else claim_id_hash(txid, nout)
+                    expected[claim_id] = parse_claim_outputs(LBCRegTest, [(claim.name, claim.value,
+                                                                           output.pk_script)])[0]
+    assert len(expected) == 2
+    for claim_id, (address, cert_id) in expected.items():
+        claim_info = block_processor.get_claim_info(claim_id)
+        assert (claim_info.address, claim_info.cert_id) == (address.encode(), cert_id)
+    metrics = asyncio.get_event_loop().run_until_complete(block_processor.rpc_claim_metrics())
+    assert metrics['total']['pipeline_parse_us'] and metrics['total']['pipeline_apply_us']
+    assert 0 < metrics['pipeline']['apply'] <= 1
+
+
+def test_signature_validation_caches_certificates(block_processor):
+    block_processor.should_validate_signatures = True
+    cert, privkey = create_cert()
+    cert_claim_id, _ = make_claim(block_processor, b'@channel', cert.serialized)
+    value = ClaimDict.load_dict(claim_data.test_claim_dict).serialized
+
+    for name in (b'first', b'second'):
+        claim_id, _ = make_claim(block_processor, name, value, privkey, cert_claim_id)
+        assert block_processor.get_claim_info(claim_id).cert_id == cert_claim_id
+    metrics = block_processor.get_claim_metrics()
+    assert metrics['signatures_validated'] == 2
+    assert metrics['certificate_cache_hits'] == 1
+
+    # the channel key changed, so claims signed with the old one are now rejected
+    new_cert, _ = create_cert()
+    update_claim(block_processor, b'@channel', new_cert.serialized, claim_id=cert_claim_id)
+    claim_id, _ = make_claim(block_processor, b'third', value, privkey, cert_claim_id)
+    assert block_processor.get_claim_info(claim_id).cert_id is None
+    assert block_processor.get_claim_metrics()['signatures_rejected'] == 1
+
+
+def test_parallel_signature_validation(block_processor, monkeypatch):
+    monkeypatch.setattr(block_processor_module, 'MIN_PARALLEL_CLAIM_OUTPUTS', 1)
+    block_processor.should_validate_signatures = True
+    block_processor.claim_parse_workers = 2
+    address = 'bTZito1AqWPig64GBioom11mHpoegMfXHx'
+    cert, privkey = create_cert()
+    _, other_privkey = create_cert()
+    cert_claim_id, _ = make_claim(block_processor, b'@channel', cert.serialized)
+    value = ClaimDict.load_dict(claim_data.test_claim_dict).serialized
+
+    outputs = [create_claim_output(address, b'signed', value, privkey, cert_claim_id),
+               create_claim_output(address, b'forged', value, other_privkey, cert_claim_id)]
+    txid = bytes(getrandbits(8) for _ in range(32))
+    tx = LBRYTx(1, [TxInput(bytes(32), 0, b'', 0xffffffff)], outputs, 0)
+    block_processor.validate_signatures_in_parallel([(tx, txid)])
+    block_processor.claim_parse_executor.shutdown()
+    assert block_processor.checked_signatures == {(txid, 0): True, (txid, 1): False}
+
+    block_processor.advance_claim_txs([(tx, txid)], 10)
+    assert block_processor.get_claim_info(claim_id_hash(txid, 0)).cert_id == cert_claim_id
+    assert block_processor.get_claim_info(claim_id_hash(txid, 1)).cert_id is None
+    assert not block_processor.checked_signatures
+    assert block_processor.claim_metrics['signatures_validated'] == 1
+    assert block_processor.claim_metrics['signatures_rejected'] == 1
+
+
+def test_claim_metrics(block_processor):
+    daemon_mock = MagicMock()
+    daemon_mock.cached_height.return_value = 0
+    block_processor.coin = LBCRegTest
+    block_processor.daemon = daemon_mock
+    blocks = [LBCRegTest.block(unhexlify(raw_block), height) for height, raw_block in enumerate(hex_blocks)]
+
+    block_processor.advance_blocks(blocks[:104])
+    assert block_processor.last_block_metrics['claims'] == 1
+    assert block_processor.last_block_metrics['updates'] == 1
+    assert block_processor.claim_metrics['claims'] == 2
+
+    block_processor.flush(True)
+    block_processor.advance_blocks(blocks[104:])
+    metrics = asyncio.get_event_loop().run_until_complete(block_processor.rpc_claim_metrics())
+    assert metrics['height'] == len(blocks) - 1
+    assert metrics['since_flush']['abandons'] == 2
+    assert metrics['since_flush']['spent_supports'] == 1
+    assert metrics['total']['supports'] == 1
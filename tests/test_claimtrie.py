@@ -0,0 +1,142 @@
+import asyncio
+from binascii import hexlify, unhexlify
+from random import getrandbits
+from unittest.mock import MagicMock
+
+from electrumx.lib.hash import hash_to_hex_str
+from electrumx.lib.tx import TxInput
+
+from lbryumx.block_processor import claim_id_hash
+from lbryumx.cache import LRUCache
+from lbryumx.coin import LBC, LBCRegTest
+from lbryumx.model import LBRYTx, TxClaimOutput, NameClaim, ClaimSupport
+from lbryumx.session import LBRYElectrumX
+
+from .data.regtest_chain import hex_blocks, expected_claims
+
+ADDRESS = 'bTZito1AqWPig64GBioom11mHpoegMfXHx'
+
+
+def random_hash():
+    return bytes(getrandbits(8) for _ in range(32))
+
+
+def make_tx(outputs, inputs=None):
+    inputs = inputs or [TxInput(random_hash(), 0, b'', 0xffffffff)]
+    return LBRYTx(1, inputs, outputs, 0), random_hash()
+
+
+def claim_output(name, amount):
+    return TxClaimOutput(amount, LBC.pay_to_address_script(ADDRESS), NameClaim(name, b''))
+
+
+def support_output(name, claim_id, amount):
+    return TxClaimOutput(amount, LBC.pay_to_address_script(ADDRESS), ClaimSupport(name, claim_id))
+
+
+def advance_claim(block_processor, height, name, amount):
+    tx, txid = make_tx([claim_output(name, amount)])
+    block_processor.advance_claim_txs([(tx, txid)], height)
+    return claim_id_hash(txid, 0), txid
+
+
+def test_supports_are_listed_in_the_order_they_were_made(block_processor):
+    claim_id, _ = advance_claim(block_processor, 10, b'name', 10)
+    tx, first_txid = make_tx([support_output(b'name', claim_id, 2)])
+    block_processor.advance_claim_txs([(tx, first_txid)], 11)
+    tx, second_txid = make_tx([support_output(b'name', claim_id, 3)])
+    block_processor.advance_claim_txs([(tx, second_txid)], 12)
+
+    assert block_processor.get_supports(claim_id) == [(b'name', first_txid, 0, 2, 11), (b'name', second_txid, 0, 3, 12)]
+
+
+def test_spending_support_removes_it(block_processor):
+    claim_id, _ = advance_claim(block_processor, 10, b'name', 10)
+    tx, support_txid = make_tx([support_output(b'name', claim_id, 20)])
+    block_processor.advance_claim_txs([(tx, support_txid)], 11)
+    block_processor.flush(True)
+
+    tx, txid = make_tx([], inputs=[TxInput(support_txid, 0, b'', 0xffffffff)])
+    block_processor.advance_claim_txs([(tx, txid)], 12)
+    assert not block_processor.get_supports(claim_id)
+    assert block_processor.get_claim_metrics()['spent_supports'] == 1
+
+
+def test_claimtrie_backup(block_processor):
+    daemon_mock = MagicMock()
+    daemon_mock.cached_height.return_value = 0
+    block_processor.coin = LBCRegTest
+    block_processor.daemon = daemon_mock
+
+    raw_blocks = list(map(unhexlify, hex_blocks))
+    blocks = [LBCRegTest.block(raw_block, i) for (i, raw_block) in enumerate(raw_blocks)]
+    second_claim_id = unhexlify(expected_claims[b'second_claim'][0])[::-1]
+    # block 104 supports a claim id that was never claimed
+    supported_claim_id = unhexlify('70500634531eb5d71f6dd9fede820ddfa4d0ee54')[::-1]
+
+    block_processor.advance_blocks(blocks[:105])
+    block_processor.flush(True)
+    assert block_processor.get_claim_info(second_claim_id)
+    assert len(block_processor.get_supports(supported_claim_id)) == 1
+
+    block_processor.advance_blocks(blocks[105:])
+    block_processor.flush(True)
+    assert not block_processor.get_claim_info(second_claim_id)
+    assert not block_processor.get_supports(supported_claim_id)
+
+    block_processor.backup_blocks(list(reversed(raw_blocks[105:])))
+    block_processor.flush(True)
+    assert block_processor.get_claim_info(second_claim_id)
+    assert len(block_processor.get_supports(supported_claim_id)) == 1
+
+
+def test_prefetched_claim_state_spares_the_db_reads(block_processor):
+    first_claim_id, _ = advance_claim(block_processor, 10, b'name', 10)
+    second_claim_id, _ = advance_claim(block_processor, 11, b'name', 5)
+    tx, support_txid = make_tx([support_output(b'name', second_claim_id, 2)])
+    block_processor.advance_claim_txs([(tx, support_txid)], 12)
+    block_processor.flush(True)
+    block_processor.claim_info_cache = LRUCache(10)
+
+    txs = [make_tx([support_output(b'name', first_claim_id, 1)],
+                   inputs=[TxInput(support_txid, 0, b'', 0xffffffff)])]
+    block_processor.prefetch_claim_state(txs)
+    db_get, block_processor.claim_db.get = block_processor.claim_db.get, MagicMock(side_effect=AssertionError)
+    block_processor.advance_claim_txs(txs, 13)
+    block_processor.claim_db.get = db_get
+    block_processor.claim_read_ahead.clear()
+
+    assert block_processor.get_claim_metrics()['prefetched_reads']
+    assert block_processor.get_supports(second_claim_id) == []
+    assert [support.amount for support in block_processor.get_supports(first_claim_id)] == [1]
+
+
+def test_claims_are_formatted_from_the_index_but_for_lbrycrd_amounts(block_processor):
+    tx, txid = make_tx([TxClaimOutput(10, LBC.pay_to_address_script(ADDRESS), NameClaim(b'name', b'value'))])
+    block_processor.advance_claim_txs([(tx, txid)], 10)
+    claim_id = claim_id_hash(txid, 0)
+    # the support for another name isn't listed in the supports
+    tx, support_txid = make_tx([support_output(b'name', claim_id, 2), support_output(b'other', claim_id, 4)])
+    block_processor.advance_claim_txs([(tx, support_txid)], 11)
+    block_processor.db_height = 15
+    unknown_claim_id = hash_to_hex_str(random_hash()[:20])
+
+    class Daemon:
+        async def getclaimsbyids(self, claim_ids):
+            assert claim_ids == (hash_to_hex_str(claim_id), unknown_claim_id)
+            return [{'claimId': hash_to_hex_str(claim_id), 'name': 'name', 'txid': hash_to_hex_str(txid), 'n': 0,
+                     'amount': 10, 'height': 10, 'value': 'value', 'effective amount': 20,
+                     'valid at height': 14}, None]
+
+    session = LBRYElectrumX.__new__(LBRYElectrumX)
+    session.bp, session.claims_from_daemon, session.daemon = block_processor, False, Daemon()
+
+    claims = asyncio.get_event_loop().run_until_complete(
+        session.claimtrie_getclaimsbyids(hash_to_hex_str(claim_id), unknown_claim_id))
+    # the claim neither lbrycrd nor the index has is skipped
+    assert claims == {
+        hash_to_hex_str(claim_id): {
+            'name': 'name', 'claim_id': hash_to_hex_str(claim_id), 'txid': hash_to_hex_str(txid), 'nout': 0,
+            'amount': 10, 'depth': 5, 'height': 10, 'value': hexlify(b'value').decode(), 'claim_sequence': 1,
+            'address': ADDRESS, 'supports': [[hash_to_hex_str(support_txid), 0, 2]], 'effective_amount': 20,
+            'valid_at_height': 14}}
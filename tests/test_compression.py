@@ -0,0 +1,66 @@
+import msgpack
+import pytest
+
+from lbryumx.block_processor import VALUES_ZDICT_KEY, ZDICT_MIN_SAMPLES
+from lbryumx.compression import ValueCompressor, train_zdict, RAW, DEFLATE, DEFLATE_ZDICT
+
+from .test_claimtrie import random_hash
+
+
+def make_values(count):
+    return [b'{"title": "episode %d", "license": "Creative Commons", "language": "en", "nsfw": false}' % index
+            for index in range(count)]
+
+
+def test_dictionary_compresses_similar_values_better():
+    values = make_values(200)
+    zdict = train_zdict(values[:100])
+    plain, trained = ValueCompressor(), ValueCompressor(zdict)
+    plain_size = sum(len(plain.compress(value)) for value in values[100:])
+    trained_size = sum(len(trained.compress(value)) for value in values[100:])
+    assert trained_size < plain_size / 2
+
+    for value in values[100:]:
+        assert trained.decompress(trained.compress(value)) == value
+    # stored before the dictionary was there, or not compressible at all
+    assert trained.decompress(plain.compress(values[0])) == values[0]
+    assert plain.compress(values[0])[:1] == DEFLATE and trained.compress(values[0])[:1] == DEFLATE_ZDICT
+    assert trained.compress(b'x') == RAW + b'x'
+
+
+def test_claim_values_are_stored_compressed(block_processor):
+    claim_ids = [random_hash()[:20] for _ in range(ZDICT_MIN_SAMPLES)]
+    for claim_id, value in zip(claim_ids, make_values(ZDICT_MIN_SAMPLES)):
+        block_processor.put_claim_value(claim_id, value)
+    block_processor.batched_flush_claims()
+
+    assert block_processor.values_db.get(VALUES_ZDICT_KEY) == block_processor.value_compressor.zdict
+    assert block_processor.get_claim_value(claim_ids[-1]) == make_values(ZDICT_MIN_SAMPLES)[-1]
+    assert len(block_processor.values_db.get(claim_ids[-1])) < len(make_values(ZDICT_MIN_SAMPLES)[-1]) / 2
+    stats = block_processor.value_store_stats
+    assert stats['values'] == ZDICT_MIN_SAMPLES and stats['value_bytes'] > 2 * stats['stored_bytes']
+
+
+def test_claim_values_migration_resumes_with_its_dictionary(block_processor, monkeypatch):
+    db, values = block_processor, make_values(10001)
+    claim_ids = [random_hash()[:20] for _ in values]
+    with db.claim_db.write_batch() as batch:
+        claims_batch = db.claims_db.batch(batch)
+        for claim_id, value in zip(claim_ids, values):
+            # claim info of older versions, the value coming after the name
+            claims_batch.put(claim_id, msgpack.dumps([b'name', value, b'txid', 0, 10, b'address', 1, None]))
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+    # stopped after the first batch of values was written
+    monkeypatch.setattr(db.claim_undo_db, 'iterator', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        db.migrate_claim_values()
+    zdict = db.values_db.get(VALUES_ZDICT_KEY)
+    assert zdict
+
+    monkeypatch.undo()
+    db.migrate_claim_values()
+    assert db.values_db.get(VALUES_ZDICT_KEY) == zdict
+    compressor = ValueCompressor(zdict)
+    assert [compressor.decompress(db.values_db.get(claim_id)) for claim_id in claim_ids] == values
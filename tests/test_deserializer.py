@@ -3,7 +3,8 @@ from binascii import unhexlify, hexlify
 from electrumx.lib.hash import hex_str_to_hash
 
 from lbryumx.coin import LBC
-from lbryumx.model import NameClaim, ClaimUpdate
+from lbryumx.model import NameClaim, ClaimUpdate, ClaimSupport, ClaimScript
+from lbryumx.opcodes import decode_claim, decode_claim_script, script_GetOp, opcodes
 
 
 def test_block(block_infos):
@@ -47,6 +48,44 @@ def test_handler_for_claim_script_address_extraction(block_infos):
     assert LBC.address_from_script(outputs[0].pk_script) == 'bPNQ1zwYeeEFsCBYzQ9F4qLEHv5ZWCf8YB'
 
 
+def test_claim_scripts_are_decoded_once(block_infos):
+    block_info = block_infos['342259']
+    output = _filter_tx_output_by_type(block_info, ClaimUpdate)[0]
+    address = 'bPNQ1zwYeeEFsCBYzQ9F4qLEHv5ZWCf8YB'
+    assert isinstance(output.pk_script, ClaimScript)
+    assert output.pk_script.claim == output.claim
+    assert output.pk_script.address_script == LBC.pay_to_address_script(address)
+    # raw bytes get decoded on the spot, to the same results
+    for script in (output.pk_script, bytes(output.pk_script)):
+        assert LBC.address_from_script(script) == address
+        assert LBC.hashX_from_script(script) == LBC.address_to_hashX(address)
+
+
+def test_decode_claim_script_shapes():
+    address_script = LBC.pay_to_address_script('bTZito1AqWPig64GBioom11mHpoegMfXHx')
+    claim_id = bytes(range(20))
+    name_claim = bytes((opcodes.OP_CLAIM_NAME, 4)) + b'name' + bytes((opcodes.OP_PUSHDATA1, 5)) + b'value'
+    drops = bytes((opcodes.OP_2DROP, opcodes.OP_DROP))
+    support = bytes((opcodes.OP_SUPPORT_CLAIM, 4)) + b'name' + bytes((20,)) + claim_id
+    update = bytes((opcodes.OP_UPDATE_CLAIM, 4)) + b'name' + bytes((20,)) + claim_id + bytes((5,)) + b'value'
+
+    assert decode_claim(address_script) is None
+    assert decode_claim(b'') is None
+    assert decode_claim(name_claim + drops + address_script) == (NameClaim(b'name', b'value'), len(name_claim) + 2)
+    assert decode_claim(support + drops + address_script)[0] == ClaimSupport(b'name', claim_id)
+    assert decode_claim(update + bytes((opcodes.OP_2DROP,)) * 2 + address_script)[0] == \
+        ClaimUpdate(b'name', claim_id, b'value')
+    # wrong drops, missing or truncated address scripts and short claim ids are not claims
+    assert decode_claim(update + drops + address_script) is None
+    assert decode_claim(name_claim + drops + bytes((opcodes.OP_DUP,))) is None
+    assert decode_claim(name_claim + drops + bytes((opcodes.OP_DUP, 20, 1))) is None
+    assert decode_claim(support[:-1] + drops + address_script) is None
+    assert decode_claim(name_claim[:-1]) is None
+
+    claim, address_ops = decode_claim_script(name_claim + drops + address_script)
+    assert [op for op, _, _ in address_ops] == [op for op, _, _ in script_GetOp(address_script)]
+
+
 def _filter_tx_output_claims_by_type(block_info, claim_type):
     return [output.claim for output in _filter_tx_output_by_type(block_info, claim_type)]
 
@@ -0,0 +1,93 @@
+import os
+import struct
+
+import pytest
+from electrumx.server.env import Env
+
+from lbryumx.block_processor import CLAIM_DB_NAME, CLAIMS_PREFIX, NAMES_PREFIX, SIGNATURES_PREFIX, CERT_COUNT_PREFIX, \
+    NAMES_DB_VERSION_KEY
+from lbryumx.blockfiles import BlockFiles
+from lbryumx.coin import LBC
+from lbryumx.rebuild import read_utxo_state, rebuild_claims, verify_claims
+
+from .synthetic import generate_blocks, feed_block_processor, load_distribution, open_block_processor, \
+    close_block_processor
+from .test_blockfiles import db_state
+
+
+def synced_chain(block_processor, seed):
+    distribution = load_distribution(blocks=30, claims_per_block=10, channels=2, signed_share=0.5)
+    chain = [raw_block for _, raw_block in generate_blocks(LBC, distribution, seed=seed)]
+    feed_block_processor(block_processor, [(0, raw_block) for raw_block in chain], batch_size=4, flush_every=8,
+                         daemon_height=len(chain) - 1)
+    return chain
+
+
+def test_verify_finds_drift_between_claim_indexes(block_processor):
+    synced_chain(block_processor, seed=5)
+    assert not verify_claims(block_processor)
+
+    claim_ids = [claim_id for claim_id, _ in block_processor.claims_db.iterator()]
+    cert_id = next(key[1:] for key, _ in block_processor.signatures_db.iterator(prefix=CERT_COUNT_PREFIX))
+    with block_processor.claim_db.write_batch() as batch:
+        batch.delete(CLAIMS_PREFIX + claim_ids[0])
+        batch.put(SIGNATURES_PREFIX + CERT_COUNT_PREFIX + cert_id, struct.pack('>I', 1000))
+    drift = verify_claims(block_processor)
+    assert drift['stale_outpoint'] == drift['stale_name'] == drift['stale_claim_position'] == 1
+    assert drift['wrong_signed_claim_count'] == 1
+    assert 'height_mismatch' not in drift
+
+
+def test_rebuild_restores_a_damaged_claim_db(block_processor, tmpdir):
+    chain = synced_chain(block_processor, seed=6)
+    synced = db_state(block_processor)
+    records = b''.join(LBC.NETWORK_MAGIC + struct.pack('<I', len(raw_block)) + raw_block for raw_block in chain)
+    tmpdir.join('blocks', 'blk00000.dat').write_binary(records, ensure=True)
+    with block_processor.claim_db.write_batch() as batch:
+        for key, _ in block_processor.claim_db.iterator(prefix=NAMES_PREFIX):
+            batch.delete(key)
+    assert verify_claims(block_processor)
+    db_dir = os.getcwd()
+    close_block_processor(block_processor)
+    # a claim DB of older versions, which only the server's own claim DB takes in
+    os.mkdir('claims')
+
+    block_files = BlockFiles(LBC, tmpdir.join('blocks').strpath)
+    bp = LBC.BLOCK_PROCESSOR(Env(LBC), None, None)
+    try:
+        read_utxo_state(bp)
+        rebuild_claims(bp, block_files, workers=2, chunk_size=7)
+    finally:
+        block_files.close()
+        close_block_processor(bp)
+    assert sorted(os.listdir(db_dir)) == sorted(['COIN', 'meta', 'utxo', 'hist', 'claims', CLAIM_DB_NAME])
+    os.rmdir('claims')
+
+    bp = LBC.BLOCK_PROCESSOR(Env(LBC), None, None)
+    read_utxo_state(bp)
+    bp.open_claim_db(False, read_only=True)
+    bp.claim_db.close()
+    bp = open_block_processor(LBC, db_dir)
+    try:
+        assert db_state(bp) == synced
+        assert not verify_claims(bp)
+    finally:
+        close_block_processor(bp)
+
+
+def test_verify_opens_the_claim_db_as_is(block_processor):
+    synced_chain(block_processor, seed=7)
+    with block_processor.names_db.write_batch() as batch:
+        batch.delete(NAMES_DB_VERSION_KEY)
+    close_block_processor(block_processor)
+
+    bp = LBC.BLOCK_PROCESSOR(Env(LBC), None, None)
+    read_utxo_state(bp)
+    with pytest.raises(bp.DBError):
+        bp.open_claim_db(False, read_only=True)
+    try:
+        # neither migrated nor stamped with the current version
+        assert bp.names_db.get(NAMES_DB_VERSION_KEY) is None
+        assert bp.outpoint_filter is None
+    finally:
+        bp.claim_db.close()
@@ -2,7 +2,10 @@ from binascii import unhexlify
 from unittest.mock import MagicMock
 
 from .data.regtest_chain import hex_blocks, expected_names, expected_claims
-from lbryumx.coin import LBCRegTest
+from .synthetic import generate_blocks, feed_block_processor, load_distribution
+from lbryumx.block_processor import LBRYBlockProcessor, claim_id_hash
+from lbryumx.coin import LBC, LBCRegTest
+from lbryumx.model import NameClaim
 
 
 def test_simple_claim_backup(block_processor):
@@ -91,3 +94,75 @@ def test_reclaim_abandon_on_backup(block_processor):
     assert block_processor.get_claims_for_name(b'second_claim')
     assert block_processor.get_claim_info(unhexlify(expected_claims[expected_names[1]][0])[::-1])
     assert block_processor.get_claim_info(unhexlify(expected_claims[expected_names[0]][0])[::-1])
+
+
+def test_synthetic_chain_reorgs(block_processor):
+    distribution = load_distribution(blocks=30, claims_per_block=10, channels=2, signed_share=0.5,
+                                     reorg_interval=10, max_reorg_depth=5)
+    generated = list(generate_blocks(LBC, distribution, seed=1))
+    assert generated == list(generate_blocks(LBC, distribution, seed=1))
+    assert sum(1 for fork_depth, _ in generated if fork_depth) == 2
+
+    feed_block_processor(block_processor, generated, batch_size=4, flush_every=8)
+    assert block_processor.height == 29
+
+    chain = []
+    for fork_depth, raw_block in generated:
+        del chain[len(chain) - fork_depth:]
+        chain.append(raw_block)
+    final_claims, orphaned_claims = set(), set()
+    for raw_blocks, claims in ((chain, final_claims), ([raw for _, raw in generated], orphaned_claims)):
+        for raw_block in raw_blocks:
+            for tx, txid in LBC.block(raw_block, 0).transactions:
+                claims.update(claim_id_hash(txid, nout) for nout, output in enumerate(tx.outputs)
+                              if isinstance(output.claim, NameClaim))
+    orphaned_claims -= final_claims
+    assert orphaned_claims
+    assert not any(map(block_processor.get_claim_info, orphaned_claims))
+    last_block_claims = [claim_id_hash(txid, nout) for tx, txid in LBC.block(chain[-1], 0).transactions
+                         for nout, output in enumerate(tx.outputs) if isinstance(output.claim, NameClaim)]
+    assert all(map(block_processor.get_claim_info, last_block_claims))
+    assert any(block_processor.get_claim_info(claim_id).cert_id for claim_id in last_block_claims)
+
+
+def test_multi_block_backup_restores_the_claim_db(block_processor, monkeypatch):
+    distribution = load_distribution(blocks=20, claims_per_block=10, channels=2, signed_share=0.5)
+    generated = list(generate_blocks(LBC, distribution, seed=2))
+    block_processor.should_validate_signatures = True
+    feed_block_processor(block_processor, generated[:15], batch_size=5, flush_every=5)
+    before = claim_db_state(block_processor)
+    values = {claim_id: block_processor.get_claim_value(claim_id)
+              for claim_id, _ in block_processor.claims_db.iterator()}
+    feed_block_processor(block_processor, generated[15:], batch_size=5, flush_every=5)
+
+    raw_blocks = [raw_block for _, raw_block in reversed(generated[15:])]
+    block_processor.claim_undo_db.get = MagicMock(side_effect=AssertionError('undo read block by block'))
+    validated = block_processor.claim_metrics['signatures_validated']
+    read_ahead_when_flushed, batched_flush_claims = [], LBRYBlockProcessor.batched_flush_claims
+
+    def recorded_batched_flush_claims(self):
+        read_ahead_when_flushed.append(bool(self.claim_read_ahead))
+        batched_flush_claims(self)
+    monkeypatch.setattr(LBRYBlockProcessor, 'batched_flush_claims', recorded_batched_flush_claims)
+    block_processor.backup_blocks(raw_blocks)
+    monkeypatch.undo()
+
+    assert block_processor.height == 14
+    assert block_processor.claim_metrics['signatures_validated'] == validated
+    assert claim_db_state(block_processor) == before
+    assert {claim_id: block_processor.get_claim_value(claim_id)
+            for claim_id, _ in block_processor.claims_db.iterator()} == values
+    assert block_processor.claim_metrics['reorgs'] == 1
+    assert block_processor.claim_metrics['reorg_blocks'] == 5
+    assert block_processor.last_reorg['blocks'] == 5
+    # nothing read ahead outlives the backup flush writing over it
+    assert read_ahead_when_flushed and not any(read_ahead_when_flushed)
+
+
+def claim_db_state(block_processor):
+    '''Claim DB entries besides undo, values and height, with the claims of each name as a set as a claim
+    abandoned then restored comes back at a new position.'''
+    state = {key: value for key, value in block_processor.claim_db.iterator() if key[:1] not in b'UvHN'}
+    names = {block_processor.get_claim_info(claim_id).name for claim_id, _ in block_processor.claims_db.iterator()}
+    state.update((name, set(block_processor.get_claim_ids_for_name(name))) for name in names)
+    return state
@@ -0,0 +1,70 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from aiorpcx import RPCError
+from electrumx.server.session import LocalRPC
+
+from lbryumx.session import LBRYElectrumX, LBRYLocalRPC, LBRYSessionManager
+
+
+def uri_session(resolve, concurrency, timeout):
+    session = LBRYElectrumX.__new__(LBRYElectrumX)
+    session.claimtrie_getvalueforuri = resolve
+    session.uri_resolve_concurrency, session.uri_batch_timeout = concurrency, timeout
+    return session
+
+
+def test_uris_of_a_batch_resolve_concurrently_up_to_the_limit():
+    resolving, most_resolving = set(), []
+
+    async def resolve(block_hash, uri):
+        resolving.add(uri)
+        most_resolving.append(len(resolving))
+        await asyncio.sleep(0.01)
+        resolving.remove(uri)
+        return {'uri': uri}
+
+    uris = ['lbry://name{}'.format(index) for index in range(10)]
+    session = uri_session(resolve, concurrency=3, timeout=10)
+    result = asyncio.get_event_loop().run_until_complete(session.claimtrie_getvalueforuris(None, *uris))
+    assert result == {uri: {'uri': uri} for uri in uris}
+    assert max(most_resolving) == 3
+
+
+def test_batch_returns_partial_results_at_its_deadline():
+    async def resolve(block_hash, uri):
+        if uri == 'lbry://slow':
+            await asyncio.sleep(10)
+        if uri == 'lbry://bad':
+            raise RPCError(1, 'bad uri')
+        return {'uri': uri}
+
+    session = uri_session(resolve, concurrency=2, timeout=1)
+    result = asyncio.get_event_loop().run_until_complete(
+        session.claimtrie_getvalueforuris(None, 'lbry://slow', 'lbry://bad', 'lbry://fast'))
+    assert result == {'lbry://slow': {'error': 'timed out after 1s'}, 'lbry://bad': {'error': 'bad uri'},
+                      'lbry://fast': {'uri': 'lbry://fast'}}
+
+
+def test_session_manager_serves_claim_metrics_over_the_admin_rpc(block_processor, monkeypatch):
+    monkeypatch.setattr(LocalRPC, 'request_handlers', {}, raising=False)
+    loop, factories = asyncio.get_event_loop(), []
+
+    async def create_server(protocol_factory, *args, **kwargs):
+        factories.append(protocol_factory)
+
+    async def claim_metrics():
+        return {'height': 5}
+
+    monkeypatch.setattr(loop, 'create_server', create_server)
+    chain_state = MagicMock()
+    chain_state._bp.rpc_claim_metrics = claim_metrics
+    session_mgr = LBRYSessionManager(block_processor.env, chain_state, None, MagicMock(), None)
+    loop.run_until_complete(session_mgr._start_server('RPC', 'localhost', 8000))
+    session = factories[0]()
+    assert isinstance(session, LBRYLocalRPC)
+    result = loop.run_until_complete(session.request_handlers['claim_metrics']())
+    assert result == {'height': 5}
+    assert session.request_handlers['getinfo'] == session_mgr.rpc_getinfo
+    # the electrumx admin sessions are left as they are
+    assert 'claim_metrics' not in LocalRPC.request_handlers
@@ -0,0 +1,69 @@
+import io
+import os
+
+import pytest
+
+from lbryumx.coin import LBC
+from lbryumx.snapshot import SnapshotError, export_snapshot, import_snapshot, open_exported_dbs
+
+from .synthetic import generate_blocks, feed_block_processor, load_distribution, open_block_processor, \
+    close_block_processor
+from .test_blockfiles import db_state
+
+
+def test_imported_snapshot_serves_and_syncs_from_its_height(block_processor, tmpdir):
+    distribution = load_distribution(blocks=30, claims_per_block=10, channels=2, signed_share=0.5)
+    generated = list(generate_blocks(LBC, distribution, seed=4))
+    feed_block_processor(block_processor, generated[:20], batch_size=5, flush_every=10, daemon_height=29)
+    snapshot = io.BytesIO()
+    header, checksum = export_snapshot(block_processor, snapshot)
+    assert header['height'] == 19
+    exported = db_state(block_processor)
+    feed_block_processor(block_processor, generated[20:], batch_size=5, flush_every=10, daemon_height=29)
+    synced = db_state(block_processor)
+    # LevelDB locks DBs by their relative path, which is the same on both
+    close_block_processor(block_processor)
+
+    db_dir = tmpdir.mkdir('imported').strpath
+    snapshot.seek(0)
+    assert import_snapshot(LBC, snapshot, db_dir) == header
+    bp = open_block_processor(LBC, db_dir)
+    try:
+        assert db_state(bp) == exported
+        feed_block_processor(bp, generated[20:], batch_size=5, flush_every=10, daemon_height=29)
+        assert db_state(bp) == synced
+    finally:
+        close_block_processor(bp)
+
+
+def test_exported_dbs_are_opened_as_they_are(block_processor):
+    feed_block_processor(block_processor, generate_blocks(LBC, load_distribution(blocks=5, claims_per_block=5)))
+    snapshot = io.BytesIO()
+    _, checksum = export_snapshot(block_processor, snapshot)
+    env = block_processor.env
+    close_block_processor(block_processor)
+
+    bp = LBC.BLOCK_PROCESSOR(env, None, None)
+    try:
+        open_exported_dbs(bp)
+        assert bp.outpoint_filter is None
+        assert export_snapshot(bp, io.BytesIO())[1] == checksum
+    finally:
+        for db in (bp.utxo_db, bp.history.db, bp.claim_db):
+            if db:
+                db.close()
+
+
+def test_corrupted_snapshot_leaves_nothing_behind(block_processor, tmpdir):
+    feed_block_processor(block_processor, generate_blocks(LBC, load_distribution(blocks=5, claims_per_block=5)))
+    snapshot = io.BytesIO()
+    export_snapshot(block_processor, snapshot)
+    data = snapshot.getvalue()
+    close_block_processor(block_processor)
+
+    db_dir = tmpdir.mkdir('imported').strpath
+    for corrupted in (data[:-1] + bytes([data[-1] ^ 1]), data[:len(data) // 2], b'not' + data[3:]):
+        with pytest.raises(SnapshotError):
+            import_snapshot(LBC, io.BytesIO(corrupted), db_dir)
+        assert not os.listdir(db_dir)
+        assert os.listdir(tmpdir.strpath) == ['imported']